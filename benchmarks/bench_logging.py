@@ -0,0 +1,72 @@
+"""Per-chunk cost of progress logging on the transfer hot path
+
+Usage: python -m benchmarks.bench_logging [--iterations N]
+"""
+import argparse
+import io
+import logging
+import queue
+import timeit
+
+from darkloader.logger import ContextFilter, JsonFormatter, TextFormatter, _QueueHandler, log_context
+
+
+def _logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    return logger
+
+
+def run(iterations: int) -> dict:
+    processed, total = 123456789, 987654321
+    sink = io.StringIO()
+
+    quiet = _logger("bench.quiet", logging.NullHandler())
+    quiet.setLevel(logging.INFO)
+
+    stream_handler = logging.StreamHandler(sink)
+    stream_handler.setFormatter(TextFormatter())
+    sync_logger = _logger("bench.sync", stream_handler)
+    sync_logger.setLevel(logging.DEBUG)
+
+    # The listener is started after timing so only the caller-side cost of
+    # the queued path is measured; the formatting happens in another thread
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queued_logger = _logger("bench.queued", queue_handler)
+    queued_logger.setLevel(logging.DEBUG)
+    json_handler = logging.StreamHandler(sink)
+    json_handler.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, json_handler)
+
+    log_progress = quiet.isEnabledFor(logging.DEBUG)
+    cases = {
+        "debug off, f-string": lambda: quiet.debug(f"Downloaded {processed}/{total} bytes"),
+        "debug off, lazy %-format": lambda: quiet.debug("Downloaded %s/%s bytes", processed, total),
+        "debug off, level guard": lambda: log_progress and quiet.debug("Downloaded %s/%s bytes", processed, total),
+        "debug on, sync StreamHandler": lambda: sync_logger.debug("Downloaded %s/%s bytes", processed, total),
+        "debug on, QueueHandler (caller side)": lambda: queued_logger.debug("Downloaded %s/%s bytes", processed, total),
+    }
+
+    results = {}
+    with log_context(url="https://example.com/file", host="example.com"):
+        for label, case in cases.items():
+            seconds = min(timeit.repeat(case, number=iterations, repeat=5))
+            results[label] = seconds / iterations * 1e9
+    listener.start()
+    listener.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+    for label, ns in run(args.iterations).items():
+        print(f"{label:<40} {ns:8.1f} ns/chunk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Form-host page parsing: BeautifulSoup vs darkloader.scraping
+
+Runs the extraction each host needs on the saved page fixtures with both
+approaches, checks they agree and reports the time per page.
+
+Usage: python -m benchmarks.bench_scraping [--iterations N]
+"""
+import argparse
+import re
+import timeit
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from darkloader.hosts.desiupload import decode_captcha
+from darkloader.scraping import extract_form, find_element, find_link, find_text
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+
+
+def bs4_uploadscloud(html):
+    soup = BeautifulSoup(html, "html.parser")
+    form = soup.find("form", {"name": "F1"})
+    inputs = {tag.get("name"): tag.get("value", "") for tag in form.find_all("input") if tag.get("name")}
+    return soup.find("span", {"class": "dfilename"}).text, inputs
+
+
+def fast_uploadscloud(html):
+    return find_text(html, "span", "class", "dfilename"), extract_form(html, "F1").inputs
+
+
+def bs4_desiupload(html):
+    soup = BeautifulSoup(html, "html.parser")
+    form = soup.find("form", {"name": "F1"})
+    inputs = {name: form.find("input", {"name": name}).get("value", "") for name in ("op", "id", "rand", "referer")}
+    div = soup.find("div", style=lambda s: "width:80px;height:26px" in str(s))
+    digits = {}
+    for span in div.find_all("span", style=re.compile(r"position:absolute")):
+        px = int(re.search(r"padding-left:(\d+)px", span["style"]).group(1))
+        digits[1 if px <= 19 else 2 if px <= 29 else 3 if px <= 49 else 4] = span.get_text()
+    return inputs, "".join(digits[i] for i in (1, 2, 3, 4))
+
+
+def fast_desiupload(html):
+    return extract_form(html, "F1", fields=("op", "id", "rand", "referer")).inputs, decode_captcha(html)
+
+
+def bs4_desiupload_result(html):
+    return BeautifulSoup(html, "html.parser").find("span", {"id": "direct_link"}).find("a")["href"]
+
+
+def fast_desiupload_result(html):
+    return find_link(find_element(html, "span", "id", "direct_link"))
+
+
+def bs4_downloadgg(html):
+    soup = BeautifulSoup(html, "html.parser")
+    form = soup.find("form")
+    payload = {tag["name"]: tag["value"] for tag in form.find_all("input", {"type": "hidden"})}
+    return form.get("action"), payload, soup.select_one(".uploadProgress .name").get_text()
+
+
+def fast_downloadgg(html):
+    form = extract_form(html, input_type="hidden")
+    return form.action, form.inputs, find_text(html, None, "class", "name", html.find("uploadProgress"))
+
+
+def bs4_anonfile_result(html):
+    return BeautifulSoup(html, "html.parser").find("a", {"class": "stretched-link"})["href"]
+
+
+def fast_anonfile_result(html):
+    return find_link(html, "class", "stretched-link")
+
+
+CASES = {
+    "uploadscloud.html": (bs4_uploadscloud, fast_uploadscloud),
+    "desiupload.html": (bs4_desiupload, fast_desiupload),
+    "desiupload_result.html": (bs4_desiupload_result, fast_desiupload_result),
+    "downloadgg.html": (bs4_downloadgg, fast_downloadgg),
+    "anonfile_result.html": (bs4_anonfile_result, fast_anonfile_result),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'fixture':<26}{'bs4 ms':>10}{'helper ms':>12}{'speedup':>10}")
+    for fixture, (slow, fast) in CASES.items():
+        html = (FIXTURES / fixture).read_text()
+        assert slow(html) == fast(html), fixture
+        slow_ms = min(timeit.repeat(lambda: slow(html), number=args.iterations, repeat=3)) / args.iterations * 1000
+        fast_ms = min(timeit.repeat(lambda: fast(html), number=args.iterations, repeat=3)) / args.iterations * 1000
+        print(f"{fixture:<26}{slow_ms:>10.3f}{fast_ms:>12.3f}{slow_ms / fast_ms:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""Local aiohttp server emulating the file hosts used by the benchmarks
+
+Routes:
+    POST /accounts                  gofile anonymous token
+    GET  /contents/{id}             gofile content API (JSON), IDs starting
+                                    with "private" answer 401
+    GET  /1f/{id}                   1fichier landing page (form with adz token)
+    POST /1f/{id}                   1fichier form submit, returns the direct link
+                                    (IDs starting with "protected" ask for
+                                    MOCK_1F_PASSWORD)
+    GET  /api/file/{id}/info        pixeldrain file info (JSON), comma separated
+                                    IDs return a list; IDs starting with
+                                    "missing" do not exist
+    GET  /api/file/{id}             pixeldrain direct download
+    GET  /files/{id}/{name}         plain direct download
+    *    /s3/{bucket}/{key}         S3 multipart upload stand-in (create,
+                                    upload part, complete, abort, get),
+                                    SigV4 signed with MOCK_S3_CREDENTIALS
+
+Every download route supports HEAD and single ``Range: bytes=a-b`` requests.
+Throttling and flakiness are configured per server with ``MockHostConfig`` and
+can be overridden per request with the ``rate`` (bytes/s) and ``fail``
+(probability) query parameters; ``/files`` also takes ``size`` (bytes). With
+``link_ttl`` set, the links handed out by the gofile and 1fichier emulations
+carry an ``expires`` timestamp and answer 403 once it has passed, like
+expiring CDN links. With ``stall_at`` set, transfers from the start of the
+file stall there: the connection stays open while the rest trickles at
+``stall_rate`` bytes/s (0 sends nothing more).
+
+Usage: python -m benchmarks.mock_server --port 8080 --file-size 104857600
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from darkloader.sinks import sign_v4
+
+BLOCK_SIZE = 1024 * 1024
+_BLOCK = bytes(range(256)) * (BLOCK_SIZE // 256)
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+MISSING_PREFIX = "missing"
+# gofile contents with this prefix always answer 401, like private content
+PRIVATE_PREFIX = "private"
+# 1fichier pages of IDs with this prefix ask for MOCK_1F_PASSWORD
+PROTECTED_PREFIX = "protected"
+MOCK_1F_PASSWORD = "mock-password"
+# Access key and secret the S3 stand-in accepts
+MOCK_S3_CREDENTIALS = ("mock-access-key", "mock-secret-key")
+
+
+@dataclass
+class MockHostConfig:
+    """Behaviour of the emulated hosts
+
+    Args:
+        file_size: Size in bytes of every served file
+        rate: Per-connection throttle in bytes/s, None for unthrottled
+        failure_rate: Probability of a 503 or a dropped connection per request
+        latency: Seconds added before answering API and form requests
+        seed: Seed for the flakiness RNG
+        link_ttl: Lifetime in seconds of resolved gofile/1fichier links,
+            None for links that never expire
+        drop_at: Byte offset at which every transfer from the start of the
+            file is cut; ranged (resumed) transfers are not
+        stall_at: Byte offset at which every transfer from the start of the
+            file slows down to `stall_rate` without closing the connection
+        stall_rate: Bytes/s sent after `stall_at`, 0 to send nothing
+    """
+    file_size: int = 64 * 1024 * 1024
+    rate: Optional[int] = None
+    failure_rate: float = 0.0
+    latency: float = 0.0
+    seed: int = 0
+    link_ttl: Optional[float] = None
+    drop_at: Optional[int] = None
+    stall_at: Optional[int] = None
+    stall_rate: int = 0
+
+
+def file_name(file_id: str) -> str:
+    return f"{file_id}.bin"
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return an inclusive (start, end) tuple or None for a full response"""
+    if not header:
+        return None
+    match = _RANGE_RE.fullmatch(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        return max(size - int(end), 0), size - 1
+    return int(start), min(int(end) if end else size - 1, size - 1)
+
+
+class MockHostServer:
+    """aiohttp application plus the runner used to serve it"""
+
+    def __init__(self, config: Optional[MockHostConfig] = None) -> None:
+        self.config = config or MockHostConfig()
+        self._random = random.Random(self.config.seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+        self.pixeldrain_info_requests = 0
+        self.gofile_account_requests = 0
+        self.file_head_requests = 0
+        # Session cookie sent with each 1fichier page request, None if none
+        self.onefichier_sessions: List[Optional[str]] = []
+        # S3 stand-in state: upload ID -> {part number: body}, "bucket/key" -> body
+        self.s3_uploads: Dict[str, Dict[int, bytes]] = {}
+        self.s3_objects: Dict[str, bytes] = {}
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/accounts", self.gofile_account),
+            web.get("/contents/{id}", self.gofile_contents),
+            web.get("/1f/{id}", self.onefichier_page),
+            web.post("/1f/{id}", self.onefichier_submit),
+            web.get("/api/file/{id}/info", self.pixeldrain_info),
+            web.get("/api/file/{id}", self.serve_file),
+            web.get("/files/{id}/{name}", self.serve_file),
+            web.route("*", "/s3/{bucket}/{key:.+}", self.s3_object),
+        ])
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockHostServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def _failure_rate(self, request: web.Request) -> float:
+        return float(request.query.get("fail", self.config.failure_rate))
+
+    async def _api_delay(self, request: web.Request) -> None:
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        if self._random.random() < self._failure_rate(request):
+            raise web.HTTPServiceUnavailable()
+
+    def _file_link(self, file_id: str) -> str:
+        link = f"{self.url}/files/{file_id}/{file_name(file_id)}"
+        if self.config.link_ttl is not None:
+            link += f"?expires={time.time() + self.config.link_ttl:.3f}"
+        return link
+
+    async def gofile_account(self, request: web.Request) -> web.Response:
+        await self._api_delay(request)
+        self.gofile_account_requests += 1
+        return web.json_response({"status": "ok", "data": {"token": "benchmark"}})
+
+    async def gofile_contents(self, request: web.Request) -> web.Response:
+        await self._api_delay(request)
+        file_id = request.match_info["id"]
+        if file_id.startswith(PRIVATE_PREFIX):
+            raise web.HTTPUnauthorized()
+        return web.json_response({
+            "status": "ok",
+            "data": {
+                "type": "file",
+                "name": file_name(file_id),
+                "size": self.config.file_size,
+                "link": self._file_link(file_id),
+            },
+        })
+
+    async def onefichier_page(self, request: web.Request) -> web.Response:
+        await self._api_delay(request)
+        file_id = request.match_info["id"]
+        html = (
+            "<html><body><table>"
+            f'<tr><td class="normal">{file_name(file_id)}</td></tr></table>'
+            '<form method="post"><input type="hidden" name="adz" value="1.5">'
+            + ('<input type="password" id="pass" name="pass">' if file_id.startswith(PROTECTED_PREFIX) else "")
+            + '<input type="submit" name="submit" value="Download"></form>'
+            "</body></html>"
+        )
+        session = request.cookies.get("SID")
+        self.onefichier_sessions.append(session)
+        response = web.Response(text=html, content_type="text/html")
+        if session is None:
+            response.set_cookie("SID", f"session-{len(self.onefichier_sessions)}", max_age=3600)
+        return response
+
+    async def onefichier_submit(self, request: web.Request) -> web.Response:
+        await self._api_delay(request)
+        form = await request.post()
+        if form.get("adz") != "1.5":
+            raise web.HTTPForbidden()
+        if request.match_info["id"].startswith(PROTECTED_PREFIX) and form.get("pass") != MOCK_1F_PASSWORD:
+            return web.Response(text="<html><body>Incorrect password</body></html>", content_type="text/html")
+        link = self._file_link(request.match_info["id"])
+        html = f'<html><body><a href="{link}" class="ok">Click here to download the file</a></body></html>'
+        return web.Response(text=html, content_type="text/html")
+
+    def _pixeldrain_file(self, file_id: str) -> dict:
+        return {
+            "id": file_id,
+            "name": file_name(file_id),
+            "size": self.config.file_size,
+            "mime_type": "application/octet-stream",
+        }
+
+    async def pixeldrain_info(self, request: web.Request) -> web.Response:
+        await self._api_delay(request)
+        self.pixeldrain_info_requests += 1
+        # Like the real API, several comma separated IDs return a list
+        file_ids = [i for i in request.match_info["id"].split(",") if not i.startswith(MISSING_PREFIX)]
+        if "," in request.match_info["id"]:
+            return web.json_response([self._pixeldrain_file(i) for i in file_ids])
+        if not file_ids:
+            raise web.HTTPNotFound()
+        return web.json_response(self._pixeldrain_file(file_ids[0]))
+
+    async def serve_file(self, request: web.Request) -> web.StreamResponse:
+        if "expires" in request.query and float(request.query["expires"]) < time.time():
+            raise web.HTTPForbidden(text="Link expired")
+        size = int(request.query.get("size", self.config.file_size))
+        name = request.match_info.get("name") or file_name(request.match_info["id"])
+        byte_range = _parse_range(request.headers.get("Range"), size)
+        if byte_range and byte_range[0] >= size:
+            raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range or (0, size - 1)
+
+        failure_rate = self._failure_rate(request)
+        if self._random.random() < failure_rate / 2:
+            raise web.HTTPServiceUnavailable()
+
+        response = web.StreamResponse(status=206 if byte_range else 200)
+        response.headers["Content-Type"] = "application/octet-stream"
+        response.headers["Content-Disposition"] = f'attachment; filename="{name}"'
+        response.headers["Accept-Ranges"] = "bytes"
+        response.content_length = end - start + 1
+        if byte_range:
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        await response.prepare(request)
+        if request.method == "HEAD":
+            self.file_head_requests += 1
+            return response
+
+        rate = request.query.get("rate", self.config.rate)
+        rate = int(rate) if rate else None
+        # Dropped connections happen somewhere in the middle of the body
+        drop_at = None
+        if self._random.random() < failure_rate / 2:
+            drop_at = start + self._random.randrange(end - start + 1)
+        elif self.config.drop_at is not None and start == 0 and self.config.drop_at <= end:
+            drop_at = self.config.drop_at
+
+        stall_at = None
+        if self.config.stall_at is not None and start == 0 and self.config.stall_at <= end:
+            stall_at = self.config.stall_at
+
+        position = start
+        chunk_size = min(BLOCK_SIZE, rate) if rate else BLOCK_SIZE
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while position <= end:
+            offset = position % BLOCK_SIZE
+            length = min(BLOCK_SIZE - offset, chunk_size, end - position + 1)
+            if drop_at is not None and position + length > drop_at:
+                request.transport.close()
+                return response
+            if stall_at is not None and position + length > stall_at:
+                await response.write(_BLOCK[offset:offset + stall_at - position])
+                await self._trickle(request, response, stall_at, end)
+                return response
+            await response.write(_BLOCK[offset:offset + length])
+            position += length
+            if rate:
+                ahead = (position - start) / rate - (loop.time() - started)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+        await response.write_eof()
+        return response
+
+    async def _trickle(self, request: web.Request, response: web.StreamResponse, position: int, end: int) -> None:
+        """Send the rest at ``stall_rate`` until done or the client hangs up"""
+        step = self.config.stall_rate // 10
+        while position <= end:
+            if request.transport is None or request.transport.is_closing():
+                return
+            if step:
+                offset = position % BLOCK_SIZE
+                length = min(BLOCK_SIZE - offset, step, end - position + 1)
+                await response.write(_BLOCK[offset:offset + length])
+                position += length
+            await asyncio.sleep(0.1)
+        await response.write_eof()
+
+
+    def _s3_check_signature(self, request: web.Request, body: bytes) -> None:
+        authorization = request.headers.get("Authorization", "")
+        amz_date = request.headers.get("x-amz-date", "")
+        match = re.search(r"SignedHeaders=([^,]+)", authorization)
+        if not match or not amz_date:
+            raise web.HTTPForbidden(text="<Error><Code>AccessDenied</Code></Error>")
+        signed = {name: request.headers[name] for name in match.group(1).split(";") if name not in ("host", "x-amz-date", "x-amz-content-sha256")}
+        expected = sign_v4(
+            request.method,
+            str(request.url),
+            signed,
+            request.headers.get("x-amz-content-sha256", ""),
+            *MOCK_S3_CREDENTIALS,
+            region="us-east-1",
+            now=datetime.strptime(amz_date, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc),
+        )
+        if expected["Authorization"] != authorization:
+            raise web.HTTPForbidden(text="<Error><Code>SignatureDoesNotMatch</Code></Error>")
+        if request.headers["x-amz-content-sha256"] != hashlib.sha256(body).hexdigest():
+            raise web.HTTPBadRequest(text="<Error><Code>XAmzContentSHA256Mismatch</Code></Error>")
+
+    async def s3_object(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        self._s3_check_signature(request, body)
+        name = f"{request.match_info['bucket']}/{request.match_info['key']}"
+        upload_id = request.query.get("uploadId")
+        if request.method == "GET":
+            if name not in self.s3_objects:
+                raise web.HTTPNotFound(text="<Error><Code>NoSuchKey</Code></Error>")
+            return web.Response(body=self.s3_objects[name])
+        if request.method == "POST" and "uploads" in request.query:
+            upload_id = uuid.uuid4().hex
+            self.s3_uploads[upload_id] = {}
+            return web.Response(text=f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+        if upload_id not in self.s3_uploads:
+            raise web.HTTPNotFound(text="<Error><Code>NoSuchUpload</Code></Error>")
+        if request.method == "PUT":
+            self.s3_uploads[upload_id][int(request.query["partNumber"])] = body
+            return web.Response(headers={"ETag": f'"{uuid.uuid4().hex}"'})
+        if request.method == "DELETE":
+            del self.s3_uploads[upload_id]
+            return web.Response(status=204)
+        parts = self.s3_uploads.pop(upload_id)
+        numbers = [int(number) for number in re.findall(r"<PartNumber>(\d+)</PartNumber>", body.decode())]
+        self.s3_objects[name] = b"".join(parts[number] for number in numbers)
+        return web.Response(text=f"<CompleteMultipartUploadResult><Key>{request.match_info['key']}</Key></CompleteMultipartUploadResult>")
+
+
+async def _serve_forever(config: MockHostConfig, host: str, port: int) -> None:
+    server = MockHostServer(config)
+    url = await server.start(host, port)
+    print(f"Mock host server listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local mock file-host server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--file-size", type=int, default=MockHostConfig.file_size)
+    parser.add_argument("--rate", type=int, default=None, help="throttle in bytes/s per connection")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    config = MockHostConfig(args.file_size, args.rate, args.failure_rate, args.latency)
+    try:
+        asyncio.run(_serve_forever(config, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
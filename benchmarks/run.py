@@ -0,0 +1,488 @@
+"""Offline benchmark suite against the local mock host server
+
+Measures download throughput (MB/s), CPU seconds per GB and peak RSS for the
+transfer path, and p50/p99 latency of the link resolvers, across several
+concurrency levels. Every case runs in a fresh process so RSS and CPU
+figures belong to that case only; the mock server runs in its own process.
+
+Results are written to benchmarks/results/<revision>.json and can be compared
+with an earlier run:
+
+    python -m benchmarks.run --concurrency 1,4,16
+    python -m benchmarks.run --compare 01adb51
+
+The "processes" scenario runs the transfer through ProcessCoordinator with
+each count of worker processes, to check that throughput scales with cores:
+
+    python -m benchmarks.run --scenarios processes --processes 1,2,4
+
+The "transport" scenario compares the HTTP backends on connections opened
+(handshakes) and per-link latency of an API call, a HEAD and a range request
+to one origin. The mock server speaks HTTP/1.1 only, so HTTP/2 multiplexing
+shows up against real TLS origins rather than here:
+
+    python -m benchmarks.run --scenarios transport --transports aiohttp,httpx
+
+The "small" scenario downloads many small files through DarkLoader, once the
+regular way (HEAD probe, then the transfer) and once with small_files, and
+reports files per minute and CPU milliseconds per file:
+
+    python -m benchmarks.run --scenarios small --small-files 5000 --small-size 4096
+
+The "loop" scenario runs the small-file batch with small_files on each event
+loop (see darkloader.runtime), where loop overhead weighs the most; loops
+that aren't installed are skipped:
+
+    python -m benchmarks.run --scenarios loop --loops asyncio,uvloop
+
+The "jobs" scenario measures the memory of a queued batch: a link file of
+--queued-links URLs is read into a JobTable and, for reference, into a
+plain list of strings. It doesn't use the mock server:
+
+    python -m benchmarks.run --scenarios jobs --queued-links 1000000
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+
+RESULTS_DIR = Path(__file__).parent / "results"
+RESOLVE_HOSTS = ("gofile", "pixeldrain", "onefichier")
+# Metrics where a larger value is an improvement
+HIGHER_IS_BETTER = {"mb_per_s", "files_per_min"}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"]).returncode != 0
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class _Usage:
+    """CPU time and peak RSS of the current process over a block"""
+
+    def __enter__(self) -> "_Usage":
+        self._start = resource.getrusage(resource.RUSAGE_SELF)
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        end = resource.getrusage(resource.RUSAGE_SELF)
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = (end.ru_utime - self._start.ru_utime) + (end.ru_stime - self._start.ru_stime)
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        self.peak_rss_mb = end.ru_maxrss * scale / 2**20
+
+
+async def _gather_limited(calls: List[Callable], concurrency: int) -> List[float]:
+    """Await every call with at most `concurrency` in flight, return latencies"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed(call):
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(timed(call) for call in calls))
+    return latencies
+
+
+def run_transfer_case(base_url: str, files: int, file_size: int, concurrency: int) -> dict:
+    from darkloader.main import FileDownloader
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        downloader = FileDownloader(tmpdir, "WARNING")
+
+        def download(i):
+            url = f"{base_url}/files/f{i}/f{i}.bin"
+            return lambda: downloader.download_from_url(url, Path(tmpdir) / f"f{i}.bin")
+
+        async def download_all():
+            try:
+                await _gather_limited([download(i) for i in range(files)], concurrency)
+            finally:
+                await downloader.close()
+
+        with _Usage() as usage:
+            asyncio.run(download_all())
+
+    total = files * file_size
+    return {
+        "mb_per_s": total / 1e6 / usage.wall,
+        "cpu_s_per_gb": usage.cpu / (total / 1e9),
+        "peak_rss_mb": usage.peak_rss_mb,
+        "wall_s": usage.wall,
+    }
+
+
+def run_processes_case(base_url: str, files: int, file_size: int, concurrency: int, processes: int) -> dict:
+    from darkloader.parallel import ProcessCoordinator
+
+    urls = [f"{base_url}/files/f{i}/f{i}.bin" for i in range(files)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        async def download_all():
+            # Worker start-up is left out of the timing
+            async with ProcessCoordinator(processes, concurrency, tmpdir, "WARNING") as pool:
+                with _Usage() as usage:
+                    await pool.download_batch(urls)
+            return usage
+
+        usage = asyncio.run(download_all())
+
+    # The downloads run in the worker processes, which have exited by now
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    total = files * file_size
+    return {
+        "mb_per_s": total / 1e6 / usage.wall,
+        "cpu_s_per_gb": (usage.cpu + children.ru_utime + children.ru_stime) / (total / 1e9),
+        "wall_s": usage.wall,
+    }
+
+
+def run_small_case(
+    base_url: str, files: int, file_size: int, concurrency: int, small_files: bool, loop: str = "asyncio"
+) -> dict:
+    from darkloader.main import DarkLoader
+    from darkloader.runtime import LoopOptions, run
+
+    urls = [f"{base_url}/files/s{i}/s{i}.bin?size={file_size}" for i in range(files)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        async def download_all():
+            async with DarkLoader(tmpdir, "WARNING", small_files=small_files) as loader:
+                with _Usage() as usage:
+                    results = await loader.download_batch(urls, concurrency=concurrency)
+            failed = [result for result in results if isinstance(result, BaseException)]
+            if failed:
+                raise RuntimeError(f"{len(failed)} small files failed, first: {failed[0]!r}")
+            return usage
+
+        usage = run(download_all(), LoopOptions(loop))
+
+    return {
+        "files_per_min": files / usage.wall * 60,
+        "cpu_ms_per_file": usage.cpu / files * 1000,
+        "wall_s": usage.wall,
+    }
+
+
+def run_jobs_case(links: int, mode: str) -> dict:
+    from darkloader.cli import iter_links, read_links
+    from darkloader.jobs import JobTable
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "links.txt"
+        with path.open("w") as file:
+            for i in range(links):
+                file.write(f"https://host{i % 50}.example/d/{i:08x}/archive-{i}.part{i % 10 + 1:03d}.rar\n")
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with _Usage() as usage:
+            queued = JobTable(iter_links([str(path)])) if mode == "table" else read_links([str(path)])
+        assert len(queued) == links
+
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "peak_rss_mb": usage.peak_rss_mb,
+        "added_rss_mb": usage.peak_rss_mb - before * scale / 2**20,
+        "load_s": usage.wall,
+    }
+
+
+# Range requested by the transport case, like the first segment of a transfer
+TRANSPORT_RANGE = 64 * 1024
+
+
+def run_transport_case(base_url: str, backend: str, links: int, concurrency: int) -> dict:
+    """API call, HEAD and ranged GET per link against one origin
+
+    "aiohttp-unshared" opens a new client per link, as every download did
+    before transports were shared.
+    """
+    from darkloader.transport import make_transport
+
+    shared = None if backend == "aiohttp-unshared" else make_transport(backend)
+    opened = []
+
+    async def link(i):
+        transport = shared or make_transport("aiohttp")
+        try:
+            await transport.request("GET", f"{base_url}/api/file/p{i}/info")
+            await transport.request("HEAD", f"{base_url}/files/f{i}/f{i}.bin")
+            headers = {"Range": f"bytes=0-{TRANSPORT_RANGE - 1}"}
+            async with transport.stream("GET", f"{base_url}/files/f{i}/f{i}.bin", headers=headers) as response:
+                async for _ in response.iter_chunked(TRANSPORT_RANGE):
+                    pass
+        finally:
+            if transport is not shared:
+                opened.append(transport.connections_opened)
+                await transport.close()
+
+    async def run_all():
+        try:
+            return await _gather_limited([lambda i=i: link(i) for i in range(links)], concurrency)
+        finally:
+            if shared:
+                opened.append(shared.connections_opened)
+                await shared.close()
+
+    with _Usage() as usage:
+        latencies = asyncio.run(run_all())
+    connections = sum(opened)
+    return {
+        "connections": connections,
+        "requests_per_connection": links * 3 / max(connections, 1),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "cpu_ms_per_link": usage.cpu / links * 1000,
+    }
+
+
+def _resolver(host: str, base_url: str):
+    """Host plugin and link builder for one emulated host"""
+    if host == "gofile":
+        from darkloader.hosts import GoFile
+        GoFile.API_URL = base_url
+        return GoFile(), lambda i: f"{base_url}/d/g{i}"
+    if host == "pixeldrain":
+        from darkloader.hosts import Pixeldrain
+        Pixeldrain.API_URL = f"{base_url}/api"
+        return Pixeldrain(), lambda i: f"https://pixeldrain.com/u/p{i}"
+    if host == "onefichier":
+        from darkloader.hosts import OneFichier
+        return OneFichier(), lambda i: f"{base_url}/1f/o{i}"
+    raise ValueError(f"Unknown host: {host}")
+
+
+def run_resolve_case(base_url: str, host: str, links: int, concurrency: int) -> dict:
+    plugin, link = _resolver(host, base_url)
+    calls = [lambda i=i: plugin.get_direct_link(link(i)) for i in range(links)]
+
+    async def resolve_all():
+        try:
+            return await _gather_limited(calls, concurrency)
+        finally:
+            await plugin.close()
+
+    with _Usage() as usage:
+        latencies = asyncio.run(resolve_all())
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "links_per_s": links / usage.wall,
+        "cpu_ms_per_link": usage.cpu / links * 1000,
+        "peak_rss_mb": usage.peak_rss_mb,
+    }
+
+
+def _serve(config: MockHostConfig, ready) -> None:
+    async def serve():
+        async with MockHostServer(config) as server:
+            ready.put(server.url)
+            await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def _run_isolated(function: Callable, *args) -> dict:
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(function, *args).result()
+
+
+def run_suite(args: argparse.Namespace) -> dict:
+    config = MockHostConfig(
+        file_size=args.file_size,
+        rate=args.rate,
+        failure_rate=args.failure_rate,
+        latency=args.latency,
+    )
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    server = context.Process(target=_serve, args=(config, ready), daemon=True)
+    server.start()
+    base_url = ready.get(timeout=30)
+
+    cases = []
+    try:
+        for concurrency in args.concurrency:
+            if "transfer" in args.scenarios:
+                metrics = _run_isolated(run_transfer_case, base_url, args.files, args.file_size, concurrency)
+                cases.append({"scenario": "transfer", "concurrency": concurrency, "metrics": metrics})
+                print_case(cases[-1])
+            if "resolve" in args.scenarios:
+                for host in RESOLVE_HOSTS:
+                    metrics = _run_isolated(run_resolve_case, base_url, host, args.links, concurrency)
+                    cases.append({"scenario": "resolve", "host": host, "concurrency": concurrency, "metrics": metrics})
+                    print_case(cases[-1])
+            if "transport" in args.scenarios:
+                for backend in args.transports:
+                    try:
+                        metrics = _run_isolated(run_transport_case, base_url, backend, args.links, concurrency)
+                    except ImportError as e:
+                        print(f"Skipping transport {backend}: {e}")
+                        continue
+                    cases.append({"scenario": "transport", "backend": backend, "concurrency": concurrency, "metrics": metrics})
+                    print_case(cases[-1])
+            if "small" in args.scenarios:
+                for mode in ("regular", "small_files"):
+                    metrics = _run_isolated(
+                        run_small_case, base_url, args.small_files, args.small_size, concurrency, mode == "small_files"
+                    )
+                    cases.append({"scenario": "small", "mode": mode, "concurrency": concurrency, "metrics": metrics})
+                    print_case(cases[-1])
+            if "loop" in args.scenarios:
+                for loop in args.loops:
+                    try:
+                        metrics = _run_isolated(
+                            run_small_case, base_url, args.small_files, args.small_size, concurrency, True, loop
+                        )
+                    except ImportError as e:
+                        print(f"Skipping loop {loop}: {e}")
+                        continue
+                    cases.append({"scenario": "loop", "mode": loop, "concurrency": concurrency, "metrics": metrics})
+                    print_case(cases[-1])
+            if "processes" in args.scenarios:
+                for processes in args.processes:
+                    metrics = _run_isolated(
+                        run_processes_case, base_url, args.files, args.file_size, concurrency, processes
+                    )
+                    cases.append({"scenario": "processes", "processes": processes, "concurrency": concurrency, "metrics": metrics})
+                    print_case(cases[-1])
+        if "jobs" in args.scenarios:
+            for mode in ("table", "list"):
+                metrics = _run_isolated(run_jobs_case, args.queued_links, mode)
+                cases.append({"scenario": "jobs", "mode": mode, "metrics": metrics})
+                print_case(cases[-1])
+    finally:
+        server.terminate()
+        server.join()
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "params": {
+            "files": args.files,
+            "links": args.links,
+            "file_size": args.file_size,
+            "small_files": args.small_files,
+            "small_size": args.small_size,
+            "queued_links": args.queued_links,
+            "rate": args.rate,
+            "failure_rate": args.failure_rate,
+            "latency": args.latency,
+        },
+        "cases": cases,
+    }
+
+
+def case_key(case: dict) -> str:
+    processes = f"p{case['processes']}" if "processes" in case else ""
+    parts = (
+        case["scenario"], case.get("host", ""), case.get("backend", ""), case.get("mode", ""), processes,
+        f"c{case['concurrency']}" if "concurrency" in case else "",
+    )
+    return "/".join(str(part) for part in parts if part)
+
+
+def print_case(case: dict) -> None:
+    metrics = "  ".join(f"{name}={value:.2f}" for name, value in case["metrics"].items())
+    print(f"{case_key(case):<28} {metrics}")
+
+
+def load_results(reference: str) -> dict:
+    """Load a results file by path or by revision name"""
+    path = Path(reference)
+    if not path.exists():
+        path = RESULTS_DIR / f"{reference}.json"
+    return json.loads(path.read_text())
+
+
+def compare(baseline: dict, current: dict) -> None:
+    """Print the relative change of every metric present in both runs"""
+    previous: Dict[str, dict] = {case_key(case): case["metrics"] for case in baseline["cases"]}
+    print(f"\n{baseline['revision']} -> {current['revision']}")
+    for case in current["cases"]:
+        before = previous.get(case_key(case))
+        if not before:
+            continue
+        for name, value in case["metrics"].items():
+            if name not in before or not before[name]:
+                continue
+            change = (value - before[name]) / before[name] * 100
+            better = change > 0 if name in HIGHER_IS_BETTER else change < 0
+            flag = "" if abs(change) < 5 else ("  better" if better else "  WORSE")
+            print(f"{case_key(case):<28} {name:<16} {before[name]:>10.2f} -> {value:>10.2f} ({change:+.1f}%){flag}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="DarkLoader offline benchmarks")
+    parser.add_argument("--scenarios", default="transfer,resolve", type=lambda v: v.split(","))
+    parser.add_argument("--concurrency", default="1,4,16", type=_int_list)
+    parser.add_argument("--transports", default="aiohttp,aiohttp-unshared,httpx", type=lambda v: v.split(","),
+                        help="backends of the transport scenario")
+    parser.add_argument("--queued-links", type=int, default=1_000_000, help="links of the jobs scenario")
+    parser.add_argument("--loops", default="asyncio,uvloop", type=lambda v: v.split(","),
+                        help="event loops of the loop scenario")
+    parser.add_argument("--processes", default="1,2,4", type=_int_list, help="worker processes of the processes scenario")
+    parser.add_argument("--files", type=int, default=16, help="files per transfer case")
+    parser.add_argument("--links", type=int, default=64, help="links per resolve case")
+    parser.add_argument("--file-size", type=int, default=32 * 1024 * 1024)
+    parser.add_argument("--small-files", type=int, default=2000, help="files per small case")
+    parser.add_argument("--small-size", type=int, default=4096, help="size of the files of the small scenario")
+    parser.add_argument("--rate", type=int, default=None, help="server throttle in bytes/s per connection")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="server-side API latency in seconds")
+    parser.add_argument("--output", type=Path, default=None, help="results file (default: results/<revision>.json)")
+    parser.add_argument("--compare", default=None, help="revision or results file to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    os.environ.setdefault("GF_TOKEN", "benchmark")
+    results = run_suite(args)
+    if not args.no_save:
+        output = args.output or RESULTS_DIR / f"{results['revision']}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {output}")
+    if args.compare:
+        compare(load_results(args.compare), results)
+
+
+if __name__ == "__main__":
+    main()
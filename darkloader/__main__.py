@@ -0,0 +1,5 @@
+import sys
+
+from darkloader.cli import main
+
+sys.exit(main())
@@ -0,0 +1,234 @@
+"""Captcha solving service shared by the captcha hosts
+
+Solvers describe how to turn a captcha payload (image bytes, HTML...) into
+a code. ``CaptchaService`` runs CPU-bound solvers in a process pool so OCR
+of several links proceeds in parallel, caches results by payload, retries
+wrong-length answers with the solver's next preprocessing variant and keeps
+per-solver success and latency statistics.
+
+Hosts ask for a code with ``Host.solve_captcha``, which awaits the service
+of the host (or the process-wide default one).
+"""
+import asyncio
+import hashlib
+import io
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Union
+
+from darkloader.logger import setup_logger
+
+Payload = Union[bytes, str]
+
+
+class CaptchaError(Exception):
+    """Raised when a captcha could not be solved"""
+
+
+class CaptchaSolver:
+    """Base class for captcha solvers
+
+    Instances are pickled to the worker processes, so they must only hold
+    plain configuration. Each variant is one attempt; `solve` gets the
+    attempt number to pick its variant.
+    """
+    name: str = "solver"
+    length: Optional[int] = 4
+    cpu_bound: bool = True
+    variants: Sequence = (None,)
+
+    def solve(self, payload: Payload, attempt: int) -> str:
+        raise NotImplementedError
+
+    def is_valid(self, code: Optional[str]) -> bool:
+        return bool(code) and (self.length is None or len(code) == self.length)
+
+
+# One OCR engine per worker process, created on first use
+_ocr_engine = None
+
+
+def _get_ocr_engine():
+    global _ocr_engine
+    if _ocr_engine is None:
+        from core.captcha_solver.ocr_captcha import CaptchaOCR
+        _ocr_engine = CaptchaOCR()
+    return _ocr_engine
+
+
+class OCRSolver(CaptchaSolver):
+    """Image captcha solved with the OCR engine, one preprocessing per variant"""
+
+    def __init__(
+        self,
+        name: str = "ocr",
+        data_type: str = "NUMBERONLY",
+        variants: Sequence[str] = ("ContrastStretch_5x90 Brightness_130",),
+        length: Optional[int] = 4,
+    ) -> None:
+        self.name = name
+        self.data_type = data_type
+        self.variants = tuple(variants)
+        self.length = length
+
+    def solve(self, payload: Payload, attempt: int) -> str:
+        result = _get_ocr_engine().process_image(
+            io.BytesIO(payload),
+            data_type=self.data_type,
+            extra_params=self.variants[attempt % len(self.variants)],
+        )
+        return (result or "").strip()
+
+
+@dataclass
+class SolverStats:
+    """Counters of one solver"""
+    requests: int = 0
+    solved: int = 0
+    failed: int = 0
+    attempts: int = 0
+    wrong_length: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    latency: float = 0.0
+
+    @property
+    def success_rate(self) -> float:
+        return self.solved / self.requests if self.requests else 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        solved = self.solved - self.cache_hits
+        return self.latency / solved if solved > 0 else 0.0
+
+
+class CaptchaService:
+    """Parallel, cached captcha solving
+
+    Args:
+        max_workers: Size of the process pool (defaults to the CPU count)
+        retries: Extra attempts after a wrong-length or failed result,
+            bounded by the number of variants of the solver
+        cache_size: Number of solved payloads remembered
+        log_level: Logging level
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        retries: int = 2,
+        cache_size: int = 1024,
+        log_level: str = "INFO",
+    ) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.retries = retries
+        self.cache_size = cache_size
+        self.logger = setup_logger("CaptchaService", log_level)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._stats: Dict[str, SolverStats] = {}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.max_workers)
+        return self._executor
+
+    def stats(self) -> Dict[str, SolverStats]:
+        return dict(self._stats)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def __aenter__(self) -> "CaptchaService":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def _cache_key(self, solver: CaptchaSolver, payload: Payload) -> tuple:
+        data = payload.encode() if isinstance(payload, str) else payload
+        return solver.name, hashlib.sha1(data).hexdigest()
+
+    def _begin(self, solver: CaptchaSolver, payload: Payload):
+        stats = self._stats.setdefault(solver.name, SolverStats())
+        stats.requests += 1
+        key = self._cache_key(solver, payload)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            stats.cache_hits += 1
+            stats.solved += 1
+        return stats, key, cached
+
+    def _attempts(self, solver: CaptchaSolver) -> int:
+        return max(1, min(self.retries + 1, len(solver.variants)))
+
+    def _check(self, solver: CaptchaSolver, stats: SolverStats, attempt: int, code: Optional[str]) -> bool:
+        stats.attempts += 1
+        if solver.is_valid(code):
+            return True
+        stats.wrong_length += 1
+        self.logger.debug("%s attempt %s gave invalid code %r", solver.name, attempt, code)
+        return False
+
+    def _finish(self, solver, stats, key, code, started) -> str:
+        if code is None:
+            stats.failed += 1
+            raise CaptchaError(f"{solver.name} could not solve the captcha")
+        stats.solved += 1
+        stats.latency += time.perf_counter() - started
+        self._cache[key] = code
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return code
+
+    async def solve(self, solver: CaptchaSolver, payload: Payload) -> str:
+        """Solve a captcha without blocking the event loop
+
+        Args:
+            solver: Solver for this kind of captcha
+            payload: Image bytes or page HTML, depending on the solver
+
+        Returns:
+            The code
+
+        Raises:
+            CaptchaError: If no attempt produced a valid code
+        """
+        stats, key, cached = self._begin(solver, payload)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        code = None
+        for attempt in range(self._attempts(solver)):
+            try:
+                if solver.cpu_bound:
+                    result = await loop.run_in_executor(self.executor, solver.solve, payload, attempt)
+                else:
+                    result = solver.solve(payload, attempt)
+            except Exception as e:
+                stats.errors += 1
+                self.logger.warning("%s attempt %s failed: %s", solver.name, attempt, e)
+                continue
+            if self._check(solver, stats, attempt, result):
+                code = result
+                break
+        return self._finish(solver, stats, key, code, started)
+
+
+_default_service: Optional[CaptchaService] = None
+
+
+def get_captcha_service() -> CaptchaService:
+    """Process-wide service used when none is passed explicitly"""
+    global _default_service
+    if _default_service is None:
+        _default_service = CaptchaService()
+    return _default_service
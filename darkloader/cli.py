@@ -0,0 +1,331 @@
+"""``darkloader`` command: download the links listed in files or stdin
+
+Usage:
+    darkloader links.txt [more.txt ...] [-o DIR] [-j 8] [-c 4] [--limit-rate 5M]
+    cat links.txt | darkloader -o downloads --summary summary.json
+
+Link files have one URL per line; blank lines and lines starting with # are
+skipped. While running on a terminal, a dashboard on stderr shows the
+fastest active files and the totals. ``--summary`` writes the outcome of
+every link as JSON, and ``--retry-failed`` reads it back to run the links
+that failed again (files already complete are always skipped).
+
+Exit codes:
+    0    every link was downloaded
+    1    some links failed
+    2    bad usage or no links
+    130  interrupted
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import re
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, TextIO
+
+from darkloader import runtime
+from darkloader.jobs import FAILED, JobTable
+from darkloader.main import DarkLoader
+from darkloader.transport import TRANSPORTS, TransferTimeouts
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+_SIZE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?", re.I)
+_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+def parse_size(value: str) -> int:
+    """Bytes in "500K", "2M", "1.5GiB" or a plain number"""
+    match = _SIZE_RE.fullmatch(value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {value!r} (e.g. 800K, 5M, 1.5G)")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+def format_size(nbytes: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(nbytes) < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TiB"
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def iter_links(sources: Sequence[str], stdin: Optional[TextIO] = None) -> Iterator[str]:
+    """URLs listed in the files of `sources` ("-" for stdin), read line by line"""
+    for source in sources:
+        with nullcontext(stdin or sys.stdin) if source == "-" else open(source) as lines:
+            for line in lines:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+
+
+def read_links(sources: Sequence[str], stdin: Optional[TextIO] = None) -> List[str]:
+    """URLs listed in the files of `sources` ("-" for stdin), without repeats"""
+    return list(dict.fromkeys(iter_links(sources, stdin)))
+
+
+def failed_links(summary_path: Path) -> List[str]:
+    """URLs that failed in a summary written by ``--summary``"""
+    summary = json.loads(Path(summary_path).read_text())
+    return [entry["url"] for entry in summary["files"] if not entry["ok"]]
+
+
+class _FileProgress:
+    __slots__ = ("done", "total", "shown", "speed")
+
+    def __init__(self) -> None:
+        self.done = 0
+        self.total = 0
+        # Bytes at the previous redraw, to measure the speed in between
+        self.shown = 0
+        self.speed = 0.0
+
+
+class Dashboard:
+    """Live per-file and total throughput, redrawn in place on a terminal
+
+    Progress callbacks only update counters; the work of drawing happens
+    once per `interval` whatever the number of files, so hundreds of
+    transfers cost the same as a few.
+
+    Args:
+        stream: Terminal written to
+        total_files: Links in the batch
+        rows: Active files listed, the fastest first
+        interval: Seconds between redraws
+    """
+    # Weight of the latest interval in the displayed speeds
+    SPEED_SMOOTHING = 0.3
+
+    def __init__(self, stream: TextIO, total_files: int, rows: int = 10, interval: float = 0.5) -> None:
+        self.stream = stream
+        self.total_files = total_files
+        self.rows = rows
+        self.interval = interval
+        self.files: Dict[str, _FileProgress] = {}
+        self.active: Dict[str, _FileProgress] = {}
+        self.completed = 0
+        self.bytes = 0
+        self.speed = 0.0
+        self._shown_bytes = 0
+        self._drawn_at = time.monotonic()
+        self._lines = 0
+
+    async def update(self, name: str, done: int, total: int) -> None:
+        """Progress callback of the downloads"""
+        progress = self.files.get(name)
+        if progress is None:
+            progress = self.files[name] = self.active[name] = _FileProgress()
+        self.bytes += done - progress.done
+        progress.done, progress.total = done, total
+        if total and done >= total and self.active.pop(name, None):
+            self.completed += 1
+            # Nothing to show anymore; batches can have millions of files
+            del self.files[name]
+
+    def render(self) -> List[str]:
+        """Lines of the dashboard, updating the speeds since the last call"""
+        now = time.monotonic()
+        elapsed, self._drawn_at = now - self._drawn_at, now
+        if elapsed > 0:
+            alpha = self.SPEED_SMOOTHING
+            self.speed = alpha * (self.bytes - self._shown_bytes) / elapsed + (1 - alpha) * self.speed
+            for progress in self.active.values():
+                progress.speed = alpha * (progress.done - progress.shown) / elapsed + (1 - alpha) * progress.speed
+                progress.shown = progress.done
+        self._shown_bytes = self.bytes
+
+        lines = [
+            f"[{self.completed}/{self.total_files} files] {len(self.active)} active  "
+            f"{format_size(self.bytes)}  {format_size(self.speed)}/s"
+        ]
+        fastest = heapq.nlargest(self.rows, self.active.items(), key=lambda item: item[1].speed)
+        for name, progress in fastest:
+            percent = f"{100 * progress.done / progress.total:5.1f}%" if progress.total else "    ?"
+            lines.append(f"  {name[:48]:<48} {percent} {format_size(progress.done):>10}  {format_size(progress.speed)}/s")
+        if len(self.active) > self.rows:
+            lines.append(f"  ... {len(self.active) - self.rows} more")
+        return lines
+
+    def draw(self) -> None:
+        lines = self.render()
+        # Back to the first line of the previous drawing, clearing leftovers
+        output = f"\x1b[{self._lines}F" if self._lines else ""
+        output += "".join(f"{line}\x1b[K\n" for line in lines)
+        if len(lines) < self._lines:
+            output += "\x1b[J"
+        self.stream.write(output)
+        self.stream.flush()
+        self._lines = len(lines)
+
+    async def run(self) -> None:
+        """Redraw until cancelled, then draw the final state"""
+        try:
+            while True:
+                self.draw()
+                await asyncio.sleep(self.interval)
+        finally:
+            self.draw()
+
+
+def summarize(table: JobTable, elapsed: float) -> dict:
+    """Machine-readable outcome of a batch, written by ``--summary``"""
+    files = []
+    for index, url in enumerate(table):
+        if table.state(index) == FAILED:
+            files.append({"url": url, "ok": False, "error": table.error(index)})
+        else:
+            path = Path(table.path(index))
+            files.append({"url": url, "ok": True, "path": str(path), "bytes": path.stat().st_size if path.exists() else None})
+    succeeded = sum(entry["ok"] for entry in files)
+    return {
+        "succeeded": succeeded,
+        "failed": len(files) - succeeded,
+        "bytes": sum(entry.get("bytes") or 0 for entry in files),
+        "elapsed": round(elapsed, 3),
+        "files": files,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="darkloader",
+        description="Download the links listed in files or stdin",
+        epilog="Exit codes: 0 all downloaded, 1 some failed, 2 bad usage, 130 interrupted",
+    )
+    parser.add_argument("links", nargs="*", help="files with one link per line, - for stdin (the default)")
+    parser.add_argument("-o", "--output", default="downloads", help="download directory (default: downloads)")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="files downloaded at once (default: 4)")
+    parser.add_argument("-c", "--connections", type=int, default=4,
+                        help="connections a large file is split over, capped by its host (default: 4)")
+    parser.add_argument("--limit-rate", type=parse_size, default=None, metavar="RATE",
+                        help="total bandwidth in bytes/s, e.g. 800K or 5M")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="aiohttp")
+    parser.add_argument("--loop", choices=runtime.LOOPS, default="auto",
+                        help="event loop; auto uses uvloop when installed (default: auto)")
+    parser.add_argument("--executor-workers", type=int, default=None, metavar="N",
+                        help="threads for blocking resolvers and file operations")
+    parser.add_argument("--slow-callback", type=float, default=None, metavar="SECONDS",
+                        help="debug mode: log callbacks holding the event loop longer than this")
+    parser.add_argument("--min-speed", type=parse_size, default=None, metavar="RATE",
+                        help="bytes/s under which a transfer is restarted, 0 to never restart")
+    parser.add_argument("--read-timeout", type=float, default=None, metavar="SECONDS",
+                        help="seconds without data before a transfer is restarted")
+    parser.add_argument("--min-free-space", type=parse_size, default=0, metavar="SIZE",
+                        help="space downloads must leave free on the disk")
+    parser.add_argument("--retries", type=int, default=DarkLoader.MAX_RESOLVE_ATTEMPTS,
+                        help="resolutions of a link that keeps expiring or serving error pages")
+    parser.add_argument("--retry-failed", type=Path, default=None, metavar="SUMMARY",
+                        help="also download the links that failed in a previous --summary")
+    parser.add_argument("--session-file", type=Path, default=None, metavar="PATH",
+                        help="keep host cookies and tokens in this file between runs")
+    parser.add_argument("--small-files", action="store_true",
+                        help="fetch small direct links with one GET each, without probing sizes first")
+    parser.add_argument("--summary", default=None, metavar="PATH", help="write a JSON summary, - for stdout")
+    parser.add_argument("--no-progress", action="store_true", help="don't show the live dashboard")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--log-format", choices=("text", "json"), default=None)
+    args = parser.parse_args(argv)
+    if not args.links and not args.retry_failed:
+        if sys.stdin.isatty():
+            parser.error("no link files given and nothing piped on stdin")
+        args.links = ["-"]
+    if args.concurrency < 1 or args.connections < 1 or args.retries < 1:
+        parser.error("--concurrency, --connections and --retries must be at least 1")
+    if args.executor_workers is not None and args.executor_workers < 1:
+        parser.error("--executor-workers must be at least 1")
+    return args
+
+
+def _timeouts(args: argparse.Namespace) -> TransferTimeouts:
+    timeouts = TransferTimeouts()
+    if args.min_speed is not None:
+        timeouts.min_speed = args.min_speed
+    if args.read_timeout is not None:
+        timeouts.read = args.read_timeout
+    return timeouts
+
+
+async def run(args: argparse.Namespace, stdin: Optional[TextIO] = None, stderr: Optional[TextIO] = None) -> int:
+    """Download the links of `args`
+
+    Returns:
+        Exit code
+    """
+    stderr = stderr or sys.stderr
+    table = JobTable(iter_links(args.links, stdin))
+    if args.retry_failed:
+        table.extend(failed_links(args.retry_failed))
+    if not table:
+        stderr.write("darkloader: no links to download\n")
+        return EXIT_USAGE
+
+    if args.log_format:
+        os.environ["DARKLOADER_LOG_FORMAT"] = args.log_format
+    dashboard = Dashboard(stderr, len(table))
+    show = not args.no_progress and stderr.isatty()
+    started = time.monotonic()
+    async with DarkLoader(
+        download_dir=args.output,
+        log_level=args.log_level.upper(),
+        min_free_space=args.min_free_space,
+        transport=args.transport,
+        timeouts=_timeouts(args),
+        connections=args.connections,
+        max_rate=args.limit_rate,
+        session_file=args.session_file,
+        small_files=args.small_files,
+    ) as loader:
+        loader.MAX_RESOLVE_ATTEMPTS = args.retries
+        drawing = asyncio.ensure_future(dashboard.run()) if show else None
+        try:
+            await loader.download_jobs(table, concurrency=args.concurrency, progress_cb=dashboard.update)
+        finally:
+            if drawing:
+                drawing.cancel()
+                await asyncio.gather(drawing, return_exceptions=True)
+    elapsed = time.monotonic() - started
+
+    summary = summarize(table, elapsed)
+    for entry in summary["files"]:
+        if not entry["ok"]:
+            stderr.write(f"FAILED {entry['url']}: {entry['error']}\n")
+    stderr.write(
+        f"Downloaded {summary['succeeded']}/{len(table)} files, {format_size(summary['bytes'])} "
+        f"in {format_duration(elapsed)}\n"
+    )
+    if args.summary == "-":
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    elif args.summary:
+        Path(args.summary).write_text(json.dumps(summary, indent=2))
+    return EXIT_FAILED if summary["failed"] else EXIT_OK
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    options = runtime.LoopOptions(args.loop, args.executor_workers, args.slow_callback)
+    try:
+        return runtime.run(run(args), options)
+    except ImportError as e:
+        sys.stderr.write(f"darkloader: {e}\n")
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        # .part files are kept; finished files are skipped on the next run
+        sys.stderr.write("\ndarkloader: interrupted\n")
+        return EXIT_INTERRUPTED
@@ -0,0 +1,149 @@
+"""Cookies and session state of the host plugins, kept between runs
+
+Form-flow hosts hand out session cookies on their landing pages and API
+hosts hand out tokens; getting them again for every run costs round-trips
+(and sometimes an anti-bot warm-up). ``SessionStore`` keeps both in a JSON
+file:
+
+- cookies of the shared transport, restored into it when the resolver binds
+  it, so the resolver and the downloader send them without rebuilding a
+  Cookie header
+- per-host values with an expiry, set by plugins through ``Host.remember``
+  and read back with ``Host.recall``
+
+Expired entries are dropped on load and on read. Session cookies, which
+carry no expiry, are kept for ``SESSION_COOKIE_TTL`` after they were last
+saved. Without a path everything lives in memory and is shared by the
+hosts of one process only.
+"""
+import json
+import os
+import time
+from email.utils import parsedate_to_datetime
+from http.cookies import Morsel
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from darkloader.logger import setup_logger
+
+# Seconds a cookie without expiry is kept after it was saved
+SESSION_COOKIE_TTL = 12 * 60 * 60
+
+
+def cookie_expiry(morsel: Morsel, now: Optional[float] = None) -> Optional[float]:
+    """Epoch seconds a cookie expires at, None for a session cookie"""
+    now = now or time.time()
+    if morsel["max-age"]:
+        try:
+            return now + int(morsel["max-age"])
+        except ValueError:
+            pass
+    if morsel["expires"]:
+        try:
+            return parsedate_to_datetime(morsel["expires"]).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+class SessionStore:
+    """Persistent cookies and per-host state
+
+    Args:
+        path: JSON file the state is loaded from and saved to, None to keep
+            it in memory only
+        log_level: Logging level
+    """
+
+    def __init__(self, path: Optional[Path] = None, log_level: str = "INFO") -> None:
+        self.path = Path(path) if path else None
+        self.logger = setup_logger("SessionStore", log_level)
+        # Cookies as dicts: name, value, domain, path, secure, expires, saved
+        self.cookies: List[dict] = []
+        # Host name -> key -> {"value": ..., "expires": epoch or None}
+        self.state: Dict[str, Dict[str, dict]] = {}
+        if self.path and self.path.exists():
+            self.load()
+
+    def load(self) -> None:
+        """Read the saved state, leaving out what has expired"""
+        try:
+            saved = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            self.logger.warning("Ignoring unreadable session file %s: %s", self.path, e)
+            return
+        now = time.time()
+        self.cookies = [cookie for cookie in saved.get("cookies", []) if not self._expired(cookie, now)]
+        self.state = {
+            host: {key: entry for key, entry in values.items() if not _entry_expired(entry, now)}
+            for host, values in saved.get("state", {}).items()
+        }
+
+    def save(self) -> None:
+        """Write the state, replacing the file atomically"""
+        if self.path is None:
+            return
+        now = time.time()
+        state = {
+            host: {key: entry for key, entry in values.items() if not _entry_expired(entry, now)}
+            for host, values in sorted(self.state.items())
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(self.path.name + ".tmp")
+        temp.write_text(json.dumps({"cookies": self.cookies, "state": {h: v for h, v in state.items() if v}}, indent=2))
+        os.replace(temp, self.path)
+
+    @staticmethod
+    def _expired(cookie: dict, now: float) -> bool:
+        expires = cookie.get("expires")
+        if expires is None:
+            expires = cookie.get("saved", now) + SESSION_COOKIE_TTL
+        return expires <= now
+
+    def restore(self, transport) -> int:
+        """Put the saved cookies into the jar of `transport`
+
+        Returns:
+            Cookies restored
+        """
+        now = time.time()
+        cookies = [cookie for cookie in self.cookies if not self._expired(cookie, now)]
+        if cookies:
+            transport.import_cookies(cookies)
+            self.logger.debug("Restored %d cookies", len(cookies))
+        return len(cookies)
+
+    def capture(self, transport) -> None:
+        """Take the cookies of `transport`'s jar to be saved
+
+        A transport without a live jar leaves the saved cookies as they are.
+        """
+        cookies = transport.export_cookies()
+        if cookies is None:
+            return
+        now = time.time()
+        for cookie in cookies:
+            cookie["saved"] = now
+        self.cookies = [cookie for cookie in cookies if not self._expired(cookie, now)]
+
+    def get(self, host: str, key: str) -> Any:
+        """Value `host` stored under `key`, None if missing or expired"""
+        entry = self.state.get(host, {}).get(key)
+        if entry is None or _entry_expired(entry, time.time()):
+            return None
+        return entry["value"]
+
+    def set(self, host: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a JSON-serializable value for `host`, for `ttl` seconds (None: no expiry)"""
+        self.state.setdefault(host, {})[key] = {"value": value, "expires": time.time() + ttl if ttl else None}
+
+    def forget(self, host: str, key: Optional[str] = None) -> None:
+        """Drop one value of `host`, or all of them"""
+        if key is None:
+            self.state.pop(host, None)
+        else:
+            self.state.get(host, {}).pop(key, None)
+
+
+def _entry_expired(entry: dict, now: float) -> bool:
+    return entry.get("expires") is not None and entry["expires"] <= now
@@ -18,32 +18,29 @@ class MegaDebrid:
         self.token = TOKEN
 
     def get_token(self) -> str:
-        self.logger.debug(f"Getting token with username: {self.USERNAME}")
+        self.logger.debug("Getting token with username: %s", self.USERNAME)
         params = {"action": "connectUser", "login": self.USERNAME, "password": self.PASSWORD}
-        self.logger.debug(f"Sending GET request to {self.API_URL} with params: {params}")
+        self.logger.debug("Sending GET request to %s", self.API_URL)
         
         try:
             response = requests.get(self.API_URL, params=params)
-            self.logger.debug(f"Response status code: {response.status_code}")
-            self.logger.debug(f"Response: {response.text}")
+            self.logger.debug("Response status code: %s", response.status_code)
             response.raise_for_status()
             response_json = response.json()
-            self.logger.debug(f"Response JSON: {response_json}")
             
             self.token = response_json.get("token")
             if self.token:
                 self.logger.info("Successfully obtained token")
-                self.logger.debug(f"Token: {self.token}")
             else:
                 self.logger.error("Failed to obtain token")
             
             return self.token
         except Exception as e:
-            self.logger.error(f"Error getting token: {str(e)}")
+            self.logger.error("Error getting token: %s", e)
             raise
 
     def get_debrid_link(self, url: str) -> str:
-        self.logger.info(f"Getting debrid link for URL: {url}")
+        self.logger.info("Getting debrid link for URL: %s", url)
         if not self.token:
             self.logger.debug("Token not found, getting new token")
             self.get_token()
@@ -51,15 +48,15 @@ class MegaDebrid:
         try:
             response_debrid = self._post_debrid_request(url)
             debrid_link = self._parse_debrid_response(response_debrid)
-            self.logger.info(f"Successfully obtained debrid link")
-            self.logger.debug(f"Debrid link: {debrid_link}")
+            self.logger.info("Successfully obtained debrid link")
+            self.logger.debug("Debrid link: %s", debrid_link)
             return debrid_link
         except Exception as e:
-            self.logger.error(f"Error getting debrid link: {str(e)}")
+            self.logger.error("Error getting debrid link: %s", e)
             raise
 
     def _post_debrid_request(self, url: str) -> requests.Response:
-        self.logger.debug(f"Preparing debrid request for URL: {url}")
+        self.logger.debug("Preparing debrid request for URL: %s", url)
         params = {
             "action": "getLink",
             "token": self.token
@@ -69,29 +66,24 @@ class MegaDebrid:
             "password": ""
         }
         
-        self.logger.debug(f"Sending POST request to {self.API_URL}")
-        self.logger.debug(f"Request params: {params}")
-        self.logger.debug(f"Request data: {data}")
+        self.logger.debug("Sending POST request to %s", self.API_URL)
         
         try:
             response = requests.post(self.API_URL, params=params, data=data)
-            self.logger.debug(f"Response status code: {response.status_code}")
-            self.logger.debug(f"Response headers: {response.headers}")
-            self.logger.debug(f"Response content: {response.text[:200]}...")  # Log first 200 chars
+            self.logger.debug("Response status code: %s", response.status_code)
             return response
         except Exception as e:
-            self.logger.error(f"Error in POST request: {str(e)}")
+            self.logger.error("Error in POST request: %s", e)
             raise
 
     def _parse_debrid_response(self, response: requests.Response) -> str:
         self.logger.debug("Parsing debrid response")
         try:
             data = response.json()
-            self.logger.debug(f"Response JSON: {data}")
             
             if data.get("response_code") != "ok":
                 error_message = data.get("response_text", "Unknown error")
-                self.logger.error(f"API returned error: {error_message}")
+                self.logger.error("API returned error: %s", error_message)
                 raise Exception(error_message)
             
             debrid_link = data.get("debridLink")
@@ -99,8 +91,8 @@ class MegaDebrid:
                 self.logger.error("No debrid link found in response")
                 raise Exception("No debrid link found in response")
                 
-            self.logger.debug(f"Successfully parsed debrid link: {debrid_link}")
+            self.logger.debug("Successfully parsed debrid link: %s", debrid_link)
             return debrid_link
         except Exception as e:
-            self.logger.error(f"Error parsing response: {str(e)}")
+            self.logger.error("Error parsing response: %s", e)
             raise
@@ -0,0 +1,127 @@
+"""Disk space admission and preallocation for downloads
+
+``DiskBudget`` admits a download only while its known size fits in the free
+space of the target filesystem, after subtracting what other admitted
+downloads still need. Admitted files are preallocated, so a full disk fails
+before the transfer starts instead of in the middle of a stream.
+"""
+import asyncio
+import errno
+import os
+import shutil
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Set
+
+from darkloader.logger import setup_logger
+
+# Errors meaning the filesystem can't preallocate, not that it is full
+_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL}
+
+
+class DiskSpaceError(OSError):
+    """Not enough free space for a download"""
+
+    def __init__(self, needed: int, available: int, path: Path) -> None:
+        super().__init__(errno.ENOSPC, f"Not enough space on {path}: need {needed} bytes, {available} available")
+        self.needed = needed
+        self.available = available
+
+
+class Reservation:
+    """Space held for one admitted download until it is written or released"""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.pending = size
+
+    def allocated(self) -> None:
+        """The file has been preallocated; the filesystem now accounts for it"""
+        self.pending = 0
+
+
+class DiskBudget:
+    """Admission control on the free space of one filesystem
+
+    Args:
+        path: Any directory of the filesystem
+        min_free: Bytes always left free on the filesystem
+        log_level: Logging level
+    """
+
+    def __init__(self, path: Path, min_free: int = 0, log_level: str = "INFO") -> None:
+        self.path = Path(path)
+        self.min_free = min_free
+        self.logger = setup_logger("DiskBudget", log_level)
+        self._reservations: Set[Reservation] = set()
+        self._changed: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def reserved(self) -> int:
+        """Bytes admitted but not yet allocated on disk"""
+        return sum(r.pending for r in self._reservations)
+
+    def available(self) -> int:
+        """Free bytes left for new downloads"""
+        return shutil.disk_usage(self.path).free - self.reserved - self.min_free
+
+    @asynccontextmanager
+    async def admit(self, size: Optional[int]):
+        """Hold space for a download of `size` bytes while the block runs
+
+        Unknown sizes (None or 0) are admitted without a reservation. When
+        the file doesn't fit, admission waits while other downloads are in
+        flight (a failed one gives its space back) and raises once none are.
+
+        Raises:
+            DiskSpaceError: If the file can never fit
+        """
+        if not size:
+            yield None
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._changed, self._loop = asyncio.Condition(), loop
+        reservation = Reservation(size)
+        async with self._changed:
+            while (available := self.available()) < size:
+                if not self._reservations:
+                    raise DiskSpaceError(size, max(available, 0), self.path)
+                self.logger.info("Waiting for disk space: need %s bytes, %s available", size, available)
+                await self._changed.wait()
+            self._reservations.add(reservation)
+        try:
+            yield reservation
+        finally:
+            async with self._changed:
+                self._reservations.discard(reservation)
+                self._changed.notify_all()
+
+
+def preallocate(file, size: int) -> bool:
+    """Reserve `size` bytes on disk for an open file
+
+    Returns:
+        True if the blocks were allocated, False if the platform or
+        filesystem can't preallocate
+
+    Raises:
+        DiskSpaceError: If the filesystem is full
+    """
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(file.fileno(), 0, size)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise DiskSpaceError(size, 0, Path(file.name).parent) from e
+        if e.errno in _UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def part_path(path: Path) -> Path:
+    """Temporary path a download is written to before it is complete"""
+    return path.with_name(path.name + ".part")
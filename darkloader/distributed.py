@@ -0,0 +1,373 @@
+"""Distributed mode: several workers pulling from a shared job queue
+
+The queue is a SQLite database, normally on storage shared by every box.
+Workers lease jobs for a limited time and renew the lease with heartbeats
+while downloading; when a worker dies its leases expire and the jobs go back
+to the queue. Per-host rate limits are token buckets stored in the same
+database, so they hold across the whole cluster.
+
+Every operation runs in its own short ``BEGIN IMMEDIATE`` transaction;
+workers mark finished jobs done in batches. Keep the default rollback journal
+on network filesystems: WAL needs shared memory and doesn't work over NFS/SMB.
+"""
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from darkloader.logger import log_context, setup_logger
+
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    dl_path TEXT,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    host TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class Job:
+    """A leased job"""
+    id: int
+    url: str
+    dl_path: Optional[str]
+    attempts: int
+
+
+class _Database:
+    """Short-lived connections to the shared SQLite file"""
+
+    def __init__(self, path: Path, timeout: float = 30) -> None:
+        self.path = Path(path)
+        self.timeout = timeout
+        db = sqlite3.connect(self.path, timeout=timeout)
+        try:
+            db.executescript(_SCHEMA)
+        finally:
+            db.close()
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction holding the database lock from the start"""
+        db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+
+class SQLiteJobQueue(_Database):
+    """Job queue with leases
+
+    Args:
+        path: SQLite file, on shared storage for multi-node use
+        lease_seconds: How long a job stays with a worker without a heartbeat
+        max_attempts: Failed or expired attempts before a job is given up
+    """
+
+    def __init__(self, path: Path, lease_seconds: float = 60, max_attempts: int = 3) -> None:
+        super().__init__(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def add(self, urls: Iterable[str], dl_path: Optional[str] = None) -> int:
+        """Queue URLs, returns how many were added"""
+        now = time.time()
+        rows = [(url, str(dl_path) if dl_path else None, now) for url in urls]
+        with self.transaction() as db:
+            db.executemany("INSERT INTO jobs (url, dl_path, updated) VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def _requeue_expired(self, db, now: float) -> None:
+        # An expired lease counts as a failed attempt of the worker that held it
+        db.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END,"
+            " attempts = attempts + 1, worker = NULL, error = 'lease expired', updated = ?"
+            " WHERE state = ? AND lease_expires < ?",
+            (self.max_attempts, FAILED, QUEUED, now, LEASED, now),
+        )
+
+    def lease(self, worker: str) -> Optional[Job]:
+        """Take the oldest queued job, None when nothing is queued"""
+        now = time.time()
+        with self.transaction() as db:
+            self._requeue_expired(db, now)
+            row = db.execute(
+                "SELECT id, url, dl_path, attempts FROM jobs WHERE state = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, updated = ? WHERE id = ?",
+                (LEASED, worker, now + self.lease_seconds, now, row[0]),
+            )
+        return Job(*row)
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """Extend a lease; False if the worker no longer holds the job"""
+        now = time.time()
+        with self.transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND worker = ? AND state = ?",
+                (now + self.lease_seconds, now, job_id, worker, LEASED),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result: str) -> bool:
+        """Mark a job done; False if the lease was lost meanwhile"""
+        with self.transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = NULL, lease_expires = NULL, updated = ?"
+                " WHERE id = ? AND worker = ? AND state = ?",
+                (DONE, result, time.time(), job_id, worker, LEASED),
+            )
+        return cursor.rowcount == 1
+
+    def complete_many(self, results: Iterable[Tuple[int, str, str]]) -> int:
+        """Mark several jobs done in one transaction
+
+        Args:
+            results: (job id, worker, result) of each job
+
+        Returns:
+            Jobs marked done; the others' leases were lost meanwhile
+        """
+        now = time.time()
+        rows = [(DONE, result, now, job_id, worker, LEASED) for job_id, worker, result in results]
+        if not rows:
+            return 0
+        done = 0
+        with self.transaction() as db:
+            for row in rows:
+                done += db.execute(
+                    "UPDATE jobs SET state = ?, result = ?, error = NULL, lease_expires = NULL, updated = ?"
+                    " WHERE id = ? AND worker = ? AND state = ?",
+                    row,
+                ).rowcount
+        return done
+
+    def fail(self, job_id: int, worker: str, error: str, retry: bool = True) -> bool:
+        """Record a failed attempt, re-queueing the job while attempts remain"""
+        with self.transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET state = CASE WHEN ? AND attempts + 1 < ? THEN ? ELSE ? END,"
+                " attempts = attempts + 1, worker = NULL, lease_expires = NULL, error = ?, updated = ?"
+                " WHERE id = ? AND worker = ? AND state = ?",
+                (retry, self.max_attempts, QUEUED, FAILED, error, time.time(), job_id, worker, LEASED),
+            )
+        return cursor.rowcount == 1
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs per state"""
+        with self.transaction() as db:
+            self._requeue_expired(db, time.time())
+            rows = db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def pending(self) -> int:
+        """Jobs queued or being worked on"""
+        stats = self.stats()
+        return stats[QUEUED] + stats[LEASED]
+
+
+class SQLiteRateLimiter(_Database):
+    """Cluster-wide token bucket per host
+
+    Args:
+        path: SQLite file shared by the workers (may be the queue's)
+        limits: {host: (requests per second, burst)}; hosts not listed are
+            not limited
+    """
+
+    def __init__(self, path: Path, limits: Dict[str, Tuple[float, float]]) -> None:
+        super().__init__(path)
+        self.limits = limits
+
+    def try_acquire(self, host: str) -> float:
+        """Take a token for `host`
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one is available
+        """
+        if host not in self.limits:
+            return 0.0
+        rate, burst = self.limits[host]
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute("SELECT tokens, updated FROM rate_limits WHERE host = ?", (host,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            db.execute(
+                "INSERT INTO rate_limits (host, tokens, updated) VALUES (?, ?, ?)"
+                " ON CONFLICT(host) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (host, tokens, now),
+            )
+        return wait
+
+    async def acquire(self, host: str) -> None:
+        """Wait until `host` may be contacted"""
+        while (wait := await asyncio.to_thread(self.try_acquire, host)) > 0:
+            await asyncio.sleep(wait)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class Worker:
+    """Runs queued jobs through a DarkLoader
+
+    Args:
+        loader: DarkLoader doing the downloads
+        queue: Shared job queue
+        limiter: Cluster-wide rate limiter, optional
+        worker_id: Unique name of this worker
+        concurrency: Jobs run at the same time
+        poll_interval: Seconds between lease attempts when the queue is empty
+        complete_batch: Finished jobs marked done in one transaction; with
+            many small files one write per job would hold the database lock
+            more than the downloads take
+        complete_interval: Most seconds a finished job waits to be marked
+            done, well below the lease time since its heartbeat has stopped
+    """
+
+    def __init__(
+        self,
+        loader,
+        queue: SQLiteJobQueue,
+        limiter: Optional[SQLiteRateLimiter] = None,
+        worker_id: Optional[str] = None,
+        concurrency: int = 4,
+        poll_interval: float = 2.0,
+        log_level: str = "INFO",
+        complete_batch: int = 32,
+        complete_interval: float = 0.5,
+    ) -> None:
+        self.loader = loader
+        self.queue = queue
+        self.limiter = limiter
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.complete_batch = complete_batch
+        self.complete_interval = complete_interval
+        self.logger = setup_logger("Worker", log_level)
+        # (job id, worker, result) of finished jobs not yet marked done
+        self._completed: List[Tuple[int, str, str]] = []
+
+    async def run(self, stop_when_empty: bool = True) -> None:
+        """Lease and run jobs until the queue is drained (or forever)
+
+        Args:
+            stop_when_empty: Return once no job is queued or leased by anyone
+        """
+        self.logger.info("Worker %s started", self.worker_id)
+        flusher = asyncio.create_task(self._flush_periodically())
+        try:
+            await asyncio.gather(*(self._slot(stop_when_empty) for _ in range(self.concurrency)))
+        finally:
+            flusher.cancel()
+            with suppress(asyncio.CancelledError):
+                await flusher
+            await self.flush()
+        self.logger.info("Worker %s finished", self.worker_id)
+
+    async def flush(self) -> None:
+        """Mark the finished jobs done"""
+        if not self._completed:
+            return
+        results, self._completed = self._completed, []
+        done = await asyncio.to_thread(self.queue.complete_many, results)
+        if done < len(results):
+            self.logger.warning("Leases of %d finished jobs were lost", len(results) - done)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.complete_interval)
+            await self.flush()
+
+    async def _slot(self, stop_when_empty: bool) -> None:
+        while True:
+            job = await asyncio.to_thread(self.queue.lease, self.worker_id)
+            if job is None:
+                # Our own finished jobs still count as leased until flushed
+                await self.flush()
+                # Leases held by other workers may still expire and come back
+                if stop_when_empty and await asyncio.to_thread(self.queue.pending) == 0:
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self.run_job(job)
+
+    async def run_job(self, job: Job) -> None:
+        """Download one leased job, heartbeating while it runs
+
+        The job is marked done by the next ``flush``.
+        """
+        with log_context(job=job.id, worker=self.worker_id):
+            download = asyncio.create_task(self._download(job))
+            heartbeat = asyncio.create_task(self._heartbeat(job, download))
+            try:
+                path = await download
+            except asyncio.CancelledError:
+                if heartbeat.done():
+                    self.logger.warning("Lease of job %s lost, dropped", job.id)
+                    return
+                raise
+            except Exception as e:
+                self.logger.error("Job %s failed: %s", job.id, e)
+                await asyncio.to_thread(self.queue.fail, job.id, self.worker_id, str(e) or type(e).__name__)
+                return
+            finally:
+                heartbeat.cancel()
+                with suppress(asyncio.CancelledError):
+                    await heartbeat
+            self._completed.append((job.id, self.worker_id, str(path)))
+            if len(self._completed) >= self.complete_batch:
+                await self.flush()
+
+    async def _download(self, job: Job) -> str:
+        if self.limiter is not None:
+            await self.limiter.acquire(urlparse(job.url).netloc.lower())
+        return await self.loader.download_url(job.url, Path(job.dl_path) if job.dl_path else None)
+
+    async def _heartbeat(self, job: Job, download: asyncio.Task) -> None:
+        interval = self.queue.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            if not await asyncio.to_thread(self.queue.heartbeat, job.id, self.worker_id):
+                download.cancel()
+                return
@@ -1,33 +1,277 @@
+import asyncio
+import json
 import re
-import requests
+import time
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Optional, Tuple, TypedDict, Union
+from urllib.parse import unquote, urlparse
+
+import aiohttp
+
+from darkloader.captcha import CaptchaService, CaptchaSolver, Payload, get_captcha_service
+from darkloader.cookies import SessionStore
+from darkloader.logger import setup_logger
+from darkloader.probe import ProbeResult
+from darkloader.proxies import current_exit
+from darkloader.transport import Transport
 
 DEFAULT_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
     'Accept-Language': 'en-US,en;q=0.5',
 }
 
-from typing import TypedDict, Optional
+
+class HostError(Exception):
+    """Base exception for host resolution errors"""
 
 
-class FileNotFoundError(Exception):
+class FileNotFoundError(HostError):
     """Exception raised when a file is not found on the host."""
     pass
 
-class DirectLinkResult(TypedDict):
-    """Type definition for the direct link response structure."""
+
+class HostHTTPError(HostError):
+    """Host answered with an error status"""
+
+    def __init__(self, status: int, url: str) -> None:
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+
+
+class _DirectLinkFields(TypedDict):
     url: str
     filename: str
     headers: dict
-    payload: Optional[dict] 
-    
+    payload: Optional[dict]
+
+
+class DirectLinkResult(_DirectLinkFields, total=False):
+    """Type definition for the direct link response structure.
+
+    url, filename, headers and payload are always present; size (bytes),
+    hash ("<algorithm>:<hexdigest>"), expires_at (epoch seconds),
+    connections (most parallel connections per file) and error_patterns
+    (regexes of the host's error pages, see ``darkloader.sniff``) are set
+    when the host reports or implies them.
+    """
+    size: Optional[int]
+    hash: Optional[str]
+    expires_at: Optional[float]
+    connections: Optional[int]
+    error_patterns: Tuple[str, ...]
+
+
+@dataclass
+class HostResponse:
+    """Fully read response of a host page or API call"""
+    status: int
+    url: str
+    headers: Mapping[str, str]
+    text: str
+    content: bytes = b""
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise HostHTTPError(self.status, self.url)
+
+
+def is_expired(link: DirectLinkResult, margin: float = 0) -> bool:
+    """Whether a resolved link has expired, or will within `margin` seconds"""
+    expires_at = link.get("expires_at")
+    return expires_at is not None and expires_at - margin <= time.time()
+
+
+def filename_from_content_disposition(content_disposition: str) -> Optional[str]:
+    """Filename from a Content-Disposition header, preferring filename*"""
+    match = re.search(r"filename\*\s*=\s*(?:[\w-]+'[\w-]*')?([^;]+)", content_disposition, re.I)
+    if not match:
+        match = re.search(r'filename\s*=\s*"?([^";]+)"?', content_disposition, re.I)
+    return unquote(match.group(1).strip().strip('"\'')) if match else None
+
+
 class Host:
-    def __init__(self, name, domain, url_pattern):
-        self.name = name
-        self.domain = domain
-        self.url_pattern = url_pattern
-        self.session = requests.Session()
-        self.session.headers.update(DEFAULT_HEADERS)
-    def get_direct_link(self, url: str) -> DirectLinkResult:
+    """Async base class for hosting services
+
+    Subclasses declare the domains they handle and implement
+    ``get_direct_link``. All HTTP goes through ``request`` on a session that
+    is normally shared by every host of a LinkResolver, so connections and
+    cookies are reused across links.
+
+    Args:
+        session: Shared aiohttp session; one is created (and owned) if omitted
+        captcha_service: Service used by ``solve_captcha``
+        transport: Shared transport requests go through; without one they
+            use `session` directly
+        store: Session state shared by the hosts and kept between runs (see
+            ``remember``); an in-memory one of its own if omitted
+    """
+    name: str = ""
+    domains: tuple = ()
+    # Parallel resolutions of this host in resolve_many
+    max_concurrency: int = 4
+    # Typical lifetime of a resolved link in seconds, None if unknown
+    link_ttl: Optional[float] = None
+    # Parallel connections a direct link accepts, None if not limited
+    max_connections: Optional[int] = None
+    # Regexes of error pages the host serves in place of a file
+    error_patterns: Tuple[str, ...] = ()
+    # Set when links of this host can't be resolved at the moment
+    disabled_reason: Optional[str] = None
+
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        captcha_service: Optional[CaptchaService] = None,
+        transport: Optional[Transport] = None,
+        store: Optional[SessionStore] = None,
+    ) -> None:
+        self._session = session
+        self.transport = transport
+        self.store = store or SessionStore()
+        self._owns_session = session is None
+        self.captcha_service = captcha_service
+        self.headers = dict(DEFAULT_HEADERS)
+        self.logger = setup_logger(f"Host.{self.name or type(self).__name__}")
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+            self._owns_session = True
+        return self._session
+
+    async def close(self) -> None:
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    def matches(self, url: str) -> bool:
+        domain = urlparse(url).netloc.lower()
+        return any(domain == d or domain.endswith("." + d) for d in self.domains)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[dict] = None,
+        data: Optional[Union[dict, str, bytes]] = None,
+        params: Optional[dict] = None,
+        allow_redirects: bool = True,
+        timeout: float = 30,
+    ) -> HostResponse:
+        """Send a request and read the whole body
+
+        Args:
+            method: HTTP method
+            url: Target URL
+            headers: Extra headers on top of the host's defaults
+            data: Form fields or raw body
+            params: Query parameters
+            allow_redirects: Follow redirects
+            timeout: Total timeout in seconds
+
+        Returns:
+            HostResponse
+        """
+        headers = {**self.headers, **(headers or {})}
+        # Routed through the exit leased for the current download, if any
+        exit = current_exit()
+        if exit is None and self.transport is not None:
+            response = await self.transport.request(
+                method, url, headers=headers, data=data, params=params, allow_redirects=allow_redirects, timeout=timeout
+            )
+            return HostResponse(response.status, response.url, response.headers, response.text, response.content)
+
+        session = exit.session(self.session) if exit else self.session
+        async with session.request(
+            method,
+            url,
+            headers=headers,
+            data=data,
+            params=params,
+            allow_redirects=allow_redirects,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            proxy=exit.proxy if exit else None,
+        ) as response:
+            content = b"" if method.upper() == "HEAD" else await response.read()
+            text = await response.text(errors="replace") if content else ""
+            return HostResponse(response.status, str(response.url), response.headers, text, content)
+
+    async def get(self, url: str, **kwargs) -> HostResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> HostResponse:
+        return await self.request("POST", url, **kwargs)
+
+    async def head(self, url: str, **kwargs) -> HostResponse:
+        return await self.request("HEAD", url, **kwargs)
+
+    async def countdown(self, seconds: float) -> None:
+        """Wait out a host's mandatory countdown on an event-loop timer"""
+        self.logger.debug("Waiting %ss countdown", seconds)
+        await asyncio.sleep(seconds)
+
+    async def solve_captcha(self, solver: CaptchaSolver, payload: Payload) -> str:
+        """Solve a captcha through the (process pool backed) captcha service"""
+        return await (self.captcha_service or get_captcha_service()).solve(solver, payload)
+
+    def remember(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Keep a value (token, warm-up result...) for later links and runs
+
+        Args:
+            key: Name of the value, scoped to this host
+            value: JSON-serializable value
+            ttl: Seconds it stays valid, None for as long as it is saved
+        """
+        self.store.set(self.name, key, value, ttl)
+
+    def recall(self, key: str) -> Any:
+        """Value kept with ``remember``, None if missing or expired"""
+        return self.store.get(self.name, key)
+
+    def forget(self, key: str) -> None:
+        """Drop a value the host turned out to reject"""
+        self.store.forget(self.name, key)
+
+    def cookie_header(self, url: str) -> dict:
+        """Cookie header with the session cookies that apply to `url`"""
+        if self.transport is not None:
+            return self.transport.cookie_header(url)
+        cookies = self.session.cookie_jar.filter_cookies(url)
+        if not cookies:
+            return {}
+        return {"Cookie": "; ".join(f"{key}={morsel.value}" for key, morsel in cookies.items())}
+
+    def result(
+        self,
+        url: str,
+        filename: str,
+        headers: Optional[dict] = None,
+        payload: Optional[dict] = None,
+        size: Optional[int] = None,
+        hash: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ) -> DirectLinkResult:
+        """Build a DirectLinkResult, estimating expiry from the host's link TTL"""
+        ttl = ttl if ttl is not None else self.link_ttl
+        return {
+            "url": url,
+            "filename": filename,
+            "headers": headers if headers is not None else dict(self.headers),
+            "payload": payload,
+            "size": size,
+            "hash": hash,
+            "expires_at": time.time() + ttl if ttl else None,
+            "connections": self.max_connections,
+            "error_patterns": self.error_patterns,
+        }
+
+    async def get_direct_link(self, url: str) -> DirectLinkResult:
         """
         Retrieves a direct download link and associated metadata from a source URL.
 
@@ -39,32 +283,69 @@ class Host:
                 - url (str): Direct download URL (e.g., 'https://cdn.example.com/file.ext').
                 - filename (str): Suggested filename with extension (e.g., 'report.pdf').
                 - headers (dict): Required HTTP headers (e.g., {'Authorization': 'Bearer token'}).
-                - payload (dict, optional): Additional request parameters if needed by the API. 
-                Defaults to None if no payload is required.
+                - payload (dict, optional): POST fields if the download is a form submit.
+                - size (int, optional): File size in bytes if known.
+                - hash (str, optional): "<algorithm>:<hexdigest>" if the host publishes one.
+                - expires_at (float, optional): Estimated expiry of the link (epoch seconds).
 
         Raises:
             ValueError: If the input URL is empty or malformed.
-            requests.HTTPError: If the API responds with a non-200 status code.
-            TimeoutError: If the request exceeds the allowed timeout duration.
+            HostError: If the host reports an error or the page can't be parsed.
+        """
+        raise NotImplementedError
 
-        Examples:
-            >>> result = get_direct_link("https://api.service.com/v1/content/123")
-            >>> print(result["url"])  # Output: 'https://cdn.service.com/abc123.pdf'
-            >>> print(result["payload"])  # Output: None (or {'expires_in': 3600} if present)
+    async def get_filename(self, url: str) -> str:
+        """Filename of the file behind `url`; hosts with a cheaper lookup override this"""
+        return (await self.get_direct_link(url))["filename"]
+
+    async def resolve_many(self, urls: List[str]) -> List[Union[DirectLinkResult, BaseException]]:
+        """Resolve several links of this host, at most `max_concurrency` at a time
+
+        Returns:
+            A result or the raised exception for each URL, in order
         """
-        pass
-    def _get_target_url(self, url: str) -> str:
-        target_url = url if url is not None else self.url
-        if not target_url:
-            raise ValueError("Input URL is empty")
-    def _get_filename_from_direct_link(self, direct_link) -> str:
-        head_response = self.session.head(direct_link)
-        content_disposition = head_response.headers.get('Content-Disposition', '')
-        if content_disposition:
-            filename = re.search(r'filename=(.*?);', content_disposition)
-            if filename:
-                return filename.group(1)
-        if not filename and direct_link:
-            filename = direct_link.split('/')[-1].split('?')[0]
-        return None
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def resolve(url):
+            async with semaphore:
+                return await self.get_direct_link(url)
+
+        return await asyncio.gather(*(resolve(url) for url in urls), return_exceptions=True)
+
+    def _probe_error(self, url: str, error: Exception) -> ProbeResult:
+        """ProbeResult for a failed lookup; only explicit not-found answers mark it unavailable"""
+        missing = isinstance(error, FileNotFoundError) or (isinstance(error, HostHTTPError) and error.status in (404, 410))
+        return ProbeResult(url, self.name, available=False if missing else None, error=str(error) or type(error).__name__)
+
+    async def probe(self, url: str) -> ProbeResult:
+        """Filename, size and availability of `url`
 
+        The default only looks up the filename; hosts whose metadata is
+        cheaper than a full resolution (an API call, no countdown) override it.
+        """
+        try:
+            filename = await self.get_filename(url)
+        except Exception as e:
+            return self._probe_error(url, e)
+        return ProbeResult(url, self.name, filename, available=bool(filename))
+
+    async def probe_many(self, urls: List[str]) -> List[ProbeResult]:
+        """Probe several links, at most `max_concurrency` at a time
+
+        Hosts with a batch info endpoint override this.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def probe(url):
+            async with semaphore:
+                return await self.probe(url)
+
+        return list(await asyncio.gather(*(probe(url) for url in urls)))
+
+    async def _filename_from_direct_link(self, direct_link: str) -> Optional[str]:
+        """Filename from a HEAD of the direct link, falling back to the URL path"""
+        head_response = await self.head(direct_link)
+        filename = filename_from_content_disposition(head_response.headers.get('Content-Disposition', ''))
+        if not filename and direct_link:
+            filename = unquote(direct_link.split('/')[-1].split('?')[0])
+        return filename or None
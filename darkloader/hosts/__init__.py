@@ -1 +1,24 @@
+# Registro de hosts soportados; LinkResolver prueba cada uno en orden
+from darkloader.hosts.anonfile import AnonFile
+from darkloader.hosts.desiupload import DesiUpload
+from darkloader.hosts.downloadgg import DownloadGG
+from darkloader.hosts.gofile import GoFile
+from darkloader.hosts.kraken import Kraken
+from darkloader.hosts.onefichier import OneFichier
+from darkloader.hosts.pixeldrain import Pixeldrain
+from darkloader.hosts.ranoz import Ranoz
+from darkloader.hosts.uploadscloud import UploadsCloud
 
+HOSTS = (
+    GoFile,
+    Ranoz,
+    OneFichier,
+    Pixeldrain,
+    UploadsCloud,
+    DownloadGG,
+    DesiUpload,
+    AnonFile,
+    Kraken,
+)
+
+__all__ = [cls.__name__ for cls in HOSTS] + ["HOSTS"]
@@ -1,22 +1,30 @@
 # download.gg
-from typing import Tuple
-from bs4 import BeautifulSoup
-import requests
-def get_direct_link(url: str) -> Tuple[str, str, dict, dict]:
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
-    form = soup.find("form")
-    action_url = form.get("action")
-    payload = {inp["name"]: inp["value"] for inp in form.find_all("input", {"type": "hidden"})}
-    filename = soup.select_one(".uploadProgress .name").get_text()
-    cookies_dict = response.cookies.get_dict()  
-    cookie_header = "; ".join([f"{k}={v}" for k, v in cookies_dict.items()])
-    headers = {"Cookie": cookie_header}
-    return action_url, filename, headers, payload
-    
-def get_filename(url: str) -> str:
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
-    filename = soup.select_one(".uploadProgress .name").get_text()
-    return filename
-    
\ No newline at end of file
+from urllib.parse import urljoin
+
+from darkloader.host import DirectLinkResult, Host
+from darkloader.scraping import extract_form, find_text
+
+
+def _extract_filename(html: str) -> str:
+    return find_text(html, None, "class", "name", html.find("uploadProgress"))
+
+
+class DownloadGG(Host):
+    name = "download.gg"
+    domains = ("download.gg",)
+
+    async def get_direct_link(self, url: str) -> DirectLinkResult:
+        response = await self.get(url)
+        response.raise_for_status()
+        html = response.text
+        form = extract_form(html, input_type="hidden")
+        if not form:
+            raise ValueError("Download form not found in the page")
+        action = urljoin(url, form.action)
+        # La descarga es un POST del formulario con las cookies de la página
+        headers = {**self.headers, **self.cookie_header(action)}
+        return self.result(action, _extract_filename(html), headers=headers, payload=form.inputs)
+
+    async def get_filename(self, url: str) -> str:
+        response = await self.get(url)
+        return _extract_filename(response.text)
@@ -1,7 +1,10 @@
-import requests
 import hashlib
 import os
-from typing import Optional, Tuple, Any
+from typing import Optional
+
+from darkloader.host import DirectLinkResult, FileNotFoundError, Host, HostHTTPError
+from darkloader.probe import ProbeResult
+
 
 class GoFileError(Exception):
     """Base exception for GoFile operations"""
@@ -18,48 +21,63 @@ class AuthenticationError(GoFileError):
 class ContentError(GoFileError):
     """Invalid content structure or missing data"""
 
-class Client:
-    def __init__(self):
-        self.user_agent = os.getenv("GF_USERAGENT") or "Mozilla/5.0"
-        self._token = os.getenv("GF_TOKEN") or self._get_token()
+class GoFile(Host):
+    name = "gofile"
+    domains = ("gofile.io",)
+    API_URL = "https://api.gofile.io"
+    # Answers of the store servers when the token or the link is no longer valid
+    error_patterns = (r'"status"\s*:\s*"error-',)
+    # Seconds an anonymous account token is reused, across runs with a session file
+    TOKEN_TTL = 24 * 60 * 60
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.headers["User-Agent"] = os.getenv("GF_USERAGENT") or "Mozilla/5.0"
+        self._token = os.getenv("GF_TOKEN")
 
-    def _get_token(self) -> str:
-        """Fetch a new API token from GoFile"""
+    async def _get_token(self) -> str:
+        """Fetch a new API token from GoFile, once per session store"""
+        if self._token:
+            return self._token
+        if token := self.recall("token"):
+            self._token = token
+            return token
         try:
-            response = requests.post(
-                "https://api.gofile.io/accounts",
-                headers={"User-Agent": self.user_agent},
-                timeout=10
-            )
+            response = await self.post(f"{self.API_URL}/accounts", timeout=10)
             response.raise_for_status()
             data = response.json()
-            
+
             if data.get("status") != "ok":
                 raise TokenError("Failed to create anonymous account")
-                
-            return data["data"]["token"]
-            
+
+            self._token = data["data"]["token"]
+            self.remember("token", self._token, self.TOKEN_TTL)
+            return self._token
+
+        except TokenError:
+            raise
         except Exception as e:
             raise TokenError(f"Token acquisition failed: {str(e)}") from e
-    def get_filename(self, url, password = None):
-        content_id = self._extract_content_id(url)
-        api_url = self._build_api_url(content_id, password)
-        response = self._make_api_request(api_url)
-        # is tuple the filename are in 1 position
-        filename = self._parse_response(response, content_id)[1]
-        return filename
-    def get_direct_link(self, url: str, password: Optional[str] = None) -> Tuple[str, str, any, None]:
+
+    async def get_direct_link(self, url: str, password: Optional[str] = None) -> DirectLinkResult:
         try:
             content_id = self._extract_content_id(url)
-            api_url = self._build_api_url(content_id, password)
-            response = self._make_api_request(api_url)
-            return *self._parse_response(response, content_id), None
-            
-        except GoFileError:
+            data = await self._make_api_request(content_id, password)
+            return self._parse_response(data, content_id)
+
+        except (GoFileError, FileNotFoundError, HostHTTPError, ValueError):
             raise
         except Exception as e:
             raise GoFileError(f"Operation failed: {str(e)}") from e
 
+    async def probe(self, url: str) -> ProbeResult:
+        # La API ya da nombre y tamaño, así que resolver es igual de barato
+        try:
+            result = await self.get_direct_link(url)
+        except Exception as e:
+            return self._probe_error(url, e)
+        return ProbeResult(url, self.name, result["filename"], result["size"], available=True)
+
     def _extract_content_id(self, url: str) -> str:
         """Validate URL format and extract content ID"""
         parts = url.strip().split("/")
@@ -67,47 +85,70 @@ class Client:
             raise ValueError("Invalid GoFile URL format")
         return parts[-1]
 
-    def _build_api_url(self, content_id: str, password: Optional[str]) -> str:
-        """Construct API endpoint URL with parameters"""
-        base_url = f"https://api.gofile.io/contents/{content_id}"
-        params = "wt=4fd6sg89d7s6&cache=true&sortField=createTime&sortDirection=1"
-        
+    def _build_params(self, password: Optional[str]) -> dict:
+        """Query parameters of the contents endpoint"""
+        params = {"wt": "4fd6sg89d7s6", "cache": "true", "sortField": "createTime", "sortDirection": "1"}
         if password:
-            hashed_pw = hashlib.sha256(password.encode()).hexdigest()
-            params += f"&password={hashed_pw}"
-            
-        return f"{base_url}?{params}"
-
-    def _make_api_request(self, api_url: str) -> dict:
-        """Execute authenticated API request"""
-        headers = {
-            "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self._token}"
+            params["password"] = hashlib.sha256(password.encode()).hexdigest()
+        return params
+
+    def _auth_headers(self) -> dict:
+        """Headers needed by the API and by the file servers"""
+        return {
+            "User-Agent": self.headers["User-Agent"],
+            "Authorization": f"Bearer {self._token}",
+            "Cookie": f"accountToken={self._token}",
         }
-        self.headers = headers
-        response = requests.get(api_url, headers=headers, timeout=15)
-        response.raise_for_status()
+
+    async def _make_api_request(self, content_id: str, password: Optional[str], retried: bool = False) -> dict:
+        """Execute authenticated API request, with a new token once if the saved one is refused"""
+        await self._get_token()
+        response = await self.get(
+            f"{self.API_URL}/contents/{content_id}",
+            params=self._build_params(password),
+            headers=self._auth_headers(),
+            timeout=15,
+        )
+        if response.status == 401 and not retried and self._token == self.recall("token"):
+            # The saved token was revoked: create another one
+            self.forget("token")
+            self._token = None
+            return await self._make_api_request(content_id, password, retried=True)
+        if response.status >= 400:
+            raise HostHTTPError(response.status, response.url)
         return response.json()
 
-    def _parse_response(self, data: dict, content_id: str) -> Tuple[str, str, any]:
+    def _file_result(self, content: dict) -> DirectLinkResult:
+        md5 = content.get("md5")
+        return self.result(
+            content["link"],
+            content["name"],
+            headers=self._auth_headers(),
+            size=content.get("size"),
+            hash=f"md5:{md5}" if md5 else None,
+        )
+
+    def _parse_response(self, data: dict, content_id: str) -> DirectLinkResult:
         """Validate and extract download link and filename from API response"""
+        if data.get("status") == "error-notFound":
+            raise FileNotFoundError(f"GoFile content {content_id} not found")
         if data.get("status") != "ok":
             raise APIError(f"API Error: {data.get('message', 'Unknown error')}")
-            
+
         content = data.get("data", {})
-        
+
         if content.get("passwordStatus") == "passwordRequired":
             raise AuthenticationError("Password required")
         if content.get("passwordStatus") == "passwordIncorrect":
             raise AuthenticationError("Incorrect password")
-            
+
         if content.get("type") == "file":
-            return (content["link"], content["name"])
-            
+            return self._file_result(content)
+
         if content.get("type") == "folder":
             for child in content.get("children", {}).values():
                 if child.get("type") == "file":
-                    return (child["link"], child["name"], self.headers)
+                    return self._file_result(child)
             raise ContentError(f"No files found in folder {content_id}")
-            
-        raise ContentError("Unknown content type in response")
\ No newline at end of file
+
+        raise ContentError("Unknown content type in response")
@@ -1,24 +1,26 @@
-import cgi
-import os
-import shutil
+import re
 
-import requests
-from bs4 import BeautifulSoup
+from darkloader.host import DirectLinkResult, Host
+from darkloader.scraping import iter_inputs
+
+_FILE_HASH_RE = re.compile(r'<div\b[^>]*\bdata-file-hash\s*=\s*["\']([^"\']+)["\']', re.I)
 
 
 class HashNotFoundException(Exception):
-    def __init__(self, exception):
-        super(exception)
+    pass
 
 
 class LinkPostFailure(Exception):
-    def __init__(self, exception):
-        super(exception)
+    pass
+
 
+class Kraken(Host):
+    name = "krakenfiles"
+    domains = ("krakenfiles.com",)
 
-class Kraken:
+    _boundary = "----WebKitFormBoundary7MA4YWxkTrZu0gW"
     _base_headers = {
-        "content-type": "multipart/form-data; boundary=----WebKitFormBoundary7MA4YWxkTrZu0gW",
+        "content-type": f"multipart/form-data; boundary={_boundary}",
         "cache-control": "no-cache",
     }
 
@@ -26,58 +28,36 @@ class Kraken:
 
     KRAKEN_BASE_URL = "https://krakenfiles.com"
 
-    def __init__(self, session: requests.Session = requests.session()):
-        self.session = session
-
-    def get_download_link(self, page_link: str) -> str:
-
-        page_resp = self.session.get(page_link)
-        soup = BeautifulSoup(page_resp.text, "lxml")
+    async def get_direct_link(self, url: str) -> DirectLinkResult:
+        page_resp = await self.get(url)
+        page_resp.raise_for_status()
+        html = page_resp.text
 
         # parse token
-        token = soup.find("input", id="dl-token")["value"]
+        token = next((attrs.get("value") for attrs in iter_inputs(html) if attrs.get("id") == "dl-token"), None)
+        if not token:
+            raise LinkPostFailure(f"Download token not found for page_link: {url}")
 
         # attempt to find hash
-        hashes = [
-            item["data-file-hash"]
-            for item in soup.find_all("div", attrs={"data-file-hash": True})
-        ]
-        if len(hashes) < 1:
-            raise HashNotFoundException(f"Hash not found for page_link: {page_link}")
+        hash_match = _FILE_HASH_RE.search(html)
+        if not hash_match:
+            raise HashNotFoundException(f"Hash not found for page_link: {url}")
 
-        dl_hash = hashes[0]
+        dl_hash = hash_match.group(1)
 
-        payload = f'------WebKitFormBoundary7MA4YWxkTrZu0gW\r\nContent-Disposition: form-data; name="token"\r\n\r\n{token}\r\n------WebKitFormBoundary7MA4YWxkTrZu0gW--'
+        payload = f'--{self._boundary}\r\nContent-Disposition: form-data; name="token"\r\n\r\n{token}\r\n--{self._boundary}--'
         headers = {
             **self._base_headers,
             "hash": dl_hash,
         }
 
-        dl_link_resp = self.session.post(
-            f"{self.KRAKEN_BASE_URL}/download/{dl_hash}", data=payload, headers=headers
-        )
-        print(dl_link_resp)
+        dl_link_resp = await self.post(f"{self.KRAKEN_BASE_URL}/download/{dl_hash}", data=payload, headers=headers)
+        dl_link_resp.raise_for_status()
         dl_link_json = dl_link_resp.json()
 
-        if self.URL_KEY in dl_link_json:
-            return dl_link_json[self.URL_KEY]
-        else:
-            raise LinkPostFailure(
-                f"Failed to acquire download URL from kraken for page_link: {page_link}"
-            )
-
-    def download_file(self, page_link: str, path: str = "./") -> str:
-        dl_link = self.get_download_link(page_link)
-
-        with self.session.get(dl_link, headers=self._base_headers, stream=True) as r:
-            _, params = cgi.parse_header(r.headers["content-disposition"])
-            fname = params["filename"]
-            with open(os.path.join(path, fname), "wb") as f:
-                shutil.copyfileobj(r.raw, f)
-
-            return os.path.join(path, fname)
-        
-        
-k = Kraken()
-dl = k.get_download_link("https://krakenfiles.com/view/s6ICUmbgDm/file.html")
-print(dl, "dl")
\ No newline at end of file
+        if self.URL_KEY not in dl_link_json:
+            raise LinkPostFailure(f"Failed to acquire download URL from kraken for page_link: {url}")
+
+        dl_link = dl_link_json[self.URL_KEY]
+        filename = await self._filename_from_direct_link(dl_link)
+        return self.result(dl_link, filename)
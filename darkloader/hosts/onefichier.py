@@ -1,12 +1,14 @@
-import requests
 import re
+from typing import Optional
 from urllib.parse import unquote
 
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                    'AppleWebKit/537.36 (KHTML, like Gecko) '
-                    'Chrome/120.0.0.0 Safari/537.36'
-}
+import aiohttp
+
+from darkloader.host import DirectLinkResult, Host
+
+_FILENAME_RE = re.compile(r'<td class="normal">([^<]+)</td>')
+_ADZ_RE = re.compile(r'name="adz" value="([\d\.]+)"')
+_LINK_RE = re.compile(r'<a href="(https?://[^"]+)"[^>]*>Click here to download the file</a>')
 
 
 class DirectLinkError(Exception):
@@ -17,36 +19,56 @@ def sanitize_filename(filename):
     return re.sub(r'[\\/*?:"<>|]', '', filename).strip()
 
 
-def _handle_errors(response, password):
-    if "deleted for inactivity" in response.text:
+def _check_available(html):
+    if "deleted for inactivity" in html:
         raise DirectLinkError("File removed due to inactivity")
-    if "does not exist" in response.text:
+    if "does not exist" in html:
         raise DirectLinkError("File not found")
-    if "id=\"pass\"" in response.text and not password:
+
+
+def _handle_errors(html, password=None):
+    _check_available(html)
+    if "id=\"pass\"" in html and not password:
         raise DirectLinkError("Password required")
 
 
-def get_direct_link(url, password=None):
-    with requests.Session() as session:
+def _extract_filename(html, url):
+    filename_match = _FILENAME_RE.search(html)
+    filename = sanitize_filename(filename_match.group(1)) if filename_match else None
+
+    # Fallback filename extraction from URL if needed
+    if not filename:
+        filename = unquote(url.split('/')[-1].split('?')[0]) or "unknown_file"
+    return filename
+
+
+class OneFichier(Host):
+    name = "1fichier"
+    domains = ("1fichier.com",)
+    # Free download links expire; conservative estimate
+    link_ttl = 30 * 60
+    # Free downloads allow a single connection per file
+    max_connections = 1
+    # Pages served by the download link instead of the file
+    error_patterns = (
+        r"You must wait \d+ minutes",
+        r"you can download only one file at a time",
+    )
+
+    async def _get_page(self, url: str) -> str:
+        response = await self.get(url, timeout=10)
+        response.raise_for_status()
+        return response.text
+
+    async def get_direct_link(self, url: str, password: Optional[str] = None) -> DirectLinkResult:
         try:
             # Initial request to get security parameters and filename
-            response = session.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-
-            _handle_errors(response, password)
-            # Extract filename from HTML
-            filename_match = re.search(
-                r'<td class="normal">([^<]+)</td>',
-                response.text
-            )
-            filename = sanitize_filename(filename_match.group(1)) if filename_match else None
-            
-            # Fallback filename extraction from URL if needed
-            if not filename:
-                filename = unquote(url.split('/')[-1].split('?')[0]) or "unknown_file"
+            html = await self._get_page(url)
+            _handle_errors(html, password)
+            filename = _extract_filename(html, url)
 
             # Get security parameter
-            adz_match = re.search(r'name="adz" value="([\d\.]+)"', response.text)
+            adz_match = _ADZ_RE.search(html)
             if not adz_match:
                 raise DirectLinkError("Missing security parameter")
 
@@ -56,46 +78,24 @@ def get_direct_link(url, password=None):
                 'pass': password or '',
                 'adz': adz_match.group(1)
             }
-            post_response = session.post(
-                url,
-                data=post_data,
-                headers=headers,
-                allow_redirects=False,
-                timeout=10
-            )
+            post_response = await self.post(url, data=post_data, allow_redirects=False, timeout=10)
             post_response.raise_for_status()
 
             if "Incorrect password" in post_response.text:
                 raise DirectLinkError("Invalid password")
 
             # Extract direct download link
-            #print(post_response.text)
-            link_match = re.search(
-                r'<a href="(https://[^"]+)"[^>]*>Click here to download the file</a>',
-                post_response.text
-            )
+            link_match = _LINK_RE.search(post_response.text)
             if not link_match:
                 raise DirectLinkError("Direct link not found")
 
-            return link_match.group(1), filename, headers, None
+            return self.result(link_match.group(1), filename)
 
-        except requests.exceptions.RequestException as e:
+        except aiohttp.ClientError as e:
             raise DirectLinkError(f"Network error: {str(e)}") from e
-        
-        
-def get_filename(url):
-    response = requests.get(url, headers=headers, timeout=10)
-    response.raise_for_status()
-
-    _handle_errors(response)
-    # Extract filename from HTML
-    filename_match = re.search(
-        r'<td class="normal">([^<]+)</td>',
-        response.text
-    )
-    filename = sanitize_filename(filename_match.group(1)) if filename_match else None
-    
-    # Fallback filename extraction from URL if needed
-    if not filename:
-        filename = unquote(url.split('/')[-1].split('?')[0]) or "unknown_file"
-    return filename
\ No newline at end of file
+
+    async def get_filename(self, url: str) -> str:
+        html = await self._get_page(url)
+        # Protected files show their name without the password
+        _check_available(html)
+        return _extract_filename(html, url)
@@ -1,26 +1,96 @@
+import asyncio
 import re
+from typing import List
+
+from darkloader.host import DirectLinkResult, FileNotFoundError, Host
+from darkloader.probe import ProbeResult
+
+_FILE_ID_RE = re.compile(r"/u/([a-zA-Z0-9]+)")
+
+
 class UnsupportedServiceError(Exception):
     pass
-def get_direct_link(link):
-    from darkloader.main import get_filename_from_url
-    match = re.search(r"/u/([a-zA-Z0-9]+)", link)
-    if match:
-        file_id = match.group(1)
-        direct_link =  f"https://pixeldrain.com/api/file/{file_id}"
-        filename = get_filename_from_url(direct_link)
-        if not filename:
+
+
+class Pixeldrain(Host):
+    name = "pixeldrain"
+    domains = ("pixeldrain.com",)
+    API_URL = "https://pixeldrain.com/api"
+    # IDs por petición al endpoint de info en lote
+    INFO_BATCH = 100
+    # Respuesta de la API cuando el archivo no está disponible (límite, captcha...)
+    error_patterns = (r'"success"\s*:\s*false',)
+
+    def _file_id(self, link: str) -> str:
+        match = _FILE_ID_RE.search(link)
+        if not match:
             raise UnsupportedServiceError("Invalid Pixeldrain link")
-        return direct_link, filename, None, None
-    raise UnsupportedServiceError("Invalid Pixeldrain link")
-
-def get_filename(link):
-    from darkloader.main import get_filename_from_url
-    match = re.search(r"/u/([a-zA-Z0-9]+)", link)
-    if match:
-        file_id = match.group(1)
-        direct_link =  f"https://pixeldrain.com/api/file/{file_id}"
-        filename = get_filename_from_url(direct_link)
-        if not filename:
+        return match.group(1)
+
+    async def get_direct_link(self, url: str) -> DirectLinkResult:
+        file_id = self._file_id(url)
+        # El endpoint de info da nombre, tamaño y sha256 sin tocar el archivo
+        response = await self.get(f"{self.API_URL}/file/{file_id}/info")
+        if response.status == 404:
+            raise FileNotFoundError(f"Pixeldrain file {file_id} not found")
+        response.raise_for_status()
+        info = response.json()
+        if not info.get("name"):
             raise UnsupportedServiceError("Invalid Pixeldrain link")
-        return filename
-    raise UnsupportedServiceError("Invalid Pixeldrain link")
\ No newline at end of file
+        sha256 = info.get("hash_sha256")
+        return self.result(
+            f"{self.API_URL}/file/{file_id}",
+            info["name"],
+            size=info.get("size"),
+            hash=f"sha256:{sha256}" if sha256 else None,
+        )
+
+    async def probe_many(self, urls: List[str]) -> List[ProbeResult]:
+        """Probe en lote: /file/id1,id2,.../info devuelve la lista de archivos existentes"""
+        results = {}
+        ids = {}
+        for url in urls:
+            match = _FILE_ID_RE.search(url)
+            if match:
+                ids.setdefault(match.group(1), []).append(url)
+            else:
+                results[url] = self._probe_error(url, UnsupportedServiceError("Invalid Pixeldrain link"))
+
+        async def probe_batch(batch):
+            try:
+                infos = await self._batch_info(batch)
+            except Exception as e:
+                for file_id in batch:
+                    for url in ids[file_id]:
+                        results[url] = self._probe_error(url, e)
+                return
+            for file_id in batch:
+                info = infos.get(file_id)
+                for url in ids[file_id]:
+                    if info is None:
+                        results[url] = ProbeResult(url, self.name, available=False, error="not found")
+                    else:
+                        results[url] = ProbeResult(url, self.name, info.get("name"), info.get("size"), available=True)
+
+        unique_ids = list(ids)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def limited(batch):
+            async with semaphore:
+                await probe_batch(batch)
+
+        await asyncio.gather(*(
+            limited(unique_ids[start:start + self.INFO_BATCH])
+            for start in range(0, len(unique_ids), self.INFO_BATCH)
+        ))
+        return [results[url] for url in urls]
+
+    async def _batch_info(self, file_ids: List[str]) -> dict:
+        response = await self.get(f"{self.API_URL}/file/{','.join(file_ids)}/info")
+        if response.status == 404:
+            return {}
+        response.raise_for_status()
+        data = response.json()
+        # Con un solo ID la API devuelve un objeto en vez de una lista
+        files = data if isinstance(data, list) else [data]
+        return {info["id"]: info for info in files if info.get("id")}
@@ -0,0 +1,153 @@
+"""Compact table of the links of a batch
+
+Link dumps run to hundreds of thousands of URLs, and one object per link
+(plus its resolved headers and responses) fills memory before anything is
+downloaded. ``JobTable`` keeps the links column by column instead:
+
+- the URL minus its origin, UTF-8 encoded in one shared bytearray, found
+  through an array of offsets
+- the origin ("https://host") interned: an index into a short list
+- the state as one byte
+- the result only once the job has finished: the path of the file, or the
+  error as text
+
+Nothing of a job is resolved before the scheduler takes it (see
+``DarkLoader.download_jobs``), so direct links, their headers and the
+responses only live as long as the transfer.
+
+Repeated links are recognised by the hash of the URL, kept in an open
+addressing array rather than a set of URLs; two different URLs with the same
+64-bit hash (about one chance in 10^7 for a million links) would count as one.
+"""
+import re
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+STATES = (QUEUED, RUNNING, DONE, FAILED)
+_STATE_CODES = {state: code for code, state in enumerate(STATES)}
+# Scheme and authority of an absolute URL
+_ORIGIN_RE = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*://[^/?#]*")
+
+
+class _HashSet:
+    """Set of 64-bit hashes in an array, linear probing, 0 marking a free slot"""
+
+    def __init__(self) -> None:
+        self._slots = array("q", bytes(8 * 1024))
+        self._size = 0
+
+    def add(self, value: int) -> bool:
+        """Add `value`; False if it was already there"""
+        value = value or 1
+        slots = self._slots
+        mask = len(slots) - 1
+        slot = value & mask
+        while slots[slot]:
+            if slots[slot] == value:
+                return False
+            slot = (slot + 1) & mask
+        slots[slot] = value
+        self._size += 1
+        if self._size * 3 > len(slots) * 2:
+            self._grow()
+        return True
+
+    def _grow(self) -> None:
+        old = self._slots
+        slots = self._slots = array("q", bytes(16 * len(old)))
+        mask = len(slots) - 1
+        for value in old:
+            if value:
+                slot = value & mask
+                while slots[slot]:
+                    slot = (slot + 1) & mask
+                slots[slot] = value
+
+
+class JobTable:
+    """Links of a batch, their state and results"""
+
+    def __init__(self, urls: Iterable[str] = ()) -> None:
+        # Interned origins and the lowercase host of each
+        self._origins: List[str] = []
+        self._hosts: List[str] = []
+        self._origin_ids: Dict[str, int] = {}
+        # Per job: origin index, start of the rest of the URL in _data, state
+        self._origin_of = array("I")
+        self._offsets = array("Q", [0])
+        self._data = bytearray()
+        self._states = bytearray()
+        self._seen = _HashSet()
+        # Job index -> path, for done jobs
+        self._paths: Dict[int, str] = {}
+        # Job index -> "Type: message", for failed jobs
+        self._errors: Dict[int, str] = {}
+        self.extend(urls)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.url(index) for index in range(len(self)))
+
+    def add(self, url: str) -> bool:
+        """Queue `url`; False if it is already in the table"""
+        if not self._seen.add(hash(url)):
+            return False
+        match = _ORIGIN_RE.match(url)
+        origin = match.group() if match else ""
+        origin_id = self._origin_ids.get(origin)
+        if origin_id is None:
+            origin_id = self._origin_ids[origin] = len(self._origins)
+            self._origins.append(origin)
+            self._hosts.append(origin.partition("://")[2].lower())
+        self._origin_of.append(origin_id)
+        self._data += url[len(origin):].encode()
+        self._offsets.append(len(self._data))
+        self._states.append(_STATE_CODES[QUEUED])
+        return True
+
+    def extend(self, urls: Iterable[str]) -> int:
+        """Queue every URL of `urls`, returns how many were new"""
+        return sum(self.add(url) for url in urls)
+
+    def url(self, index: int) -> str:
+        rest = self._data[self._offsets[index]:self._offsets[index + 1]].decode()
+        return self._origins[self._origin_of[index]] + rest
+
+    def host(self, index: int) -> str:
+        """Lowercase host of a job, the same string object for every job of the host"""
+        return self._hosts[self._origin_of[index]]
+
+    def state(self, index: int) -> str:
+        return STATES[self._states[index]]
+
+    def take(self) -> Iterator[int]:
+        """Mark the queued jobs running one by one, in order, as they are consumed"""
+        code = _STATE_CODES[QUEUED]
+        for index in range(len(self)):
+            if self._states[index] == code:
+                self._states[index] = _STATE_CODES[RUNNING]
+                yield index
+
+    def finish(self, index: int, result: Union[str, BaseException]) -> None:
+        """Record the path a job downloaded to, or the exception it failed with"""
+        if isinstance(result, BaseException):
+            self._states[index] = _STATE_CODES[FAILED]
+            self._errors[index] = f"{type(result).__name__}: {result}"
+        else:
+            self._states[index] = _STATE_CODES[DONE]
+            self._paths[index] = str(result)
+
+    def path(self, index: int) -> Optional[str]:
+        """Downloaded file of a done job"""
+        return self._paths.get(index)
+
+    def error(self, index: int) -> Optional[str]:
+        """Error of a failed job"""
+        return self._errors.get(index)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per state"""
+        return {state: self._states.count(code) for state, code in _STATE_CODES.items()}
@@ -1,17 +1,148 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+from contextlib import contextmanager
+from typing import Optional
 
-def setup_logger(name="DarkLoader", level=logging.DEBUG):
-    # Crear un logger
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Per-download fields (url, host, filename...) attached to every record
+# emitted from the current task
+_log_context: contextvars.ContextVar = contextvars.ContextVar("darkloader_log_context", default={})
+
+_log_queue: Optional[queue.SimpleQueue] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Copy the active log context onto the record
+
+    Runs on the producing side of the queue, so the context seen is the one
+    of the task that emitted the record.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _log_context.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that skips the copy and format done by the stdlib one
+
+    The queue never leaves the process, so the record only needs its message
+    rendered (args may be mutated later); traceback objects can stay as is.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text formatter that appends the download context as key=value pairs"""
+
+    def __init__(self) -> None:
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        context = getattr(record, "context", None)
+        if context:
+            fields = " ".join(f"{key}={value}" for key, value in context.items())
+            message = f"{message} [{fields}]"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the download context merged in"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+@contextmanager
+def log_context(**fields):
+    """Add fields to every record logged inside the block
+
+    Contexts nest and are task-local, so concurrent downloads keep their own
+    fields.
+
+    Args:
+        **fields: Values to attach (e.g. url, host, filename)
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def _get_formatter(fmt: Optional[str]) -> logging.Formatter:
+    fmt = (fmt or os.getenv("DARKLOADER_LOG_FORMAT") or "text").lower()
+    if fmt == "json":
+        return JsonFormatter()
+    if fmt == "text":
+        return TextFormatter()
+    raise ValueError(f"Unknown log format: {fmt}")
+
+
+def _get_queue(fmt: Optional[str]) -> queue.SimpleQueue:
+    """Start the background listener that owns the real (blocking) handler"""
+    global _log_queue, _listener
+    if _log_queue is None:
+        _log_queue = queue.SimpleQueue()
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(_get_formatter(fmt))
+        _listener = logging.handlers.QueueListener(_log_queue, console_handler)
+        _listener.start()
+        atexit.register(stop_logging)
+    return _log_queue
+
+
+def stop_logging() -> None:
+    """Flush pending records and stop the background listener"""
+    global _log_queue, _listener
+    if _listener is not None:
+        _listener.stop()
+    _listener = None
+    _log_queue = None
+
+
+def setup_logger(name="DarkLoader", level=logging.INFO, fmt: Optional[str] = None):
+    """Get a logger whose records are handed off to a background thread
+
+    The calling task only pays for enqueuing the record; formatting and the
+    write to stderr happen in the listener thread.
+
+    Args:
+        name: Logger name
+        level: Logging level (name or number)
+        fmt: "text" or "json", defaults to $DARKLOADER_LOG_FORMAT or "text".
+            Only the first call decides the format of the shared sink.
+
+    Returns:
+        Configured logger
+    """
     logger = logging.getLogger(name)
     if not logger.handlers:
-        logger.setLevel(level) 
-        # Crear un manejador de consola
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(level) 
-        
-        # Usar el ColoredFormatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+        logger.setLevel(level)
+        queue_handler = _QueueHandler(_get_queue(fmt))
+        queue_handler.addFilter(ContextFilter())
+        logger.addHandler(queue_handler)
+
+    return logger
@@ -1,19 +1,42 @@
 import aiohttp
+import logging
 import os
 from pathlib import Path
-from typing import Optional, Tuple, Callable, Any
+from typing import AsyncIterator, Optional, Callable, Any, Sequence
 import asyncio
-from darkloader.hosts import downloadgg, gofile, onefichier, pixeldrain, ranoz
-from darkloader.hosts import desiupload
-from darkloader.hosts import uploadscloud
-from aiohttp import ClientResponseError
+import time
+from contextlib import nullcontext
+from darkloader.host import DirectLinkResult, Host, filename_from_content_disposition, is_expired
+from darkloader.hosts import HOSTS
 import requests
 import re
 import os
 from urllib.parse import unquote, urlparse
-from typing import Union
+from typing import Dict, Iterable, Union, List, Set, Tuple
+from darkloader.cookies import SessionStore
 from darkloader.debrid.mega_debrid import MegaDebrid
-from darkloader.logger import setup_logger
+from darkloader.disk import DiskBudget, DiskSpaceError, Reservation, part_path, preallocate
+from darkloader.jobs import JobTable
+from darkloader.logger import setup_logger, log_context
+from darkloader.mirrors import Mirror, probe_size, verify_mirrors
+from darkloader.probe import ProbeResult, ProbeTable
+from darkloader.profiling import Profiler, current_profile, profile_chunks, profile_writes, stage
+from darkloader.proxies import ProxyPool, current_exit, is_exit_failure
+from darkloader.segments import RangeNotSatisfied, SegmentedDownload
+from darkloader.sinks import Sink, SinkError
+from darkloader.sniff import SniffedResponse, read_head, sniff
+from darkloader.transport import (
+    AiohttpTransport,
+    HTTPStatusError,
+    RateLimiter,
+    StreamResponse,
+    TransferTimeouts,
+    Transport,
+    detect_stalls,
+    make_transport,
+    throttle,
+)
+from darkloader.tuning import HostConcurrency, Slot
 from dotenv import load_dotenv
 load_dotenv()
 def sanitaze_name(filename):
@@ -77,6 +100,14 @@ class UnsupportedServiceError(FileDownloaderError):
     """Raised for unsupported download services"""
 
 
+class LinkExpiredError(FileDownloaderError):
+    """The direct link no longer serves the file and has to be resolved again"""
+
+
+class InvalidContentError(LinkExpiredError):
+    """The direct link served an error page or another file (see ``darkloader.sniff``)"""
+
+
 # SUPPORTED LINKS GOFILE DOWNLOAD.GG 1FICHIER PIXELDRAIN RANOZ
 class BaseDownloader:
     """Base class for file downloaders with common functionality"""
@@ -90,7 +121,7 @@ class BaseDownloader:
         self.download_dir = Path(download_dir)
         self._ensure_download_directory()
         self.logger = setup_logger("DarkLoader", log_level)
-        self.logger.info(f"Initialized downloader with download directory: {download_dir}")
+        self.logger.info("Initialized downloader with download directory: %s", download_dir)
 
     def _ensure_download_directory(self) -> None:
         """Create download directory if it doesn't exist"""
@@ -107,19 +138,58 @@ class BaseDownloader:
         Returns:
             Path if file exists with correct size, empty string otherwise
         """
-        self.logger.debug(f"Checking if {file_path} exists and matches size {file_size}")
+        self.logger.debug("Checking if %s exists and matches size %s", file_path, file_size)
         if not file_path.exists():
-            self.logger.debug(f"File {file_path} does not exist")
+            self.logger.debug("File %s does not exist", file_path)
             return ""
         saved_file_size = file_path.stat().st_size 
         if saved_file_size == file_size:
-            self.logger.debug(f"File {file_path} exists with correct size")
+            self.logger.debug("File %s exists with correct size", file_path)
             return file_path
             
-        self.logger.debug(f"File size mismatch - expected {file_size}, got {saved_file_size}")
+        self.logger.debug("File size mismatch - expected %s, got %s", file_size, saved_file_size)
         return ""
 
-    def get_file_url_size(self, url: str, headers: dict) -> int:
+
+class FileDownloader(BaseDownloader):
+    """Handles the actual file downloading process"""
+    # Seconds before a failed transfer is retried, doubled on each retry
+    RETRY_DELAY: float = 3
+    # Retries in a row without new bytes before a transfer is given up
+    MAX_RETRIES = 5
+    # Statuses of a direct link that is no longer valid
+    EXPIRED_STATUSES = (403, 410)
+    # Smallest range worth a connection of its own
+    MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+    # Read size when streaming into a sink, which buffers a few chunks
+    SINK_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(
+        self,
+        download_dir: str = "downloads",
+        log_level: str = "INFO",
+        transport: Optional[Transport] = None,
+        timeouts: Optional[TransferTimeouts] = None,
+        connections: int = 4,
+        max_rate: Optional[float] = None,
+    ) -> None:
+        super().__init__(download_dir, log_level)
+        # Shared by all downloads, so connections are reused between them
+        self.transport = transport or AiohttpTransport()
+        self._owns_transport = transport is None
+        self.timeouts = timeouts or TransferTimeouts()
+        self.connections = connections
+        # Shared by all transfers, so the limit is on their total
+        self.limiter = RateLimiter(max_rate) if max_rate else None
+        # Directories already created, so files of a batch skip the mkdir
+        self._directories: Set[Path] = set()
+
+    async def close(self) -> None:
+        """Close the transport if it was created here"""
+        if self._owns_transport:
+            await self.transport.close()
+
+    async def get_file_url_size(self, url: str, headers: dict) -> int:
         """Get file size from URL using HEAD request
         
         Args:
@@ -129,20 +199,31 @@ class BaseDownloader:
         Returns:
             File size in bytes, 0 if request fails
         """
-        self.logger.debug(f"Getting file size for URL: {url}")
+        self.logger.debug("Getting file size for URL: %s", url)
+        # Same exit the file is then transferred through
+        exit = current_exit()
+        transport = AiohttpTransport(exit.connector) if exit else self.transport
         try:
-            response = requests.head(url, headers=headers)
-            response.raise_for_status()
+            response = await transport.request("HEAD", url, headers=headers, proxy=exit.proxy if exit else None)
+            if response.status >= 400:
+                raise HTTPStatusError(response.status, response.url)
             size = int(response.headers.get("Content-Length", 0))
-            self.logger.debug(f"File size: {size} bytes")
+            self.logger.debug("File size: %s bytes", size)
             return size
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Error getting file size: {e}")
+        except Exception as e:
+            if exit and is_exit_failure(e):
+                raise
+            self.logger.error("Error getting file size: %s", str(e) or type(e).__name__)
             return 0
+        finally:
+            if transport is not self.transport:
+                await transport.close()
 
-
-class FileDownloader(BaseDownloader):
-    """Handles the actual file downloading process"""
+    def ensure_directory(self, path: Path) -> None:
+        """Create `path` and its parents, once per downloader"""
+        if path not in self._directories:
+            path.mkdir(parents=True, exist_ok=True)
+            self._directories.add(path)
     
     async def download_from_url(
         self,
@@ -151,7 +232,12 @@ class FileDownloader(BaseDownloader):
         method: str = "GET",
         headers: Optional[dict] = None,
         data: Optional[dict] = None,
-        progress_cb: Optional[Callable[[str, int, int], Any]] = None
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None,
+        reservation: Optional[Reservation] = None,
+        offset: int = 0,
+        connections: Optional[int] = None,
+        error_patterns: Sequence[str] = (),
+        retries: int = 0
     ) -> str:
         """Async download with progress support for GET and POST methods
         
@@ -162,96 +248,647 @@ class FileDownloader(BaseDownloader):
             headers: Request headers
             data: POST data if applicable
             progress_cb: Progress callback function
+            reservation: Disk space admitted for this file, released from
+                the budget once the file is preallocated
+            offset: Bytes already in the ``.part`` file; the rest is
+                requested with a Range header. 0 starts from scratch
+            connections: Most parallel connections the host allows for the
+                file, None for the downloader's default. Large GET
+                transfers are split over them (see ``SegmentedDownload``)
+            error_patterns: Regexes of the host's error pages, checked on
+                the first bytes of the body with the generic ones
+            retries: Retries so far without new bytes
             
         Returns:
             Path to downloaded file as string
             
+        Timeouts and stalls (see ``TransferTimeouts``) reconnect and resume
+        from the bytes already written, up to ``MAX_RETRIES`` times in a row
+        without progress.
+
         Raises:
-            FileDownloaderError: On download failure
+            FileDownloaderError: On download failure, or once the retries
+                run out
+            LinkExpiredError: If the link answers 403/410 or an error page
+                (InvalidContentError); the ``.part`` file is kept to resume from
+            DiskSpaceError: If the file can't be preallocated
         """
-        save_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ensure_directory(save_path.parent)
         headers = headers or self.DEFAULT_HEADERS
-        self.logger.info(f"Starting download from {url} to {save_path}")
-        self.logger.debug(f"Using method: {method}, headers: {headers}")
+        request_headers = dict(headers)
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+        else:
+            # Left by a killed process: its size says nothing about the content
+            part_path(save_path).unlink(missing_ok=True)
+        self.logger.info("Starting download from %s to %s", url, save_path)
+        self.logger.debug("Using method: %s", method)
+
+        # Same exit (proxy / source address) the link was resolved through,
+        # with a connection pool of its own
+        exit = current_exit()
+        transport = AiohttpTransport(exit.connector) if exit else self.transport
+        method = "POST" if method.upper() == "POST" else "GET"
+        connections = min(connections or self.connections, self.connections)
+        open_range = None
+        if method == "GET" and connections > 1:
+            def open_range(start: int, end: int):
+                range_headers = {**request_headers, "Range": f"bytes={start}-{end - 1}"}
+                return transport.stream(
+                    "GET", url, headers=range_headers, proxy=exit.proxy if exit else None, timeouts=self.timeouts
+                )
 
         try:
-            async with aiohttp.ClientSession() as session:
-                if method.upper() == "POST":
-                    self.logger.debug(f"Making POST request with data: {data}")
-                    async with session.post(url, headers=headers, data=data) as response:
-                        response.raise_for_status()
-                        return await self._stream_response(response, save_path, progress_cb)
-                else:
-                    self.logger.debug("Making GET request")
-                    async with session.get(url, headers=headers) as response:
-                        response.raise_for_status()
-                        return await self._stream_response(response, save_path, progress_cb)
-        except ClientResponseError as e:
-            if e.status == 404:
-                self.logger.error("File not found (404)")
-                raise FileDownloaderError("File Not Found")
-            else:
-                self.logger.error(f"HTTP error {e.status}: {e.message}")
-                raise FileDownloaderError(f"Error HTTP: {e.status} - {e.message}")
+            request_started = time.perf_counter()
+            self.logger.debug("Making %s request", method)
+            async with transport.stream(
+                method,
+                url,
+                headers=request_headers,
+                data=data if method == "POST" else None,
+                proxy=exit.proxy if exit else None,
+                timeouts=self.timeouts,
+            ) as response:
+                response.raise_for_status()
+                return await self._stream_response(
+                    response, save_path, progress_cb, request_started, reservation, offset, open_range, connections,
+                    error_patterns
+                )
+        except (DiskSpaceError, LinkExpiredError):
+            raise
+        except RangeNotSatisfied as e:
+            self.logger.warning("%s, continuing over one connection", e)
+            return await self.download_from_url(
+                url, save_path, method, headers, data, progress_cb, reservation, self.resume_offset(save_path), 1,
+                error_patterns, retries
+            )
+        except HTTPStatusError as e:
+            if exit and is_exit_failure(e):
+                raise
+            raise self._status_error(e)
+        except Exception as e:
+            # A failing exit is not retried here: the pool rests it and the
+            # next attempt of the download leases another one
+            if exit and is_exit_failure(e):
+                raise
+            resumed = self.resume_offset(save_path)
+            retries = await self._before_retry(e, 0 if resumed > offset else retries)
+            return await self.download_from_url(
+                url, save_path, method, headers, data, progress_cb, reservation, resumed, connections,
+                error_patterns, retries
+            )
+        finally:
+            if transport is not self.transport:
+                await transport.close()
+
+    def _status_error(self, e: HTTPStatusError) -> FileDownloaderError:
+        """Downloader error for an error status of the direct link"""
+        if e.status in self.EXPIRED_STATUSES:
+            self.logger.warning("Direct link answered HTTP %s, it has probably expired", e.status)
+            return LinkExpiredError(f"Error HTTP: {e.status} - {e.message}")
+        if e.status == 404:
+            self.logger.error("File not found (404)")
+            return FileDownloaderError("File Not Found")
+        self.logger.error("HTTP error %s: %s", e.status, e.message)
+        return FileDownloaderError(f"Error HTTP: {e.status} - {e.message}")
+
+    async def download_direct(
+        self,
+        url: str,
+        directory: Path,
+        max_size: int,
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None,
+        budget: Optional[DiskBudget] = None
+    ) -> Optional[Tuple[str, int]]:
+        """Download a small file from a direct link with a single GET
+
+        The filename and size are taken from the GET response itself instead
+        of a HEAD before it, and the body, read whole into memory, is written
+        in one go. On the shared transport the GET goes over a kept-alive
+        connection of the previous file.
+
+        Args:
+            url: Direct download URL
+            directory: Directory the file is saved to
+            max_size: Largest body downloaded this way
+            progress_cb: Progress callback function, called once the file
+                is written
+            budget: Disk budget the file is admitted against
+
+        Returns:
+            Path to downloaded file as string and the bytes transferred (0
+            if the file was already there), or None if the response is not
+            a small file download (no filename, unknown size or larger than
+            `max_size`) or the transfer failed; the regular path takes over
+
+        Raises:
+            LinkExpiredError: If the link answers 403/410 or an error page
+            FileDownloaderError: On other error statuses
+            DiskSpaceError: If the file doesn't fit on the filesystem
+        """
+        exit = current_exit()
+        transport = AiohttpTransport(exit.connector) if exit else self.transport
+        try:
+            async with transport.stream(
+                "GET", url, headers=self.DEFAULT_HEADERS, proxy=exit.proxy if exit else None, timeouts=self.timeouts
+            ) as response:
+                response.raise_for_status()
+                content_disposition = response.headers.get("Content-Disposition")
+                filename = filename_from_content_disposition(content_disposition) if content_disposition else None
+                size = int(response.headers.get("Content-Length", 0))
+                if not filename or not 0 < size <= max_size:
+                    return None
+                save_path = directory / sanitaze_name(filename)
+                if self.is_downloaded(save_path, size):
+                    self.logger.info("File already exists: %s", save_path)
+                    return str(save_path), 0
+                chunks = await self._sniff(response, self.SINK_CHUNK_SIZE, save_path.name, 0, ())
+                body = b"".join([chunk async for chunk in chunks])
+            if len(body) != size:
+                raise aiohttp.ClientPayloadError(f"Got {len(body)} of {size} bytes")
+        except (DiskSpaceError, LinkExpiredError):
+            raise
+        except HTTPStatusError as e:
+            if exit and is_exit_failure(e):
+                raise
+            raise self._status_error(e)
         except Exception as e:
-            self.logger.warning(f"Download failed, retrying in 3s: {e}")
-            await asyncio.sleep(3)
-            return await self.download_from_url(url, save_path, method, headers, data, progress_cb)
+            if exit and is_exit_failure(e):
+                raise
+            self.logger.debug("Single GET failed, using the regular transfer: %s", str(e) or type(e).__name__)
+            return None
+        finally:
+            if transport is not self.transport:
+                await transport.close()
+
+        self.ensure_directory(directory)
+        async with budget.admit(size) if budget else nullcontext():
+            with stage("finalize"):
+                temp_path = part_path(save_path)
+                temp_path.write_bytes(body)
+                os.replace(temp_path, save_path)
+        if progress_cb:
+            await progress_cb(save_path.name, size, size)
+        self.logger.info("Download completed: %s", save_path)
+        return str(save_path), size
+
+    async def download_to_sink(
+        self,
+        url: str,
+        sink: Sink,
+        filename: str,
+        method: str = "GET",
+        headers: Optional[dict] = None,
+        data: Optional[dict] = None,
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None,
+        error_patterns: Sequence[str] = (),
+        retries: int = 0
+    ) -> str:
+        """Stream a download into a sink instead of a local file
+
+        The body goes over one connection, in order. Interrupted transfers
+        resume with a Range request from the bytes the sink already took.
+
+        Args:
+            url: Download URL
+            sink: Destination of the bytes
+            filename: Name of the file, passed to the sink and progress_cb
+            method: HTTP method (GET/POST)
+            headers: Request headers
+            data: POST data if applicable
+            progress_cb: Progress callback function
+            error_patterns: Regexes of the host's error pages
+            retries: Retries so far without new bytes
+
+        Returns:
+            Location of the data in the sink
+
+        Raises:
+            FileDownloaderError: On download failure, or once ``MAX_RETRIES``
+                retries in a row brought no new bytes
+            LinkExpiredError: If the link answers 403/410 or an error page
+                (InvalidContentError); the sink keeps what it got, to resume from
+            SinkError: If the sink fails, or the server can't resume a
+                transfer the sink already has part of
+        """
+        offset = sink.written
+        request_headers = dict(headers or self.DEFAULT_HEADERS)
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+        self.logger.info("Starting download from %s to %s", url, sink.location)
+        exit = current_exit()
+        transport = AiohttpTransport(exit.connector) if exit else self.transport
+        method = "POST" if method.upper() == "POST" else "GET"
+        try:
+            async with transport.stream(
+                method,
+                url,
+                headers=request_headers,
+                data=data if method == "POST" else None,
+                proxy=exit.proxy if exit else None,
+                timeouts=self.timeouts,
+            ) as response:
+                response.raise_for_status()
+                if offset and response.status != 206:
+                    raise SinkError(f"Server can't resume from byte {offset} and the sink can't restart")
+                length = int(response.headers.get("Content-Length", 0))
+                if length == 0 and not offset:
+                    self.logger.error("Invalid response: zero bytes")
+                    raise LinkExpiredError("Server Responded With Invalid File")
+                # Nothing reaches the sink before the body is checked
+                chunks = await self._sniff(response, self.SINK_CHUNK_SIZE, filename, offset, error_patterns)
+                total_bytes = offset + length
+                if not sink.opened:
+                    await sink.open(filename, total_bytes or None)
+                if offset:
+                    self.logger.info("Resuming from byte %s", offset)
+
+                if self.timeouts.min_speed:
+                    chunks = detect_stalls(chunks, self.timeouts)
+                if self.limiter:
+                    chunks = throttle(chunks, self.limiter)
+                async for chunk in chunks:
+                    await sink.write(chunk)
+                    if progress_cb:
+                        await progress_cb(filename, sink.written, total_bytes)
+            if length and sink.written < total_bytes:
+                raise aiohttp.ClientPayloadError(f"Connection closed at byte {sink.written} of {total_bytes}")
+        except (LinkExpiredError, SinkError):
+            raise
+        except HTTPStatusError as e:
+            if exit and is_exit_failure(e):
+                raise
+            raise self._status_error(e)
+        except Exception as e:
+            if exit and is_exit_failure(e):
+                raise
+            retries = await self._before_retry(e, 0 if sink.written > offset else retries)
+            return await self.download_to_sink(
+                url, sink, filename, method, headers, data, progress_cb, error_patterns, retries
+            )
+        finally:
+            if transport is not self.transport:
+                await transport.close()
+        await sink.close()
+        self.logger.info("Download completed: %s", sink.location)
+        return sink.location
+
+    async def _before_retry(self, error: Exception, retries: int) -> int:
+        """Wait out the backoff of a failed transfer, returns the retry count
+
+        Raises:
+            FileDownloaderError: If ``MAX_RETRIES`` retries already failed
+        """
+        # Timeouts carry no message
+        reason = str(error) or type(error).__name__
+        if retries >= self.MAX_RETRIES:
+            raise FileDownloaderError(f"Download failed after {retries} retries: {reason}") from error
+        delay = self.RETRY_DELAY * 2 ** retries
+        self.logger.warning("Download failed, retrying in %ss: %s", delay, reason)
+        await asyncio.sleep(delay)
+        return retries + 1
+
+    def resume_offset(self, save_path: Path) -> int:
+        """Bytes of `save_path` already downloaded by an interrupted transfer"""
+        temp_path = part_path(save_path)
+        return temp_path.stat().st_size if temp_path.exists() else 0
+
+    async def _sniff(
+        self,
+        response: StreamResponse,
+        chunk_size: int,
+        filename: str,
+        offset: int,
+        error_patterns: Sequence[str]
+    ) -> AsyncIterator[bytes]:
+        """Check the first bytes of a body before any of it is written
+
+        Returns:
+            Iterator of the whole body, the bytes read ahead included
+
+        Raises:
+            InvalidContentError: If the body is an error page or doesn't
+                start like the file
+        """
+        head, chunks = await read_head(response.iter_chunked(chunk_size))
+        reason = sniff(head, response.headers.get("Content-Type", ""), filename, offset, error_patterns)
+        if reason:
+            self.logger.error("Invalid response from %s: %s", response.url, reason)
+            raise InvalidContentError(f"Server Responded With Invalid File: {reason}")
+        return chunks
         
     async def _stream_response(
         self, 
-        response: aiohttp.ClientResponse, 
+        response: StreamResponse, 
         save_path: Path, 
-        progress_cb: Optional[Callable[[str, int, int], Any]]
+        progress_cb: Optional[Callable[[str, int, int], Any]],
+        request_started: Optional[float] = None,
+        reservation: Optional[Reservation] = None,
+        offset: int = 0,
+        open_range: Optional[Callable] = None,
+        connections: int = 1,
+        error_patterns: Sequence[str] = ()
     ) -> str:
         """Handle response streaming with progress updates
         
+        The body is written to a preallocated ``.part`` file that is renamed
+        to `save_path` once complete, so a partial file never looks finished.
+        Bodies of at least two ``MIN_SEGMENT_SIZE`` from servers accepting
+        ranges are split over `connections`, rebalanced as they go.
+        
         Args:
-            response: aiohttp response
+            response: Streamed transport response
             save_path: Path to save file
             progress_cb: Progress callback function
+            request_started: perf_counter() value when the request was sent,
+                used for the first byte timing when profiling
+            reservation: Disk space admitted for this file
+            offset: Bytes already in the ``.part`` file, kept when the
+                server answers the Range request with 206
+            open_range: Opens a stream of the bytes [start, end) of the
+                file, None to use `response` only
+            connections: Most connections to split the body over
+            error_patterns: Regexes of the host's error pages
             
         Returns:
             Path to downloaded file as string
             
         Raises:
-            FileDownloaderError: If response is invalid
+            LinkExpiredError: If the response is empty
+            InvalidContentError: If the first bytes are an error page or
+                don't start like the file (see ``darkloader.sniff``)
         """
-        total_bytes = int(response.headers.get("Content-Length", 0))
-        self.logger.info(f"Starting download stream, total size: {total_bytes} bytes")
+        if response.status != 206:
+            offset = 0
+        length = int(response.headers.get("Content-Length", 0))
+        total_bytes = offset + length
+        self.logger.info("Starting download stream, total size: %s bytes", total_bytes)
         
-        if response.headers.get("Content-Type") == "text/html" or total_bytes == 0:
-            self.logger.error("Invalid response: HTML content or zero bytes")
-            await asyncio.sleep(2)
-            raise FileDownloaderError("Server Responded With Invalid File")
-
-        processed_bytes = 0
+        if length == 0:
+            self.logger.error("Invalid response: zero bytes")
+            raise LinkExpiredError("Server Responded With Invalid File")
         chunk_size = 26214400  # 25MB chunks
+        # Typically the host's error page served in place of an expired
+        # link; checked before the .part file is touched
+        chunks = await self._sniff(response, chunk_size, save_path.name, offset, error_patterns)
+        response = SniffedResponse(response, chunks)
+
+        if offset:
+            self.logger.info("Resuming from byte %s", offset)
+        processed_bytes = offset
+        # Checked once per stream instead of once per chunk
+        log_progress = self.logger.isEnabledFor(logging.DEBUG)
 
-        with save_path.open("wb") as file:
-            async for chunk in response.content.iter_chunked(chunk_size):
-                file.write(chunk)
-                processed_bytes += len(chunk)
-                self.logger.debug(f"Downloaded {processed_bytes}/{total_bytes} bytes")
+        segmented = (
+            open_range is not None
+            and connections > 1
+            and response.headers.get("Accept-Ranges") == "bytes"
+            and length >= 2 * self.MIN_SEGMENT_SIZE
+        )
+
+        temp_path = part_path(save_path)
+        file = temp_path.open("r+b" if offset else "wb")
+        file.seek(offset)
+        completed = False
+        try:
+            if preallocate(file, total_bytes) and reservation:
+                reservation.allocated()
+            if segmented:
+                segments = SegmentedDownload(
+                    [open_range] * connections,
+                    temp_path,
+                    offset,
+                    total_bytes,
+                    self.timeouts,
+                    self.MIN_SEGMENT_SIZE,
+                    self._segment_progress(save_path.name, total_bytes, progress_cb),
+                    self.logger,
+                    retry_delay=self.RETRY_DELAY,
+                    limiter=self.limiter,
+                )
+                try:
+                    await segments.run(response)
+                finally:
+                    # Later segments may be written too, but only the
+                    # contiguous prefix can be resumed from
+                    processed_bytes = segments.contiguous
+            else:
+                chunks = response.iter_chunked(chunk_size)
+                if self.timeouts.min_speed:
+                    chunks = detect_stalls(chunks, self.timeouts)
+                if self.limiter:
+                    chunks = throttle(chunks, self.limiter)
+                write = file.write
+                # Timing wrappers are only installed when profiling is enabled
+                if profile := current_profile():
+                    chunks = profile_chunks(chunks, profile, request_started or time.perf_counter())
+                    write = profile_writes(write, profile)
+
+                async for chunk in chunks:
+                    write(chunk)
+                    processed_bytes += len(chunk)
+                    if log_progress:
+                        self.logger.debug("Downloaded %s/%s bytes", processed_bytes, total_bytes)
                 
-                if progress_cb:
-                    await progress_cb(save_path.name, processed_bytes, total_bytes)
+                    if progress_cb:
+                        await progress_cb(save_path.name, processed_bytes, total_bytes)
+            completed = True
+        finally:
+            with stage("finalize"):
+                # Give back the preallocated tail that was not written
+                if processed_bytes != total_bytes:
+                    file.truncate(processed_bytes)
+                file.close()
+                if completed:
+                    os.replace(temp_path, save_path)
+
+        self.logger.info("Download completed: %s", save_path)
+        return str(save_path)
+
+    def _segment_progress(
+        self,
+        name: str,
+        total_bytes: int,
+        progress_cb: Optional[Callable[[str, int, int], Any]]
+    ) -> Optional[Callable[[int], Any]]:
+        """Adapt the progress callback to the byte count of SegmentedDownload"""
+        if progress_cb is None:
+            return None
+
+        async def progress(done: int) -> None:
+            await progress_cb(name, done, total_bytes)
+
+        return progress
+
+    async def download_from_mirrors(
+        self,
+        links: List[DirectLinkResult],
+        save_path: Path,
+        size: int,
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None,
+        reservation: Optional[Reservation] = None
+    ) -> str:
+        """Download one file from several direct links serving it
+
+        Every link gets as many connections as its host allows (at most
+        ``connections``) and all of them share the ranges of the file.
+
+        Args:
+            links: Direct links of the same file
+            save_path: Path to save file
+            size: Size of the file in bytes
+            progress_cb: Progress callback function
+            reservation: Disk space admitted for this file
 
-        self.logger.info(f"Download completed: {save_path}")
+        Returns:
+            Path to downloaded file as string
+
+        Raises:
+            SegmentError: If every mirror failed
+            HTTPStatusError: If the last mirror left answered an error
+        """
+        self.ensure_directory(save_path.parent)
+        self.logger.info("Starting download from %d mirrors to %s", len(links), save_path)
+        open_ranges, sources = [], []
+        for link in links:
+            connections = min(link.get("connections") or self.connections, self.connections)
+            open_ranges += [self._range_opener(link)] * connections
+            sources += [link["url"]] * connections
+
+        temp_path = part_path(save_path)
+        with temp_path.open("wb") as file:
+            if preallocate(file, size) and reservation:
+                reservation.allocated()
+        segments = SegmentedDownload(
+            open_ranges,
+            temp_path,
+            0,
+            size,
+            self.timeouts,
+            self.MIN_SEGMENT_SIZE,
+            self._segment_progress(save_path.name, size, progress_cb),
+            self.logger,
+            retry_delay=self.RETRY_DELAY,
+            limiter=self.limiter,
+        )
+        completed = False
+        try:
+            await segments.run()
+            completed = True
+        finally:
+            with stage("finalize"):
+                if completed:
+                    os.replace(temp_path, save_path)
+                else:
+                    os.truncate(temp_path, segments.contiguous)
+
+        fetched: Dict[str, int] = {}
+        for url, nbytes in zip(sources, segments.source_bytes):
+            fetched[url] = fetched.get(url, 0) + nbytes
+        for url, nbytes in fetched.items():
+            self.logger.info("Fetched %s bytes from %s", nbytes, url)
+        self.logger.info("Download completed: %s", save_path)
         return str(save_path)
 
+    def _range_opener(self, link: DirectLinkResult):
+        """Opens ranged streams of a direct link through the shared transport"""
+        method = "POST" if link["payload"] else "GET"
+
+        def open_range(start: int, end: int):
+            headers = {**(link["headers"] or self.DEFAULT_HEADERS), "Range": f"bytes={start}-{end - 1}"}
+            return self.transport.stream(method, link["url"], headers=headers, data=link["payload"], timeouts=self.timeouts)
+
+        return open_range
+
 
 class LinkResolver:
-    """Resolves direct download links from various hosting services"""
+    """Resolves direct download links from various hosting services
+
+    Every host plugin sends its pages, API calls and HEAD probes through one
+    shared transport, reusing its connections across all links.
+    """
     DEFAULT_HEADERS: dict = {"User-Agent": "Mozilla/5.0"}
-    
-    def __init__(self, log_level: str = "DEBUG"):
+    # Parallel resolutions across all hosts in resolve_many
+    MAX_CONCURRENCY: int = 16
+    # Estimated lifetime of debrid links in seconds
+    DEBRID_LINK_TTL: float = 60 * 60
+
+    def __init__(
+        self,
+        log_level: str = "INFO",
+        transport: Optional[Transport] = None,
+        sessions: Optional[SessionStore] = None
+    ):
         self.logger = setup_logger("LinkResolver", log_level)
-        self.gofile_client = gofile.Client()
-        self.debrid = MegaDebrid("DEBUG")
+        # Cookies and host state, restored into every session bound
+        self.sessions = sessions or SessionStore(log_level=log_level)
+        self.debrid = MegaDebrid(log_level)
         self.hosts_to_debrid = ["rapidgator.net", "1fichier.com"]
-        
-    def get_filename(self, url: str) -> str:
+        self.transport = transport or AiohttpTransport()
+        self._owns_transport = transport is None
+        self._owns_session = False
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._hosts: List[Host] = []
+
+    def _bind_session(self) -> None:
+        """Create the shared session (and the hosts using it) for the running loop
+
+        With the aiohttp transport the session is the transport's own; other
+        transports get a session of their own for requests routed through
+        proxy exits.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._owns_session = not isinstance(self.transport, AiohttpTransport)
+            if self._owns_session:
+                self._session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+            else:
+                self._session = self.transport.session
+            self._session_loop = loop
+            self._hosts = [
+                host_cls(self._session, transport=self.transport, store=self.sessions) for host_cls in HOSTS
+            ]
+            self.sessions.restore(self.transport)
+
+    @property
+    def hosts(self) -> List[Host]:
+        """Host plugins bound to the session of the running loop"""
+        self._bind_session()
+        return self._hosts
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        self._bind_session()
+        return self._session
+
+    async def close(self) -> None:
+        """Close the shared session, and the transport if it was created here"""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._owns_transport:
+            await self.transport.close()
+        self._session = None
+        self._hosts = []
+
+    def host_for(self, url: str) -> Optional[Host]:
+        """Host plugin handling `url`, None for debrid and direct links
+
+        Raises:
+            UnsupportedServiceError: If the host is known but disabled
+        """
+        domain = urlparse(url).netloc.lower()
+        if "oshi.at" in domain:
+            self.logger.error("oshi.at links are not supported")
+            raise UnsupportedServiceError("oshi.at is currently not resolved by laws.")
+        for host in self.hosts:
+            if host.matches(url):
+                if host.disabled_reason:
+                    raise UnsupportedServiceError(host.disabled_reason)
+                return host
+        return None
+
+    async def get_filename(self, url: str) -> str:
         """Get filename from URL based on host service
         
         Args:
@@ -260,89 +897,199 @@ class LinkResolver:
         Returns:
             Extracted filename
         """
-        self.logger.debug(f"Getting filename for URL: {url}")
-        if "gofile.io" in url:
-            filename = self.gofile_client.get_filename(url)
-        elif "ranoz.gg" in url:
-            raise Exception("ranoz.gg links are not supported because Cloudflare is blocking the request") #TODO: Add support for ranoz.gg
-            filename = ranoz.get_filename(url)
-        elif "download.gg" in url:
-            filename = downloadgg.get_filename(url)
-        elif "1fichier.com" in url:
-            filename = onefichier.get_filename(url)
-        elif "pixeldrain.com" in url:
-            filename = pixeldrain.get_filename(url)
+        self.logger.debug("Getting filename for URL: %s", url)
+        if host := self.host_for(url):
+            filename = await host.get_filename(url)
         else:
-            filename = get_filename_from_url(url)
-        self.logger.info(f"Extracted filename: {filename}")
+            filename = await asyncio.to_thread(get_filename_from_url, url)
+        self.logger.info("Extracted filename: %s", filename)
         return filename
 
-    async def get_direct_link(self, url: str) -> Tuple[str, str, dict, Optional[dict]]:
+    async def get_direct_link(self, url: str) -> DirectLinkResult:
         """Get direct download link for supported services
         
         Args:
             url: Original download URL
             
         Returns:
-            Tuple containing:
-            - Direct download URL
-            - Filename
-            - Headers dict
-            - Optional POST data dict
+            DirectLinkResult with the direct URL, filename, headers, optional
+            POST payload and, when known, size, hash and expiry
             
         Raises:
-            Exception: For unsupported services
+            UnsupportedServiceError: For unsupported services
         """
-        self.logger.info(f"Getting direct link for URL: {url}")
+        self.logger.info("Getting direct link for URL: %s", url)
+        if host := self.host_for(url):
+            self.logger.debug("Processing %s URL", host.name)
+            return await host.get_direct_link(url)
+
         domain = urlparse(url).netloc.lower()
+        if domain in self.hosts_to_debrid:
+            return await self._get_debrid_link(url, domain)
+
+        self.logger.debug("Using direct URL")
+        # check if the url is a valid direct url to download like content disposition not html
+        _, response_headers = await self._head(url)
+        content_disposition = response_headers.get("Content-Disposition")
+        size = response_headers.get("Content-Length")
+        if not content_disposition:
+            raise UnsupportedServiceError("Invalid direct URL")
+        filename = filename_from_content_disposition(content_disposition) or await asyncio.to_thread(get_filename_from_url, url)
+        return {
+            "url": url,
+            "filename": filename,
+            "headers": self.DEFAULT_HEADERS,
+            "payload": None,
+            "size": int(size) if size else None,
+            "hash": None,
+            "expires_at": None,
+        }
+
+    async def _head(self, url: str):
+        """Status and headers of a HEAD request, through the leased exit if any"""
+        exit = current_exit()
+        if exit is None:
+            response = await self.transport.request("HEAD", url, headers=self.DEFAULT_HEADERS)
+            return response.status, response.headers
+        async with exit.session(self.session).head(
+            url, headers=self.DEFAULT_HEADERS, allow_redirects=True, proxy=exit.proxy
+        ) as response:
+            return response.status, response.headers
+
+    async def _get_debrid_link(self, url: str, domain: str) -> DirectLinkResult:
+        """Resolve through MegaDebrid (or the unmask server on Colab)"""
+        def is_running_in_colab():
+            # check if importlib is available
+            import importlib
+            return importlib.util.find_spec("google.colab") is not None
+        if is_running_in_colab():
+            self.logger.debug("Running in Colab")
+            direct_link = await asyncio.to_thread(get_unmasked_link, url)
+            self.logger.debug("Link unmasked: %s", direct_link)
+        else:
+            self.logger.debug("Processing %s URL with debrid", domain)
+            direct_link = await asyncio.to_thread(self.debrid.get_debrid_link, url)
+        filename = await asyncio.to_thread(get_filename_from_url, direct_link)
+        return {
+            "url": direct_link,
+            "filename": filename,
+            "headers": self.DEFAULT_HEADERS,
+            "payload": None,
+            "size": None,
+            "hash": None,
+            "expires_at": time.time() + self.DEBRID_LINK_TTL,
+        }
+
+    def _group_by_host(self, urls: List[str]):
+        """Split URL indexes per host plugin
+
+        Returns:
+            ({host: [index, ...]}, [indexes without a plugin],
+             {index: UnsupportedServiceError} for disabled hosts)
+        """
+        groups: dict = {}
+        others = []
+        unsupported = {}
+        for index, url in enumerate(urls):
+            try:
+                host = self.host_for(url)
+            except UnsupportedServiceError as e:
+                unsupported[index] = e
+                continue
+            if host is None:
+                others.append(index)
+            else:
+                groups.setdefault(host, []).append(index)
+        return groups, others, unsupported
+
+    async def resolve_many(self, urls: List[str]) -> List[Union[DirectLinkResult, BaseException]]:
+        """Resolve a batch of links, grouped per host
         
-        match domain:
-            case domain if "gofile.io" in domain:
-                self.logger.debug("Processing gofile.io URL")
-                return self.gofile_client.get_direct_link(url)
-            case domain if "ranoz.gg" in domain:
-                self.logger.debug("Processing ranoz.gg URL") 
-                raise Exception("ranoz.gg links are not supported because Cloudflare is blocking the request") #TODO: Add support for ranoz.gg
-            case domain if "1fichier.com" in domain:
-                self.logger.debug("Processing 1fichier.com URL")
-                return onefichier.get_direct_link(url)
-            case domain if "oshi.at" in domain:
-                self.logger.error("oshi.at links are not supported")
-                raise Exception("oshi.at is currently not resolved by laws.")
-            case domain if "pixeldrain.com" in domain:
-                self.logger.debug("Processing pixeldrain.com URL")
-                return pixeldrain.get_direct_link(url)
-            case domain if "uploadscloud.com" in domain:
-                self.logger.debug("Processing uploadscloud.com URL")
-                return uploadscloud.get_direct_link(url)
-            case domain if "download.gg" in domain:
-                self.logger.debug("Processing download.gg URL")
-                return downloadgg.get_direct_link(url)
-            case domain if "desiupload.co" in domain:
-                self.logger.debug("Processing desiupload.co URL")
-                return desiupload.get_direct_link(url)
-            case domain if domain in self.hosts_to_debrid:
-                def is_running_in_colab():
-                    # check if importlib is available
-                    import importlib
-                    return importlib.util.find_spec("google.colab") is not None
-                if is_running_in_colab():
-                    self.logger.debug("Running in Colab")
-                    link_unmasked = get_unmasked_link(url)
-                    self.logger.debug(f"Link unmasked: {link_unmasked}")
-                    return link_unmasked, get_filename_from_url(link_unmasked), self.DEFAULT_HEADERS, None
-                self.logger.debug(f"Processing {domain} URL with debrid")
-                direct_link = self.debrid.get_debrid_link(url)
-                filename = get_filename_from_url(direct_link)
-                return direct_link, filename, self.DEFAULT_HEADERS, None
-            case _:
-                self.logger.debug("Using direct URL")
-                # check if the url is a valid direct url to download like content disposition not html
-                response = requests.head(url, headers=self.DEFAULT_HEADERS)
-                if "Content-Disposition" in response.headers:
-                    return url, get_filename_from_url(url), self.DEFAULT_HEADERS, None
-                else:
-                    raise Exception("Invalid direct URL")
+        Each host resolves its own links through its ``resolve_many`` hook
+        (bounded by the host's ``max_concurrency``); debrid and direct links
+        share a global limit.
+        
+        Args:
+            urls: Original download URLs
+            
+        Returns:
+            A DirectLinkResult or the exception raised for each URL, in order
+        """
+        groups, others, unsupported = self._group_by_host(urls)
+        results: List[Union[DirectLinkResult, BaseException, None]] = [None] * len(urls)
+        for index, error in unsupported.items():
+            results[index] = error
+
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+
+        async def resolve_other(index):
+            async with semaphore:
+                try:
+                    results[index] = await self.get_direct_link(urls[index])
+                except Exception as e:
+                    results[index] = e
+
+        async def resolve_group(host, indexes):
+            for index, result in zip(indexes, await host.resolve_many([urls[i] for i in indexes])):
+                results[index] = result
+
+        await asyncio.gather(
+            *(resolve_group(host, indexes) for host, indexes in groups.items()),
+            *(resolve_other(index) for index in others),
+        )
+        return results
+
+    async def probe(self, urls: List[str]) -> ProbeTable:
+        """Fetch filename, size and availability of many links concurrently
+        
+        Hosts with a batch info endpoint answer many links per request; the
+        rest are probed one by one under each host's ``max_concurrency``.
+        Nothing is resolved to a download link where it can be avoided, so
+        countdowns and captchas are skipped.
+        
+        Args:
+            urls: Original download URLs
+            
+        Returns:
+            ProbeTable with one row per URL, in order
+        """
+        groups, others, unsupported = self._group_by_host(urls)
+        rows: List[Optional[ProbeResult]] = [None] * len(urls)
+        for index, error in unsupported.items():
+            rows[index] = ProbeResult(urls[index], urlparse(urls[index]).netloc.lower(), error=str(error))
+
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+
+        async def probe_other(index):
+            async with semaphore:
+                rows[index] = await self._probe_url(urls[index])
+
+        async def probe_group(host, indexes):
+            for index, row in zip(indexes, await host.probe_many([urls[i] for i in indexes])):
+                rows[index] = row
+
+        await asyncio.gather(
+            *(probe_group(host, indexes) for host, indexes in groups.items()),
+            *(probe_other(index) for index in others),
+        )
+        return ProbeTable(rows)
+
+    async def _probe_url(self, url: str) -> ProbeResult:
+        """Probe a link without host plugin with a HEAD request"""
+        domain = urlparse(url).netloc.lower()
+        if domain in self.hosts_to_debrid:
+            # Only the debrid service can tell; resolving would consume quota
+            return ProbeResult(url, domain, Path(urlparse(url).path).name or None)
+        try:
+            status, response_headers = await self._head(url)
+            content_disposition = response_headers.get("Content-Disposition", "")
+            size = response_headers.get("Content-Length")
+        except Exception as e:
+            return ProbeResult(url, domain, error=str(e) or type(e).__name__)
+        if status >= 400:
+            return ProbeResult(url, domain, available=False if status in (404, 410) else None, error=f"HTTP {status}")
+        filename = filename_from_content_disposition(content_disposition) or unquote(Path(urlparse(url).path).name) or None
+        return ProbeResult(url, domain, filename, int(size) if size else None, available=True)
 
     def _extract_oshi_filename(self, url: str) -> str:
         """Extract filename from Oshi.at URL
@@ -354,7 +1101,7 @@ class LinkResolver:
             Extracted filename or 'unknown_file'
         """
         filename = Path(urlparse(url).path).name or "unknown_file"
-        self.logger.debug(f"Extracted oshi.at filename: {filename}")
+        self.logger.debug("Extracted oshi.at filename: %s", filename)
         return filename
 
 def get_unmasked_link(url):
@@ -388,25 +1135,322 @@ def get_unmasked_link(url):
 
 class DarkLoader:
     """Async file downloader for multiple hosting services"""
+    # Links expiring within this many seconds are resolved again before the transfer
+    EXPIRY_MARGIN: float = 30
+    # Resolutions of one URL before an expiring link is given up
+    MAX_RESOLVE_ATTEMPTS: int = 3
+    # Largest direct-link file fetched with a single GET when small_files is set
+    SMALL_FILE_SIZE: int = 1024 * 1024
+    # Jobs of a batch started at once, waiting for their host's slot or a
+    # download slot; the rest stay in the list or table until then
+    PENDING_JOBS: int = 256
 
     def __init__(
         self, 
         download_dir: str = "downloads",
-        log_level: str = "DEBUG"
+        log_level: str = "INFO",
+        profile: Union[bool, str] = False,
+        profile_dir: Optional[str] = None,
+        min_free_space: int = 0,
+        proxies: Optional[ProxyPool] = None,
+        host_limits: Optional[HostConcurrency] = None,
+        transport: str = "aiohttp",
+        timeouts: Optional[TransferTimeouts] = None,
+        connections: int = 4,
+        max_rate: Optional[float] = None,
+        session_file: Optional[Path] = None,
+        small_files: bool = False
     ) -> None:
+        """
+        Args:
+            download_dir: Directory where files are saved
+            log_level: Logging level
+            profile: True to record per-stage timings of every URL, or
+                "cprofile" / "sampling" to also run batches under that profiler
+            profile_dir: Where profiling reports are written (defaults to
+                download_dir)
+            min_free_space: Bytes that downloads must always leave free on
+                the target filesystem
+            proxies: Pool of proxies / source addresses each download is
+                routed through
+            host_limits: Adaptive per-host limit of simultaneous downloads
+                and of connections per file, saved on close
+            transport: HTTP backend shared by resolution and transfers,
+                "aiohttp" or "httpx" (HTTP/2)
+            timeouts: Connect, first byte, read and stall limits of
+                transfers; stalled transfers reconnect and resume
+            connections: Connections a large file is split over, capped by
+                what its host allows and, with host_limits, by what was
+                learned for the host
+            max_rate: Combined bytes/s of all transfers, None for no limit
+            session_file: JSON file keeping host cookies and tokens between
+                runs (see ``darkloader.cookies``), saved on close
+            small_files: Batches are mostly small files: direct links are
+                fetched with a single GET, without the HEAD probe, when they
+                turn out to be at most ``SMALL_FILE_SIZE`` bytes, and host
+                links of unknown size are not probed
+        """
         self.download_dir = Path(download_dir)
+        self.log_level = log_level
+        self.min_free_space = min_free_space
+        self.proxies = proxies
+        self.host_limits = host_limits
+        self.small_files = small_files
+        self._disk_budgets: Dict[int, DiskBudget] = {}
+        # Download directory -> budget of its filesystem
+        self._directory_budgets: Dict[Path, DiskBudget] = {}
         self.logger = setup_logger("DarkLoader", log_level)
-        self.logger.info(f"Initialized DarkLoader with download directory: {download_dir}")
+        self.logger.info("Initialized DarkLoader with download directory: %s", download_dir)
         
         # Initialize component classes
-        self.downloader = FileDownloader(download_dir, log_level)
-        self.link_resolver = LinkResolver(log_level)
+        self.transport = make_transport(transport)
+        self.downloader = FileDownloader(
+            download_dir, log_level, self.transport, timeouts, connections, max_rate
+        )
+        self.sessions = SessionStore(session_file, log_level)
+        self.link_resolver = LinkResolver(log_level, self.transport, self.sessions)
+        self.profiler = None
+        if profile:
+            self.profiler = Profiler(
+                None if profile is True else profile,
+                Path(profile_dir or download_dir)
+            )
+
+    async def close(self) -> None:
+        """Close the network sessions held by the resolver, the transport and the proxy pool"""
+        # While the jar is still open
+        self.sessions.capture(self.transport)
+        self.sessions.save()
+        await self.link_resolver.close()
+        await self.transport.close()
+        if self.proxies:
+            await self.proxies.close()
+        if self.host_limits:
+            self.host_limits.save()
+
+    async def __aenter__(self) -> "DarkLoader":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _disk_budget(self, path: Path) -> DiskBudget:
+        """Admission budget of the filesystem holding `path`, shared by all its downloads"""
+        if path in self._directory_budgets:
+            return self._directory_budgets[path]
+        self.downloader.ensure_directory(path)
+        device = os.stat(path).st_dev
+        if device not in self._disk_budgets:
+            self._disk_budgets[device] = DiskBudget(path, self.min_free_space, self.log_level)
+        self._directory_budgets[path] = self._disk_budgets[device]
+        return self._disk_budgets[device]
+
+    def _is_direct(self, url: str) -> bool:
+        """Whether `url` is downloaded as it is, without a host plugin or debrid"""
+        if self.link_resolver.host_for(url):
+            return False
+        return urlparse(url).netloc.lower() not in self.link_resolver.hosts_to_debrid
+
+    def _track(self, url: str, host: str):
+        """Profiling scope for one URL, a no-op when profiling is disabled"""
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.track(url, host)
+
+    def _route(self, host: str):
+        """Exit lease of one download, a no-op without a proxy pool"""
+        if self.proxies is None:
+            return nullcontext()
+        return self.proxies.lease(host)
+
+    def _host_slot(self, host: str):
+        """Per-host download slot, a no-op without adaptive limits"""
+        if self.host_limits is None:
+            return nullcontext()
+        return self.host_limits.slot(host)
+
+    async def download_batch(
+        self,
+        urls: List[str],
+        dl_path: Optional[Path] = None,
+        concurrency: int = 4,
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None
+    ) -> List[Union[str, BaseException]]:
+        """Download several URLs with bounded concurrency
+        
+        Args:
+            urls: Download URLs
+            dl_path: Optional custom download path
+            concurrency: Maximum simultaneous downloads
+            progress_cb: Optional progress callback
+            
+        Returns:
+            Path of each downloaded file, or the exception it failed with,
+            in the order of `urls`
+        """
+        results: List[Union[str, BaseException]] = [None] * len(urls)
+        await self._schedule(enumerate(urls), dl_path, concurrency, progress_cb, results.__setitem__)
+        return results
+
+    async def download_jobs(
+        self,
+        table: JobTable,
+        dl_path: Optional[Path] = None,
+        concurrency: int = 4,
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None
+    ) -> JobTable:
+        """Download the queued jobs of a table with bounded concurrency
+
+        Like ``download_batch`` for very large batches: results are kept in
+        the table (paths and error messages) instead of a list of objects.
+
+        Args:
+            table: Jobs to download; each one is marked done or failed
+            dl_path: Optional custom download path
+            concurrency: Maximum simultaneous downloads
+            progress_cb: Optional progress callback
+
+        Returns:
+            `table`
+        """
+        jobs = ((index, table.url(index)) for index in table.take())
+        await self._schedule(jobs, dl_path, concurrency, progress_cb, table.finish)
+        return table
+
+    async def _schedule(
+        self,
+        jobs: Iterable[Tuple[int, str]],
+        dl_path: Optional[Path],
+        concurrency: int,
+        progress_cb: Optional[Callable[[str, int, int], Any]],
+        done: Callable[[int, Union[str, BaseException]], Any]
+    ) -> None:
+        """Download (index, URL) jobs, passing each index and outcome to `done`
+
+        Jobs are taken from `jobs` only as earlier ones finish, at most
+        ``PENDING_JOBS`` at a time, so a batch of any length costs the same
+        memory.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        window = asyncio.Semaphore(max(self.PENDING_JOBS, concurrency))
+        tasks = set()
+
+        async def download(index, url):
+            try:
+                # Waiting for the host's slot doesn't hold up other hosts' downloads
+                async with self._host_slot(urlparse(url).netloc.lower()) as slot, semaphore:
+                    result = await self._download_url(url, dl_path, progress_cb, slot)
+            except Exception as e:
+                done(index, e)
+            else:
+                done(index, result)
+            finally:
+                window.release()
+
+        if self.profiler:
+            self.profiler.start()
+        try:
+            for index, url in jobs:
+                await window.acquire()
+                task = asyncio.ensure_future(download(index, url))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            while tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.profiler:
+                self._write_profile()
+
+    async def _transfer(
+        self,
+        url: str,
+        link: DirectLinkResult,
+        final_path: Path,
+        progress_cb: Optional[Callable[[str, int, int], Any]],
+        reservation: Optional[Reservation],
+        connections: Optional[int] = None
+    ) -> str:
+        """Download a resolved link, resolving it again whenever it expires
+
+        The link is checked just before the transfer starts, since waiting
+        for a slot or for disk space may have outlived it. A link that fails
+        as expired or serves an error page is resolved again and the
+        transfer resumes from the bytes already in the ``.part`` file.
+        `connections`, learned for the host, caps the connections the link
+        allows.
+        """
+        offset = 0
+        for attempt in range(1, self.MAX_RESOLVE_ATTEMPTS + 1):
+            if is_expired(link, self.EXPIRY_MARGIN):
+                self.logger.info("Direct link expired, resolving it again")
+                with stage("resolve"):
+                    link = await self.link_resolver.get_direct_link(url)
+            try:
+                return await self.downloader.download_from_url(
+                    link["url"],
+                    final_path,
+                    headers=link["headers"],
+                    data=link["payload"],
+                    method="POST" if link["payload"] else "GET",
+                    progress_cb=progress_cb,
+                    reservation=reservation,
+                    offset=offset,
+                    connections=min(filter(None, (link.get("connections"), connections)), default=None),
+                    error_patterns=link.get("error_patterns", ())
+                )
+            except LinkExpiredError:
+                if attempt == self.MAX_RESOLVE_ATTEMPTS:
+                    raise
+                link = {**link, "expires_at": 0.0}
+                offset = self.downloader.resume_offset(final_path)
+
+    async def _transfer_to_sink(
+        self,
+        url: str,
+        link: DirectLinkResult,
+        filename: str,
+        progress_cb: Optional[Callable[[str, int, int], Any]],
+        sink: Sink
+    ) -> str:
+        """Stream a resolved link into a sink, resolving it again whenever it expires"""
+        for attempt in range(1, self.MAX_RESOLVE_ATTEMPTS + 1):
+            if is_expired(link, self.EXPIRY_MARGIN):
+                self.logger.info("Direct link expired, resolving it again")
+                with stage("resolve"):
+                    link = await self.link_resolver.get_direct_link(url)
+            try:
+                return await self.downloader.download_to_sink(
+                    link["url"],
+                    sink,
+                    filename,
+                    method="POST" if link["payload"] else "GET",
+                    headers=link["headers"],
+                    data=link["payload"],
+                    progress_cb=progress_cb,
+                    error_patterns=link.get("error_patterns", ())
+                )
+            except LinkExpiredError:
+                if attempt == self.MAX_RESOLVE_ATTEMPTS:
+                    raise
+                link = {**link, "expires_at": 0.0}
+
+    def _write_profile(self) -> None:
+        sampler_path = self.profiler.stop()
+        report_path = self.profiler.write_report()
+        self.logger.info("Profile summary:\n%s", self.profiler.format_summary())
+        self.logger.info("Profile report written to %s", report_path)
+        if sampler_path:
+            self.logger.info("%s output written to %s", self.profiler.sampler, sampler_path)
 
     async def download_url(
         self, 
         url: str,
         dl_path: Optional[Path] = None,
-        progress_cb: Optional[Callable[[str, int, int], Any]] = None
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None,
+        sink: Optional[Sink] = None
     ) -> str:
         """Main download entry point
         
@@ -414,37 +1458,176 @@ class DarkLoader:
             url: Download URL
             dl_path: Optional custom download path
             progress_cb: Optional progress callback
+            sink: Where to stream the file instead of saving it under the
+                download path (see ``darkloader.sinks``); aborted when the
+                download fails
+            
+        Returns:
+            Path to downloaded file as string, or the location in `sink`
             
+        Raises:
+            DiskSpaceError: If the file doesn't fit on the filesystem
+            SinkError: If the sink fails
+        """
+        async with self._host_slot(urlparse(url).netloc.lower()) as slot:
+            try:
+                return await self._download_url(url, dl_path, progress_cb, slot, sink)
+            except BaseException as e:
+                # Also when resolution failed: an iterating reader must not wait forever
+                if sink is not None:
+                    await sink.abort(e)
+                raise
+
+    async def download_mirrors(
+        self,
+        urls: List[str],
+        dl_path: Optional[Path] = None,
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None
+    ) -> str:
+        """Download one file from several mirrors at once
+
+        Mirrors that can't be resolved, or whose size can't be found out,
+        are left out. The others must agree on size and, where reported,
+        hash. Transfers go through the shared
+        transport and not through the proxy pool.
+
+        Args:
+            urls: Links of the same file on different hosts
+            dl_path: Optional custom download path
+            progress_cb: Optional progress callback
+
         Returns:
             Path to downloaded file as string
+
+        Raises:
+            FileDownloaderError: If no mirror can be resolved or reports a size
+            MirrorMismatchError: If the mirrors serve different files
+            SegmentError: If every mirror failed mid-transfer
+            ValueError: If `urls` is empty
         """
-        self.logger.info(f"Starting download process for URL: {url}")
-        download_path = dl_path or self.downloader.download_dir
-        
-        direct_link, filename, headers, data = await self.link_resolver.get_direct_link(url)
-        self.logger.debug(f"Direct link info: {direct_link}, {filename}, {headers}")
-        
-        sanitized_name = sanitaze_name(filename)
-        final_path = Path(download_path) / sanitized_name
-        self.logger.debug(f"Final download path: {final_path}")
-        
-        file_size = self.downloader.get_file_url_size(direct_link, headers=headers)
-        
-        if existing_file := self.downloader.is_downloaded(final_path, file_size):
-            self.logger.info(f"File already exists: {existing_file}")
-            return existing_file
-        
-        self.logger.info("Starting file download")
-        output_path = await self.downloader.download_from_url(
-            direct_link, 
-            final_path,
-            headers=headers,
-            data=data,
-            method="POST" if data else "GET",
-            progress_cb=progress_cb
-        )
-        self.logger.info(f"Download completed: {output_path}")
-        return output_path
+        if not urls:
+            raise ValueError("download_mirrors needs at least one URL")
+        with log_context(url=urls[0], host="mirrors"):
+            with stage("resolve"):
+                results = await self.link_resolver.resolve_many(urls)
+            mirrors = []
+            for url, result in zip(urls, results):
+                if isinstance(result, BaseException):
+                    self.logger.warning("Leaving out mirror %s: %s", url, result)
+                    continue
+                mirrors.append(Mirror(url, result, result.get("size")))
+            if not mirrors:
+                raise FileDownloaderError("None of the mirrors could be resolved")
+            unsized = [mirror for mirror in mirrors if not mirror.size]
+            if unsized:
+                with stage("probe"):
+                    sizes = await asyncio.gather(
+                        *(probe_size(self.transport, mirror.link) for mirror in unsized), return_exceptions=True
+                    )
+                for mirror, size in zip(unsized, sizes):
+                    if isinstance(size, BaseException):
+                        self.logger.warning(
+                            "Leaving out mirror %s: size probe failed: %s", mirror.url, str(size) or type(size).__name__
+                        )
+                    elif size is None:
+                        # Its ranges couldn't be checked against the others
+                        self.logger.warning("Leaving out mirror %s: size unknown", mirror.url)
+                    mirror.size = size if isinstance(size, int) else None
+                mirrors = [mirror for mirror in mirrors if mirror.size]
+                if not mirrors:
+                    raise FileDownloaderError("None of the mirrors reports the size of the file")
+            file_size = verify_mirrors(mirrors)
+
+            sanitized_name = sanitaze_name(mirrors[0].link["filename"])
+            final_path = Path(dl_path or self.downloader.download_dir) / sanitized_name
+            with log_context(filename=sanitized_name):
+                if existing_file := self.downloader.is_downloaded(final_path, file_size):
+                    self.logger.info("File already exists: %s", existing_file)
+                    return existing_file
+                async with self._disk_budget(final_path.parent).admit(file_size) as reservation:
+                    return await self.downloader.download_from_mirrors(
+                        [mirror.link for mirror in mirrors], final_path, file_size, progress_cb, reservation
+                    )
+
+    async def _download_url(
+        self,
+        url: str,
+        dl_path: Optional[Path],
+        progress_cb: Optional[Callable[[str, int, int], Any]],
+        slot: Optional[Slot],
+        sink: Optional[Sink] = None
+    ) -> str:
+        host = urlparse(url).netloc.lower()
+        with log_context(url=url, host=host), self._track(url, host):
+            # Resolution and transfer share the exit: links are often bound to the IP
+            async with self._route(host) as exit:
+                self.logger.info("Starting download process for URL: %s", url)
+                download_path = dl_path or self.downloader.download_dir
+
+                if self.small_files and sink is None and self._is_direct(url):
+                    transfer_started = time.perf_counter()
+                    budget = self._disk_budget(Path(download_path))
+                    downloaded = await self.downloader.download_direct(
+                        url, Path(download_path), self.SMALL_FILE_SIZE, progress_cb, budget
+                    )
+                    if downloaded:
+                        output_path, transferred = downloaded
+                        # A file already there says nothing about the exit or the host's throughput
+                        if transferred:
+                            if exit:
+                                exit.record_success(transferred, time.perf_counter() - transfer_started)
+                            if slot:
+                                slot.nbytes = transferred
+                        return output_path
+
+                with stage("resolve"):
+                    link = await self.link_resolver.get_direct_link(url)
+                direct_link, filename = link["url"], link["filename"]
+                headers = link["headers"]
+                self.logger.debug("Direct link info: %s, %s", direct_link, filename)
+
+                sanitized_name = sanitaze_name(filename)
+                final_path = Path(download_path) / sanitized_name
+                self.logger.debug("Final download path: %s", final_path)
+
+                with log_context(filename=sanitized_name):
+                    if sink is not None:
+                        transfer_started = time.perf_counter()
+                        output_path = await self._transfer_to_sink(url, link, sanitized_name, progress_cb, sink)
+                        if exit:
+                            exit.record_success(sink.written, time.perf_counter() - transfer_started)
+                        if slot:
+                            slot.nbytes = sink.written
+                        return output_path
+
+                    file_size = link.get("size")
+                    # A HEAD per small file costs about as much as the file
+                    if not file_size and not self.small_files:
+                        with stage("probe"):
+                            file_size = await self.downloader.get_file_url_size(direct_link, headers=headers)
+
+                    if existing_file := self.downloader.is_downloaded(final_path, file_size):
+                        self.logger.info("File already exists: %s", existing_file)
+                        return existing_file
+
+                    connections = None
+                    if slot:
+                        connections = slot.connections = min(
+                            link.get("connections") or slot.connections, slot.connections, self.downloader.connections
+                        )
+                        slot.segmented = bool(file_size) and file_size >= 2 * self.downloader.MIN_SEGMENT_SIZE
 
+                    # Admitted only while the known size fits on the filesystem
+                    async with self._disk_budget(final_path.parent).admit(file_size) as reservation:
+                        self.logger.info("Starting file download")
+                        transfer_started = time.perf_counter()
+                        output_path = await self._transfer(
+                            url, link, final_path, progress_cb, reservation, connections
+                        )
+                    if exit:
+                        exit.record_success(file_size, time.perf_counter() - transfer_started)
+                    if slot:
+                        slot.nbytes = file_size
+                    self.logger.info("Download completed: %s", output_path)
+                    return output_path
 
-print("Running DarkLoader example")
\ No newline at end of file
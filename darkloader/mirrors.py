@@ -0,0 +1,71 @@
+"""One file fetched from several mirrors at once
+
+Releases are often uploaded to several hosts. ``DarkLoader.download_mirrors``
+resolves every mirror, checks that they serve the same file and downloads
+different ranges from each at once (see ``SegmentedDownload``), so the
+mirrors add up their bandwidth, ranges move toward the fastest one and a
+mirror that dies mid-transfer leaves its ranges to the others.
+
+The check is on what the hosts report: every size must match, and so must
+the hashes of the same algorithm where hosts give one.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from darkloader.host import DirectLinkResult
+from darkloader.transport import Transport
+
+
+class MirrorMismatchError(Exception):
+    """The mirrors don't serve the same file"""
+
+
+@dataclass
+class Mirror:
+    """One resolved source of a mirrored file"""
+    url: str
+    link: DirectLinkResult
+    size: Optional[int] = None
+
+    @property
+    def host(self) -> str:
+        return urlparse(self.url).netloc.lower()
+
+
+async def probe_size(transport: Transport, link: DirectLinkResult) -> Optional[int]:
+    """Size reported by a HEAD request of the direct link, None if it isn't"""
+    if link["payload"]:
+        # POST downloads can't be probed with HEAD
+        return None
+    response = await transport.request("HEAD", link["url"], headers=link["headers"])
+    length = response.headers.get("Content-Length")
+    return int(length) if response.status < 400 and length else None
+
+
+def verify_mirrors(mirrors: List[Mirror]) -> int:
+    """Check that the mirrors agree on the file
+
+    Returns:
+        The size of the file
+
+    Raises:
+        MirrorMismatchError: If sizes or hashes differ, or no mirror
+            reports a size
+    """
+    sizes = {mirror.size for mirror in mirrors if mirror.size}
+    if not sizes:
+        raise MirrorMismatchError("No mirror reports the size of the file")
+    if len(sizes) > 1:
+        reported = ", ".join(f"{mirror.host}: {mirror.size}" for mirror in mirrors)
+        raise MirrorMismatchError(f"Mirrors disagree on the size: {reported}")
+
+    hashes: Dict[str, Mirror] = {}
+    for mirror in mirrors:
+        if not mirror.link.get("hash"):
+            continue
+        algorithm, _, digest = mirror.link["hash"].partition(":")
+        other = hashes.setdefault(algorithm, mirror)
+        if other.link["hash"].partition(":")[2].lower() != digest.lower():
+            raise MirrorMismatchError(f"{mirror.host} and {other.host} report different {algorithm} hashes")
+    return sizes.pop()
@@ -0,0 +1,349 @@
+"""Multi-process mode: downloads sharded across worker processes
+
+One asyncio loop saturates a single core long before the network does when
+many TLS streams are hashed and written at once. ``ProcessCoordinator``
+starts N worker processes, each running its own event loop, DarkLoader and
+connection pool, and hands each one jobs through a queue of its own: one more
+than it has slots, topped up as its jobs finish, so faster processes simply
+do more work. Progress, results and failures come back over an event queue
+and the coordinator keeps the state of every job.
+
+A worker process that dies fails the jobs it had started; the ones it had
+been handed but not started go to the other processes. (A single queue
+shared by all the workers would not survive that: a process killed while
+waiting on it keeps the queue's lock.)
+
+Disk admission is per process: ``min_free_space`` holds in each worker, but
+the reservations of one process are not seen by the others.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Union
+
+from darkloader.logger import setup_logger
+from darkloader.runtime import LoopOptions, loop_factory, run
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Minimum seconds between two progress events of the same job
+PROGRESS_INTERVAL = 0.5
+
+
+class WorkerError(Exception):
+    """A job failed inside a worker process
+
+    Exceptions are not sent between processes as is (many can't be pickled
+    back), only their type name and message.
+    """
+
+    def __init__(self, type_name: str, message: str) -> None:
+        super().__init__(f"{type_name}: {message}" if message else type_name)
+        self.type_name = type_name
+
+
+@dataclass
+class JobState:
+    """What the coordinator knows about one job"""
+    id: int
+    url: str
+    state: str = QUEUED
+    # Process the job was handed to
+    worker: Optional[int] = None
+    dl_path: Optional[str] = None
+    filename: Optional[str] = None
+    done: int = 0
+    total: int = 0
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _worker_main(index: int, jobs, events, options: dict, concurrency: int, loop: LoopOptions) -> None:
+    """Entry point of a worker process"""
+    run(_serve_jobs(index, jobs, events, options, concurrency), loop)
+
+
+async def _serve_jobs(index: int, jobs, events, options: dict, concurrency: int) -> None:
+    from darkloader.main import DarkLoader
+
+    # One thread blocks on the process's queue
+    local: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def feed():
+        while (job := await asyncio.to_thread(jobs.get)) is not None:
+            await local.put(job)
+        for _ in range(concurrency):
+            await local.put(None)
+
+    async def slot(loader):
+        while (job := await local.get()) is not None:
+            job_id, url, dl_path = job
+            events.put(("started", job_id, index, None))
+            last = 0.0
+
+            async def progress(name, done, total):
+                nonlocal last
+                now = time.monotonic()
+                if done >= total or now - last >= PROGRESS_INTERVAL:
+                    last = now
+                    events.put(("progress", job_id, index, (name, done, total)))
+
+            try:
+                path = await loader.download_url(url, Path(dl_path) if dl_path else None, progress)
+            except Exception as e:
+                events.put(("failed", job_id, index, (type(e).__name__, str(e))))
+            else:
+                events.put(("done", job_id, index, str(path)))
+
+    try:
+        async with DarkLoader(**options) as loader:
+            await asyncio.gather(feed(), *(slot(loader) for _ in range(concurrency)))
+    finally:
+        events.put(("exit", None, index, None))
+
+
+class ProcessCoordinator:
+    """Runs downloads in a pool of worker processes
+
+    Args:
+        processes: Worker processes (defaults to the number of CPUs)
+        concurrency: Simultaneous downloads in each process
+        download_dir: Directory where files are saved
+        log_level: Logging level, also used in the workers
+        min_free_space: Bytes each worker leaves free on the target filesystem
+        loop: Event loop of the workers (see ``darkloader.runtime``)
+
+    Raises:
+        ImportError: If the workers' loop is uvloop and it isn't installed
+
+    Usage:
+        async with ProcessCoordinator(processes=4) as pool:
+            results = await pool.download_batch(urls)
+    """
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        concurrency: int = 4,
+        download_dir: str = "downloads",
+        log_level: str = "INFO",
+        min_free_space: int = 0,
+        loop: Optional[LoopOptions] = None,
+    ) -> None:
+        self.loop = loop or LoopOptions()
+        # Checked here: a worker failing to start its loop would never report back
+        loop_factory(self.loop.loop)
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.options = {"download_dir": download_dir, "log_level": log_level, "min_free_space": min_free_space}
+        self.logger = setup_logger("ProcessCoordinator", log_level)
+        self.jobs: Dict[int, JobState] = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[multiprocessing.Process] = []
+        self._job_queues: list = []
+        self._events = None
+        # Jobs not handed to a worker yet, and the jobs handed to each worker
+        self._pending: Deque[int] = deque()
+        self._assigned: List[Set[int]] = []
+        # Workers found dead; events they left in the queue are ignored
+        self._dead: Set[int] = set()
+        self._reader: Optional[asyncio.Task] = None
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._progress_cbs: Dict[int, Callable] = {}
+        self._next_id = 0
+
+    async def __aenter__(self) -> "ProcessCoordinator":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        """Start the worker processes, if not running yet"""
+        if self._workers:
+            return
+        self._events = self._context.Queue()
+        self._job_queues = [self._context.Queue() for _ in range(self.processes)]
+        self._assigned = [set() for _ in range(self.processes)]
+        self._dead = set()
+        for index in range(self.processes):
+            process = self._context.Process(
+                target=_worker_main,
+                args=(index, self._job_queues[index], self._events, self.options, self.concurrency, self.loop),
+                name=f"darkloader-worker-{index}",
+            )
+            process.start()
+            self._workers.append(process)
+        self._reader = asyncio.create_task(self._read_events())
+        self.logger.info("Started %d worker processes, %d downloads each", self.processes, self.concurrency)
+
+    async def close(self) -> None:
+        """Let the workers finish their jobs and wait for them to exit"""
+        if not self._workers:
+            return
+        # Jobs still pending are only handed out as others finish
+        await asyncio.gather(*self._waiters.values(), return_exceptions=True)
+        for jobs in self._job_queues:
+            jobs.put(None)
+        await self._reader
+        for process in self._workers:
+            await asyncio.to_thread(process.join)
+        self._workers = []
+        for jobs in self._job_queues:
+            jobs.close()
+        self._events.close()
+
+    def totals(self) -> Dict[str, int]:
+        """Aggregate progress: job counts per state plus bytes done/total"""
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in self.jobs.values():
+            counts[job.state] += 1
+        counts["bytes_done"] = sum(job.done for job in self.jobs.values())
+        counts["bytes_total"] = sum(job.total for job in self.jobs.values())
+        return counts
+
+    def submit(
+        self,
+        url: str,
+        dl_path: Optional[Path] = None,
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None
+    ) -> "asyncio.Future[str]":
+        """Queue one download
+
+        Returns:
+            Future resolved with the path of the file, or failing with a
+            WorkerError
+        """
+        self.start()
+        job = JobState(self._next_id, url, dl_path=str(dl_path) if dl_path else None)
+        self._next_id += 1
+        self.jobs[job.id] = job
+        self._waiters[job.id] = asyncio.get_running_loop().create_future()
+        if progress_cb:
+            self._progress_cbs[job.id] = progress_cb
+        self._pending.append(job.id)
+        self._dispatch()
+        return self._waiters[job.id]
+
+    async def download_batch(
+        self,
+        urls: List[str],
+        dl_path: Optional[Path] = None,
+        progress_cb: Optional[Callable[[str, int, int], Any]] = None
+    ) -> List[Union[str, BaseException]]:
+        """Download several URLs across the worker processes
+
+        Args:
+            urls: Download URLs
+            dl_path: Optional custom download path
+            progress_cb: Optional progress callback, called in this process
+
+        Returns:
+            Path of each downloaded file, or the WorkerError it failed with,
+            in the order of `urls`
+        """
+        futures = [self.submit(url, dl_path, progress_cb) for url in urls]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    def _dispatch(self) -> None:
+        """Hand pending jobs to the live workers with room for them"""
+        # Each slot busy and one job ready to start when a slot frees up
+        room = self.concurrency + 1
+        live = [
+            index for index, process in enumerate(self._workers)
+            if index not in self._dead and process.exitcode is None
+        ]
+        while self._pending and live:
+            index = min(live, key=lambda i: len(self._assigned[i]))
+            if len(self._assigned[index]) >= room:
+                break
+            job = self.jobs[self._pending.popleft()]
+            job.worker = index
+            self._assigned[index].add(job.id)
+            self._job_queues[index].put((job.id, job.url, job.dl_path))
+
+    async def _read_events(self) -> None:
+        running = len(self._workers)
+        checked = time.monotonic()
+        while running:
+            try:
+                event = await asyncio.to_thread(self._events.get, timeout=1)
+            except queue.Empty:
+                event = None
+            # Events of the other workers may never let the queue time out
+            if event is None or time.monotonic() - checked >= 1:
+                checked = time.monotonic()
+                if not self._check_workers():
+                    break
+            if event is None:
+                continue
+            kind, job_id, worker, payload = event
+            if kind == "exit":
+                running -= 1
+                continue
+            if worker in self._dead:
+                continue
+            await self._handle(kind, self.jobs[job_id], worker, payload)
+        # Workers are gone: whatever they didn't report is lost
+        self._pending.clear()
+        for job in self.jobs.values():
+            if job.state in (QUEUED, RUNNING):
+                self._finish(job, FAILED, WorkerError("WorkerExited", "worker processes exited"))
+
+    async def _handle(self, kind: str, job: JobState, worker: int, payload) -> None:
+        if kind == "started":
+            job.state = RUNNING
+        elif kind == "progress":
+            job.filename, job.done, job.total = payload
+            if callback := self._progress_cbs.get(job.id):
+                await callback(*payload)
+        elif kind == "done":
+            self._finish(job, DONE, payload)
+        elif kind == "failed":
+            self._finish(job, FAILED, WorkerError(*payload))
+
+    def _finish(self, job: JobState, state: str, outcome: Union[str, BaseException]) -> None:
+        job.state = state
+        if job.worker is not None:
+            self._assigned[job.worker].discard(job.id)
+            self._dispatch()
+        self._progress_cbs.pop(job.id, None)
+        waiter = self._waiters.pop(job.id)
+        if isinstance(outcome, BaseException):
+            job.error = str(outcome)
+            self.logger.error("Job %s failed on worker %s: %s", job.id, job.worker, outcome)
+            waiter.set_exception(outcome)
+        else:
+            job.result = outcome
+            waiter.set_result(outcome)
+
+    def _check_workers(self) -> bool:
+        """Deal with the jobs of worker processes that died without reporting
+
+        Their running jobs fail; the ones they had not started go back to
+        the front of the pending jobs.
+
+        Returns:
+            Whether any worker process is still alive
+        """
+        for index, process in enumerate(self._workers):
+            if process.exitcode in (None, 0) or index in self._dead:
+                continue
+            self._dead.add(index)
+            handed = sorted(self._assigned[index])
+            self._assigned[index].clear()
+            for job in (self.jobs[job_id] for job_id in handed):
+                if job.state == RUNNING:
+                    self._finish(job, FAILED, WorkerError("WorkerExited", f"exit code {process.exitcode}"))
+            requeued = [job_id for job_id in handed if self.jobs[job_id].state == QUEUED]
+            if requeued:
+                self.logger.warning("Worker %s exited, handing jobs %s to the others", index, requeued)
+                self._pending.extendleft(reversed(requeued))
+            self._dispatch()
+        return any(process.is_alive() for process in self._workers)
@@ -0,0 +1,113 @@
+"""Filename, size and availability of link lists before downloading
+
+``LinkResolver.probe(urls)`` returns a ``ProbeTable`` that can be sorted,
+filtered and deduplicated to preview a batch before disk space is committed.
+"""
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterator, List, Optional
+
+
+@dataclass
+class ProbeResult:
+    """Metadata of one link
+
+    available is True/False when the host confirmed it, None when it could
+    not be determined (network error, unsupported host...).
+    """
+    url: str
+    host: str
+    filename: Optional[str] = None
+    size: Optional[int] = None
+    available: Optional[bool] = None
+    error: Optional[str] = None
+
+
+class ProbeTable:
+    """Sortable, filterable list of ProbeResult"""
+
+    def __init__(self, rows: List[ProbeResult]) -> None:
+        self.rows = list(rows)
+
+    def __iter__(self) -> Iterator[ProbeResult]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index: int) -> ProbeResult:
+        return self.rows[index]
+
+    @property
+    def total_size(self) -> int:
+        """Sum of the known sizes"""
+        return sum(row.size or 0 for row in self.rows)
+
+    def urls(self) -> List[str]:
+        return [row.url for row in self.rows]
+
+    def sort(self, by: str = "size", reverse: bool = False) -> "ProbeTable":
+        """Rows ordered by a ProbeResult field; unknown values go last"""
+        known = [row for row in self.rows if getattr(row, by) is not None]
+        unknown = [row for row in self.rows if getattr(row, by) is None]
+        return ProbeTable(sorted(known, key=lambda row: getattr(row, by), reverse=reverse) + unknown)
+
+    def filter(
+        self,
+        predicate: Optional[Callable[[ProbeResult], bool]] = None,
+        *,
+        available: Optional[bool] = None,
+        host: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ) -> "ProbeTable":
+        """Rows matching every given condition
+
+        Args:
+            predicate: Arbitrary test on a row
+            available: Keep rows with exactly this availability
+            host: Keep rows of this host
+            min_size: Keep rows whose size is known and at least this
+            max_size: Keep rows whose size is known and at most this
+        """
+        def keep(row: ProbeResult) -> bool:
+            if available is not None and row.available is not available:
+                return False
+            if host is not None and row.host != host:
+                return False
+            if min_size is not None and (row.size is None or row.size < min_size):
+                return False
+            if max_size is not None and (row.size is None or row.size > max_size):
+                return False
+            return predicate is None or predicate(row)
+
+        return ProbeTable([row for row in self.rows if keep(row)])
+
+    def unique(self) -> "ProbeTable":
+        """Drop rows with the same filename and size as an earlier row
+
+        Rows without a filename are never considered duplicates.
+        """
+        seen = set()
+        rows = []
+        for row in self.rows:
+            if row.filename is not None:
+                key = (row.filename, row.size)
+                if key in seen:
+                    continue
+                seen.add(key)
+            rows.append(row)
+        return ProbeTable(rows)
+
+    def to_dicts(self) -> List[dict]:
+        return [asdict(row) for row in self.rows]
+
+    def format(self) -> str:
+        """Human readable table"""
+        lines = [f"{'available':<10}{'size':>14}  {'host':<14}{'filename'}"]
+        for row in self.rows:
+            state = {True: "yes", False: "no", None: "?"}[row.available]
+            size = "" if row.size is None else str(row.size)
+            name = row.filename or row.url
+            error = f"  ({row.error})" if row.error else ""
+            lines.append(f"{state:<10}{size:>14}  {row.host:<14}{name}{error}")
+        return "\n".join(lines)
@@ -0,0 +1,213 @@
+"""Opt-in per-stage timings of downloads
+
+Nothing is measured unless DarkLoader is created with ``profile``. Each URL
+then gets a ``DownloadProfile`` holding the wall and CPU seconds of its
+stages:
+
+- ``resolve``     page link to direct link
+- ``probe``       HEAD request for the size
+- ``first_byte``  request sent to first chunk of the body
+- ``stream``      waits for the following chunks
+- ``write``       writes to the ``.part`` file
+- ``finalize``    truncating and renaming the finished file
+
+summed per host in the log and a JSON report. ``profile="cprofile"`` or
+``"sampling"`` (pyinstrument) also runs the whole batch under that profiler.
+
+The profile of the running download is found through a context variable.
+With profiling off, ``stage()`` costs one lookup of it per block, and the
+chunk and write loops check it once per transfer rather than per chunk.
+"""
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+STAGES = ("resolve", "probe", "first_byte", "stream", "write", "finalize")
+
+# Profile of the download running in the current task, None when disabled
+_current_profile: contextvars.ContextVar = contextvars.ContextVar("darkloader_profile", default=None)
+
+
+@dataclass
+class StageTiming:
+    """Accumulated wall and CPU seconds of one stage"""
+    wall: float = 0.0
+    cpu: float = 0.0
+    calls: int = 0
+
+
+@dataclass
+class DownloadProfile:
+    """Stage timings of a single URL"""
+    url: str
+    host: str
+    status: str = "running"
+    stages: Dict[str, StageTiming] = field(default_factory=dict)
+
+    def add(self, stage: str, wall: float, cpu: float = 0.0) -> None:
+        timing = self.stages.setdefault(stage, StageTiming())
+        timing.wall += wall
+        timing.cpu += cpu
+        timing.calls += 1
+
+
+def current_profile() -> Optional[DownloadProfile]:
+    """Profile of the current download, None when profiling is off
+
+    Hot loops should fetch it once and skip timing entirely when it is None.
+    """
+    return _current_profile.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as the given stage of the current download
+
+    CPU time is the thread time of the block; for awaited blocks it includes
+    other tasks that ran on the loop meanwhile.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+
+class Profiler:
+    """Opt-in per-stage profiler for DarkLoader batches
+
+    Args:
+        sampler: None for stage timings only, "cprofile" to also run the batch
+            under cProfile, or "sampling" to use pyinstrument (must be installed)
+        report_dir: Directory where reports are written
+    """
+    SAMPLERS = (None, "cprofile", "sampling")
+
+    def __init__(self, sampler: Optional[str] = None, report_dir: Path = Path(".")) -> None:
+        if sampler not in self.SAMPLERS:
+            raise ValueError(f"Unknown sampler: {sampler}")
+        self.sampler = sampler
+        self.report_dir = Path(report_dir)
+        self.records: List[DownloadProfile] = []
+        self._sampler = None
+
+    @contextmanager
+    def track(self, url: str, host: str):
+        """Collect stage timings of everything run inside the block for `url`"""
+        profile = DownloadProfile(url, host)
+        self.records.append(profile)
+        token = _current_profile.set(profile)
+        try:
+            yield profile
+            profile.status = "ok"
+        except BaseException:
+            profile.status = "error"
+            raise
+        finally:
+            _current_profile.reset(token)
+
+    def start(self) -> None:
+        """Start the optional whole-run profiler"""
+        if self.sampler == "cprofile":
+            import cProfile
+            self._sampler = cProfile.Profile()
+            self._sampler.enable()
+        elif self.sampler == "sampling":
+            try:
+                from pyinstrument import Profiler as SamplingProfiler
+            except ImportError as e:
+                raise ImportError("Sampling profiler requires pyinstrument: pip install pyinstrument") from e
+            self._sampler = SamplingProfiler(async_mode="disabled")
+            self._sampler.start()
+
+    def stop(self) -> Optional[Path]:
+        """Stop the whole-run profiler and save its output
+
+        Returns:
+            Path of the saved profile, None if no sampler was running
+        """
+        if self._sampler is None:
+            return None
+        sampler, self._sampler = self._sampler, None
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self.sampler == "cprofile":
+            sampler.disable()
+            path = self.report_dir / f"darkloader-{stamp}.prof"
+            sampler.dump_stats(path)
+        else:
+            sampler.stop()
+            path = self.report_dir / f"darkloader-{stamp}.txt"
+            path.write_text(sampler.output_text())
+        return path
+
+    def summary(self) -> Dict[str, Dict[str, StageTiming]]:
+        """Stage timings summed per host"""
+        hosts: Dict[str, Dict[str, StageTiming]] = {}
+        for record in self.records:
+            host = hosts.setdefault(record.host, {})
+            for name, timing in record.stages.items():
+                total = host.setdefault(name, StageTiming())
+                total.wall += timing.wall
+                total.cpu += timing.cpu
+                total.calls += timing.calls
+        return hosts
+
+    def format_summary(self) -> str:
+        """Human readable per-host table of the summary"""
+        lines = [f"{'host':<24}{'stage':<12}{'wall s':>10}{'cpu s':>10}{'calls':>8}"]
+        for host, stages in sorted(self.summary().items()):
+            for name in STAGES:
+                if name in stages:
+                    timing = stages[name]
+                    lines.append(f"{host:<24}{name:<12}{timing.wall:>10.3f}{timing.cpu:>10.3f}{timing.calls:>8}")
+        return "\n".join(lines)
+
+    def write_report(self) -> Path:
+        """Write the per-URL and per-host timings as JSON
+
+        Returns:
+            Path of the report
+        """
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        path = self.report_dir / f"darkloader-profile-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        report = {
+            "hosts": {host: {name: asdict(timing) for name, timing in stages.items()}
+                      for host, stages in self.summary().items()},
+            "downloads": [asdict(record) for record in self.records],
+        }
+        path.write_text(json.dumps(report, indent=2))
+        return path
+
+
+async def profile_chunks(chunks, profile: DownloadProfile, request_started: float):
+    """Wrap a chunk iterator, timing the network waits
+
+    The wait for the first chunk (counted from `request_started`) is recorded
+    as "first_byte", the following ones as "stream". Both are waits, so only
+    wall time is recorded.
+    """
+    stage_name, started = "first_byte", request_started
+    async for chunk in chunks:
+        profile.add(stage_name, time.perf_counter() - started)
+        yield chunk
+        stage_name, started = "stream", time.perf_counter()
+
+
+def profile_writes(write, profile: DownloadProfile):
+    """Wrap a file write function, timing each call as the "write" stage"""
+    def timed_write(data):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return write(data)
+        finally:
+            profile.add("write", time.perf_counter() - wall, time.thread_time() - cpu)
+    return timed_write
@@ -0,0 +1,112 @@
+"""Event loop selection and tuning for the runners
+
+At hundreds of concurrent sockets the event loop itself shows up in the
+profiles. ``run`` starts a coroutine on the loop picked by ``LoopOptions``:
+
+- ``auto``     uvloop when it is installed, the asyncio loop otherwise
+- ``asyncio``  the standard library loop
+- ``uvloop``   libuv-based loop (``pip install uvloop``), fails without it
+
+and tunes it: the size of the default executor, which runs the blocking
+resolvers and file operations sent through ``asyncio.to_thread``, and
+asyncio debug mode, which logs every callback holding the loop longer than
+``slow_callback`` seconds on the ``asyncio`` logger. Debug mode slows the
+loop down; turn it on to find what blocks it, not in production.
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Optional
+
+LOOPS = ("auto", "asyncio", "uvloop")
+
+
+@dataclass
+class LoopOptions:
+    """Event loop of a runner
+
+    Args:
+        loop: "auto", "asyncio" or "uvloop"
+        executor_workers: Threads of the default executor, None for the
+            asyncio default (CPU count + 4, at most 32)
+        slow_callback: Seconds a callback may hold the loop before debug
+            mode logs it, None to leave debug mode off
+    """
+    loop: str = "auto"
+    executor_workers: Optional[int] = None
+    slow_callback: Optional[float] = None
+
+
+def _uvloop():
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop
+
+
+def loop_factory(name: str = "auto") -> Callable[[], asyncio.AbstractEventLoop]:
+    """Function creating a new loop of the kind `name`
+
+    Raises:
+        ValueError: If the name is unknown
+        ImportError: If "uvloop" is asked for and not installed
+    """
+    if name not in LOOPS:
+        raise ValueError(f"Unknown event loop: {name} (available: {', '.join(LOOPS)})")
+    if name == "asyncio":
+        return asyncio.new_event_loop
+    uvloop = _uvloop()
+    if uvloop is None:
+        if name == "uvloop":
+            raise ImportError("The uvloop event loop requires uvloop: pip install uvloop")
+        return asyncio.new_event_loop
+    return uvloop.new_event_loop
+
+
+def loop_name(loop: asyncio.AbstractEventLoop) -> str:
+    """"uvloop" or "asyncio", for logs and benchmark results"""
+    return "uvloop" if type(loop).__module__.startswith("uvloop") else "asyncio"
+
+
+def configure_loop(loop: asyncio.AbstractEventLoop, options: LoopOptions) -> None:
+    """Apply the executor size and slow-callback reporting of `options`"""
+    if options.executor_workers:
+        loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=options.executor_workers, thread_name_prefix="darkloader")
+        )
+    if options.slow_callback is not None:
+        loop.set_debug(True)
+        loop.slow_callback_duration = options.slow_callback
+
+
+def run(main: Coroutine[Any, Any, Any], options: Optional[LoopOptions] = None) -> Any:
+    """Run `main` to completion on a new loop chosen and tuned by `options`
+
+    Like ``asyncio.run``: remaining tasks are cancelled and the executor is
+    shut down before the loop is closed.
+
+    Raises:
+        ValueError: If the loop name is unknown
+        ImportError: If uvloop is asked for and not installed
+    """
+    options = options or LoopOptions()
+    try:
+        factory = loop_factory(options.loop)
+    except (ValueError, ImportError):
+        # Never awaited otherwise
+        main.close()
+        raise
+
+    async def configured():
+        configure_loop(asyncio.get_running_loop(), options)
+        return await main
+
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=factory) as runner:
+            return runner.run(configured())
+    # No loop factory before asyncio.Runner: go through the policy instead
+    if factory is not asyncio.new_event_loop:
+        asyncio.set_event_loop_policy(_uvloop().EventLoopPolicy())
+    return asyncio.run(configured())
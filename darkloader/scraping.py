@@ -0,0 +1,142 @@
+"""Lightweight extraction of forms, links and text from host pages
+
+Form-based hosts only need a handful of hidden inputs and one link from
+pages that are mostly scripts and markup. These helpers scan the raw HTML
+with precompiled patterns and stop as soon as the requested fields are
+found, instead of building a full BeautifulSoup tree.
+"""
+import re
+from functools import lru_cache
+from html import unescape
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+_FORM_RE = re.compile(r"<form\b([^>]*)>", re.I)
+_FORM_END_RE = re.compile(r"</form\s*>", re.I)
+_INPUT_RE = re.compile(r"<input\b([^>]*)>", re.I)
+_ATTR_RE = re.compile(r"""([\w:-]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?""")
+_LINK_RE = re.compile(r"<a\b([^>]*)>", re.I)
+_TAG_TEXT_RE = re.compile(r"<[^>]+>")
+
+
+class Form(NamedTuple):
+    """Action and input values of an HTML form"""
+    action: str
+    inputs: Dict[str, str]
+
+
+def parse_attrs(tag_body: str) -> Dict[str, str]:
+    """Parse the attributes of a start tag (the part after the tag name)"""
+    attrs = {}
+    for match in _ATTR_RE.finditer(tag_body):
+        name, double, single, bare = match.groups()
+        value = double if double is not None else single if single is not None else bare
+        attrs[name.lower()] = unescape(value) if value else ""
+    return attrs
+
+
+def _find_form(html: str, name: Optional[str]) -> Optional[Tuple[Dict[str, str], int]]:
+    for match in _FORM_RE.finditer(html):
+        attrs = parse_attrs(match.group(1))
+        if name is None or attrs.get("name") == name:
+            return attrs, match.end()
+    return None
+
+
+def iter_inputs(html: str, start: int = 0, end: Optional[int] = None) -> Iterator[Dict[str, str]]:
+    """Yield the attributes of each <input> between `start` and `end`"""
+    end = len(html) if end is None else end
+    for match in _INPUT_RE.finditer(html, start, end):
+        yield parse_attrs(match.group(1))
+
+
+def extract_form(
+    html: str,
+    name: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None,
+    input_type: Optional[str] = None,
+) -> Optional[Form]:
+    """Extract a form's action and input values
+
+    Args:
+        html: Page source
+        name: Value of the form's name attribute, None for the first form
+        fields: Input names to collect; scanning stops once all are found.
+            None collects every named input of the form.
+        input_type: Only collect inputs of this type (e.g. "hidden")
+
+    Returns:
+        Form, or None if no matching form exists
+    """
+    found = _find_form(html, name)
+    if found is None:
+        return None
+    attrs, start = found
+    form_end = _FORM_END_RE.search(html, start)
+    end = form_end.start() if form_end else len(html)
+
+    wanted = set(fields) if fields is not None else None
+    inputs = {}
+    for input_attrs in iter_inputs(html, start, end):
+        input_name = input_attrs.get("name")
+        if not input_name or (wanted is not None and input_name not in wanted):
+            continue
+        if input_type and input_attrs.get("type", "").lower() != input_type:
+            continue
+        inputs[input_name] = input_attrs.get("value", "")
+        if wanted is not None and len(inputs) == len(wanted):
+            break
+    return Form(attrs.get("action", ""), inputs)
+
+
+@lru_cache(maxsize=64)
+def _element_re(tag: Optional[str], attr: str, value: str) -> "re.Pattern":
+    """Pattern for <tag ... attr="...value..."> up to its closing tag"""
+    tag_pattern = re.escape(tag) if tag else r"\w+"
+    return re.compile(
+        rf"<(?P<tag>{tag_pattern})\b[^>]*?\b{attr}\s*=\s*[\"']?[^\"'>]*?(?<![\w-]){re.escape(value)}(?![\w-])[^>]*>"
+        rf"(?P<inner>.*?)</(?P=tag)\s*>",
+        re.I | re.S,
+    )
+
+
+def find_element(html: str, tag: Optional[str], attr: str, value: str, pos: int = 0) -> Optional[str]:
+    """Inner HTML of the first element whose `attr` contains `value`
+
+    Args:
+        html: Page source
+        tag: Tag name, None for any tag
+        attr: Attribute to look at (e.g. "class", "id", "style")
+        value: Class name, id or style fragment the attribute must contain
+        pos: Offset in `html` where the search starts
+
+    Returns:
+        Inner HTML, or None if no element matches
+    """
+    match = _element_re(tag, attr, value).search(html, pos)
+    return match.group("inner") if match else None
+
+
+def text_of(fragment: Optional[str]) -> Optional[str]:
+    """Text content of an HTML fragment"""
+    if fragment is None:
+        return None
+    return unescape(_TAG_TEXT_RE.sub("", fragment)).strip()
+
+
+def find_text(html: str, tag: Optional[str], attr: str, value: str, pos: int = 0) -> Optional[str]:
+    """Text of the first element whose `attr` contains `value`"""
+    return text_of(find_element(html, tag, attr, value, pos))
+
+
+def find_link(html: str, attr: Optional[str] = None, value: Optional[str] = None) -> Optional[str]:
+    """href of the first <a> whose `attr` contains the word `value`
+
+    Without `attr`, the first link with an href is returned.
+    """
+    for match in _LINK_RE.finditer(html):
+        attrs = parse_attrs(match.group(1))
+        if "href" not in attrs:
+            continue
+        if attr is None or value in attrs.get(attr, "").split():
+            return attrs["href"]
+    return None
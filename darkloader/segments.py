@@ -0,0 +1,313 @@
+"""Multi-connection downloads that rebalance ranges between connections
+
+A file split into fixed ranges finishes when its slowest connection does. In
+``SegmentedDownload`` the ranges are not fixed. The transfer starts as one
+segment covering the whole file, and every other connection begins by
+stealing the back half of the largest remaining segment. A connection that
+finishes its range steals again, so fast connections keep taking work from
+slow ones.
+
+Once no segment is large enough to split, an idle connection can race a slow
+tail instead. It downloads the same bytes from a fresh connection, and
+whichever of the two reaches the end first wins while the other is
+cancelled. Both write identical bytes to the same offsets, so the race needs
+no coordination on the file.
+
+Every connection has its own source, so the connections may point to
+different mirrors of the file. Ranges drift toward the fastest mirror
+through stealing. A connection whose source keeps failing drops out and
+leaves its range to the others; the download only fails with the last one.
+"""
+import asyncio
+import time
+from typing import AsyncContextManager, Awaitable, Callable, List, Optional, Sequence
+
+from darkloader.transport import (
+    HTTPStatusError,
+    RateLimiter,
+    StreamResponse,
+    TransferTimeouts,
+    detect_stalls,
+    throttle,
+)
+
+# Opens a stream of the bytes [start, end) of the file
+OpenRange = Callable[[int, int], AsyncContextManager[StreamResponse]]
+
+# Bytes read from the socket at a time
+CHUNK_SIZE = 1024 * 1024
+
+
+class SegmentError(Exception):
+    """A range of the file kept failing"""
+
+
+class RangeNotSatisfied(SegmentError):
+    """The server answered a range request with the whole file"""
+
+
+class Segment:
+    """Range [start, end) of the file fetched by one connection"""
+
+    # Weight of the latest chunk in the speed average
+    SPEED_SMOOTHING = 0.2
+
+    def __init__(self, start: int, end: int) -> None:
+        self.start = start
+        self.position = start
+        self.end = end
+        self.speed: Optional[float] = None
+        # Segment fetching the same tail, set while two connections race
+        self.rival: Optional["Segment"] = None
+        self.task: Optional[asyncio.Task] = None
+        self._last = time.monotonic()
+        self._last_chunk = 0
+
+    def __repr__(self) -> str:
+        return f"Segment({self.position}-{self.end})"
+
+    @property
+    def remaining(self) -> int:
+        return max(self.end - self.position, 0)
+
+    @property
+    def finished(self) -> bool:
+        return self.remaining == 0 or (self.rival is not None and self.rival.remaining == 0)
+
+    def eta(self) -> float:
+        """Seconds until this segment is done at its current speed
+
+        A connection that went quiet is only as fast as its next chunk
+        arriving right now would make it.
+        """
+        idle = time.monotonic() - self._last
+        speed = min(self.speed or 0, self._last_chunk / idle if idle > 0 else float("inf"))
+        if not speed:
+            return float("inf")
+        return self.remaining / speed
+
+    def record(self, nbytes: int) -> None:
+        now = time.monotonic()
+        elapsed, self._last = now - self._last, now
+        self._last_chunk = nbytes
+        if elapsed > 0:
+            speed = nbytes / elapsed
+            self.speed = speed if self.speed is None else (
+                self.SPEED_SMOOTHING * speed + (1 - self.SPEED_SMOOTHING) * self.speed
+            )
+
+
+class SegmentedDownload:
+    """Fetches [offset, size) of a file over several connections
+
+    Args:
+        open_ranges: Source of each connection, opening a ranged stream of
+            the file; repeat one source for several connections to it
+        path: File written to, already created (ideally preallocated)
+        offset: First byte to fetch
+        size: Size of the file
+        timeouts: Timeouts and stall detection of every connection
+        min_split: Smallest range a steal leaves on either side
+        progress_cb: Awaited with the bytes done so far after every chunk
+        logger: Logger of the downloader
+        retries: Attempts of each range before the download fails
+        retry_delay: Seconds between attempts
+        limiter: Bandwidth limit shared with other transfers, None for none
+    """
+
+    # A tail is raced when it would take this many times longer than on
+    # the fastest idle connection
+    RACE_FACTOR = 2.0
+    # Seconds an idle connection waits before looking for work again
+    RECHECK_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        open_ranges: Sequence[OpenRange],
+        path,
+        offset: int,
+        size: int,
+        timeouts: TransferTimeouts,
+        min_split: int,
+        progress_cb: Optional[Callable[[int], Awaitable]] = None,
+        logger=None,
+        retries: int = 3,
+        retry_delay: float = 3,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        self.open_ranges = list(open_ranges)
+        self.path = path
+        self.size = size
+        self.timeouts = timeouts
+        self.min_split = min_split
+        self.progress_cb = progress_cb
+        self.logger = logger
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.limiter = limiter
+        self.segments: List[Segment] = [Segment(offset, size)]
+        self.done = offset
+        self.steals = 0
+        self.races = 0
+        # Bytes written by the connections of each source
+        self.source_bytes = [0] * len(self.open_ranges)
+        self._alive = 0
+
+    @property
+    def contiguous(self) -> int:
+        """Bytes from the start of the file that are all written"""
+        pending = [max(s.position, s.rival.position) if s.rival else s.position for s in self.segments if not s.finished]
+        return min(pending, default=self.size)
+
+    async def run(self, first: Optional[StreamResponse] = None) -> None:
+        """Download the file
+
+        Args:
+            first: Open stream of the file from `offset` on, read by the
+                first connection; None to open it with the first source
+
+        Raises:
+            SegmentError: If a range can't be fetched from any source
+            HTTPStatusError: If the last source left answered an error
+        """
+        workers = [asyncio.ensure_future(self._worker(0, self.segments[0], first))]
+        for index in range(1, len(self.open_ranges)):
+            workers.append(asyncio.ensure_future(self._worker(index)))
+        self._alive = len(workers)
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        if self.contiguous < self.size:
+            raise SegmentError(f"Connections gave up at byte {self.contiguous}")
+        if self.logger and (self.steals or self.races):
+            self.logger.debug("Segments rebalanced: %d steals, %d races", self.steals, self.races)
+
+    async def _worker(
+        self,
+        index: int,
+        segment: Optional[Segment] = None,
+        response: Optional[StreamResponse] = None
+    ) -> None:
+        while True:
+            if segment is None:
+                segment = self._next_segment()
+                if segment is None:
+                    if all(s.finished or s.rival for s in self.segments):
+                        self._alive -= 1
+                        return
+                    # Speeds may still show a tail worth racing
+                    await asyncio.sleep(self.RECHECK_INTERVAL)
+                    continue
+            segment.task = asyncio.ensure_future(self._fetch(index, segment, response))
+            try:
+                await segment.task
+            except asyncio.CancelledError:
+                # Lost a race: the rival already wrote these bytes
+                if not (segment.rival and segment.rival.remaining == 0):
+                    raise
+            except (SegmentError, HTTPStatusError) as e:
+                self._alive -= 1
+                if not self._alive:
+                    raise
+                self._orphan(segment)
+                if self.logger:
+                    self.logger.warning("Connection %d gave up, leaving %r to the others: %s", index, segment, e)
+                return
+            segment, response = None, None
+
+    def _orphan(self, segment: Segment) -> None:
+        """Leave the range of a failed connection to be picked up again"""
+        rival = segment.rival
+        if rival is None or (rival.task is not None and not rival.task.done()):
+            # A racing rival still covers it
+            return
+        # Both racers are gone: one segment takes over what both covered
+        segment.position = max(segment.position, rival.position)
+        segment.rival = None
+        self.segments.remove(rival)
+
+    def _next_segment(self) -> Optional[Segment]:
+        """Work for an idle connection: an abandoned range, half of the
+        largest one, or a slow tail"""
+        # Raced tails are already covered twice
+        solo = [s for s in self.segments if not s.finished and s.rival is None]
+        if not solo:
+            return None
+        for segment in solo:
+            if segment.task is not None and segment.task.done():
+                return segment
+        largest = max(solo, key=lambda s: s.remaining)
+        if largest.remaining >= 2 * self.min_split:
+            split = largest.position + largest.remaining // 2
+            stolen = Segment(split, largest.end)
+            largest.end = split
+            self.segments.append(stolen)
+            self.steals += 1
+            return stolen
+
+        # Nothing left to split: race the tail that would finish last
+        slowest = max(solo, key=Segment.eta)
+        fastest = max((s.speed or 0 for s in self.segments), default=0)
+        if not fastest or slowest.eta() <= self.RACE_FACTOR * slowest.remaining / fastest:
+            return None
+        racer = Segment(slowest.position, slowest.end)
+        racer.rival, slowest.rival = slowest, racer
+        self.segments.append(racer)
+        self.races += 1
+        return racer
+
+    async def _fetch(self, index: int, segment: Segment, response: Optional[StreamResponse]) -> None:
+        attempt = 0
+        while not segment.finished:
+            try:
+                if response is not None:
+                    await self._write(index, segment, response)
+                else:
+                    async with self.open_ranges[index](segment.position, segment.end) as ranged:
+                        ranged.raise_for_status()
+                        if ranged.status != 206:
+                            raise RangeNotSatisfied(f"Server answered a range request with HTTP {ranged.status}")
+                        await self._write(index, segment, ranged)
+                if segment.position < segment.end and not segment.finished:
+                    raise SegmentError(f"Connection closed at byte {segment.position} of {segment!r}")
+            except (SegmentError, HTTPStatusError):
+                # Statuses are the downloader's call (e.g. an expired link)
+                raise
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.retries:
+                    raise SegmentError(f"{segment!r} failed {attempt} times: {e or type(e).__name__}") from e
+                if self.logger:
+                    self.logger.warning("%r failed, reconnecting: %s", segment, str(e) or type(e).__name__)
+                await asyncio.sleep(self.retry_delay)
+            finally:
+                response = None
+        if segment.rival is not None and segment.remaining == 0 and segment.rival.task:
+            segment.rival.task.cancel()
+
+    async def _write(self, index: int, segment: Segment, response: StreamResponse) -> None:
+        chunks = response.iter_chunked(CHUNK_SIZE)
+        if self.timeouts.min_speed:
+            chunks = detect_stalls(chunks, self.timeouts)
+        if self.limiter:
+            chunks = throttle(chunks, self.limiter)
+        with open(self.path, "r+b") as file:
+            file.seek(segment.position)
+            async for chunk in chunks:
+                # The back of the range may have been stolen meanwhile
+                chunk = chunk[:segment.remaining]
+                file.write(chunk)
+                position = segment.position
+                segment.position += len(chunk)
+                segment.record(len(chunk))
+                self.source_bytes[index] += len(chunk)
+                rival = segment.rival
+                # Bytes a racing rival already wrote don't count twice
+                self.done += max(segment.position - max(position, rival.position), 0) if rival else len(chunk)
+                if self.progress_cb:
+                    await self.progress_cb(self.done)
+                if segment.finished:
+                    return
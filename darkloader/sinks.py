@@ -0,0 +1,369 @@
+"""Destinations for downloaded bytes other than a finished local file
+
+``DarkLoader.download_url(url, sink=...)`` streams the body into a ``Sink``
+instead of saving it under the download directory, so files that are
+repacked or uploaded right away skip the extra write and read on disk:
+
+    FileSink      a local file (what download_url does without a sink)
+    IteratorSink  an async iterator of chunks read by the caller
+    PipeSink      the stdin of a subprocess
+    S3Sink        a multipart upload to S3-compatible object storage
+
+Sinks take the bytes in order and apply backpressure: the transfer waits
+while the consumer, the process or the upload is behind, with at most a
+few chunks or parts buffered in memory. An interrupted transfer resumes
+with a Range request from ``Sink.written``, since nothing already handed
+over can be taken back.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+from darkloader.disk import part_path, preallocate
+from darkloader.transport import AiohttpTransport, Transport
+
+
+class SinkError(Exception):
+    """The sink can't take (more of) the download"""
+
+
+class Sink:
+    """Where the bytes of a download go, in order"""
+
+    def __init__(self) -> None:
+        # Bytes handed over so far; a resumed transfer continues from here
+        self.written = 0
+        self.opened = False
+
+    @property
+    def location(self) -> str:
+        """Where the data ended up, returned by ``download_url``"""
+        raise NotImplementedError
+
+    async def open(self, filename: str, size: Optional[int]) -> None:
+        """Called once before the first byte; `size` is None when unknown"""
+        self.opened = True
+
+    async def write(self, data: bytes) -> None:
+        """Take the next chunk, waiting while the sink is behind"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """All bytes were written"""
+
+    async def abort(self, error: BaseException) -> None:
+        """The download failed; drop whatever was written"""
+
+
+class FileSink(Sink):
+    """Local file, written to its ``.part`` path and renamed once complete"""
+
+    def __init__(self, path: Path) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self._file = None
+
+    @property
+    def location(self) -> str:
+        return str(self.path)
+
+    async def open(self, filename: str, size: Optional[int]) -> None:
+        await super().open(filename, size)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = part_path(self.path).open("wb")
+        if size:
+            preallocate(self._file, size)
+
+    async def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.written += len(data)
+
+    async def close(self) -> None:
+        # Drop the preallocated tail, if any
+        self._file.truncate(self.written)
+        self._file.close()
+        os.replace(part_path(self.path), self.path)
+
+    async def abort(self, error: BaseException) -> None:
+        if self._file is not None:
+            self._file.close()
+            part_path(self.path).unlink(missing_ok=True)
+
+
+_END = object()
+
+
+class IteratorSink(Sink):
+    """Chunks handed to whoever iterates the sink
+
+    Usage:
+        sink = IteratorSink()
+        download = asyncio.create_task(loader.download_url(url, sink=sink))
+        async for chunk in sink:
+            ...
+        await download
+
+    Args:
+        max_chunks: Chunks buffered before the transfer waits for the reader
+    """
+
+    def __init__(self, max_chunks: int = 8) -> None:
+        super().__init__()
+        self.filename: Optional[str] = None
+        self.size: Optional[int] = None
+        self._chunks: asyncio.Queue = asyncio.Queue(max_chunks)
+
+    @property
+    def location(self) -> str:
+        return f"<iterator of {self.filename}>"
+
+    async def open(self, filename: str, size: Optional[int]) -> None:
+        await super().open(filename, size)
+        self.filename, self.size = filename, size
+
+    async def write(self, data: bytes) -> None:
+        await self._chunks.put(data)
+        self.written += len(data)
+
+    async def close(self) -> None:
+        await self._chunks.put(_END)
+
+    async def abort(self, error: BaseException) -> None:
+        # Not put(): a reader that went away must not block the download
+        while self._chunks.full():
+            self._chunks.get_nowait()
+        self._chunks.put_nowait(error)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while (chunk := await self._chunks.get()) is not _END:
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+
+
+class PipeSink(Sink):
+    """Stdin of a subprocess, e.g. an archiver or an uploader
+
+    Args:
+        args: Program and arguments
+        **kwargs: Passed to ``asyncio.create_subprocess_exec`` (cwd, stdout...)
+
+    Raises (on write or close):
+        SinkError: If the process exits early or with a non-zero status
+    """
+
+    def __init__(self, args: Sequence[str], **kwargs) -> None:
+        super().__init__()
+        self.args = list(args)
+        self.kwargs = kwargs
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    @property
+    def location(self) -> str:
+        return " ".join(self.args)
+
+    async def open(self, filename: str, size: Optional[int]) -> None:
+        await super().open(filename, size)
+        self.process = await asyncio.create_subprocess_exec(*self.args, stdin=asyncio.subprocess.PIPE, **self.kwargs)
+
+    async def write(self, data: bytes) -> None:
+        try:
+            self.process.stdin.write(data)
+            # Waits while the pipe buffer is full
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            returncode = await self.process.wait()
+            raise SinkError(f"{self.args[0]} exited with status {returncode} while receiving data") from e
+        self.written += len(data)
+
+    async def close(self) -> None:
+        self.process.stdin.close()
+        try:
+            await self.process.stdin.wait_closed()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        returncode = await self.process.wait()
+        if returncode != 0:
+            raise SinkError(f"{self.args[0]} exited with status {returncode}")
+
+    async def abort(self, error: BaseException) -> None:
+        if self.process is not None and self.process.returncode is None:
+            self.process.kill()
+            await self.process.wait()
+
+
+def sign_v4(
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    payload_hash: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    service: str = "s3",
+    now: Optional[datetime] = None,
+) -> Dict[str, str]:
+    """Sign a request with AWS Signature Version 4
+
+    Returns:
+        `headers` plus host, x-amz-date, x-amz-content-sha256 and
+        Authorization
+    """
+    amz_date = (now or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    parts = urlsplit(url)
+    headers = {**headers, "host": parts.netloc, "x-amz-date": amz_date, "x-amz-content-sha256": payload_hash}
+    canonical_headers = sorted((name.lower(), " ".join(str(value).split())) for name, value in headers.items())
+    signed_headers = ";".join(name for name, _ in canonical_headers)
+    query = "&".join(
+        f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+        for name, value in sorted(parse_qsl(parts.query, keep_blank_values=True))
+    )
+    canonical_request = "\n".join([
+        method,
+        quote(unquote(parts.path) or "/", safe="/-_.~"),
+        query,
+        "".join(f"{name}:{value}\n" for name, value in canonical_headers),
+        signed_headers,
+        payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+    ])
+    key = f"AWS4{secret_key}".encode()
+    for part in scope.split("/"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    headers["Authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope},SignedHeaders={signed_headers},Signature={signature}"
+    )
+    return headers
+
+
+class S3Sink(Sink):
+    """Multipart upload to S3-compatible storage (AWS, MinIO, R2...)
+
+    Parts are uploaded while the download goes on, at most `max_pending` at
+    a time; memory use is about ``part_size * (max_pending + 1)``.
+
+    Args:
+        endpoint: Service URL, e.g. ``https://s3.us-east-1.amazonaws.com``;
+            objects are addressed path-style as ``{endpoint}/{bucket}/{key}``
+        bucket: Bucket name
+        key: Object key
+        access_key: Access key ID
+        secret_key: Secret access key
+        region: Signing region
+        part_size: Bytes per part; S3 requires at least 5 MiB for all
+            parts but the last
+        max_pending: Parts uploading at once
+        transport: Transport for the upload requests, one of its own if None
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        key: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        part_size: int = 8 * 1024 * 1024,
+        max_pending: int = 2,
+        transport: Optional[Transport] = None,
+    ) -> None:
+        super().__init__()
+        self.url = f"{endpoint.rstrip('/')}/{bucket}/{quote(key, safe='/')}"
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.part_size = part_size
+        self.max_pending = max_pending
+        self.transport = transport or AiohttpTransport()
+        self._owns_transport = transport is None
+        self.upload_id: Optional[str] = None
+        self._buffer = bytearray()
+        self._pending: List[asyncio.Task] = []
+        self._etags: Dict[int, str] = {}
+        self._next_part = 1
+
+    @property
+    def location(self) -> str:
+        return self.url
+
+    async def _request(self, method: str, query: str, body: bytes = b""):
+        url = f"{self.url}?{query}"
+        headers = sign_v4(
+            method, url, {}, hashlib.sha256(body).hexdigest(), self.access_key, self.secret_key, self.region
+        )
+        response = await self.transport.request(method, url, headers=headers, data=body or None)
+        # Errors of CompleteMultipartUpload can come with a 200
+        if response.status >= 300 or "<Error>" in response.text:
+            raise SinkError(f"S3 {method} {url} failed with HTTP {response.status}: {response.text[:200]}")
+        return response
+
+    async def open(self, filename: str, size: Optional[int]) -> None:
+        await super().open(filename, size)
+        response = await self._request("POST", "uploads=")
+        match = re.search(r"<UploadId>(.+?)</UploadId>", response.text)
+        if not match:
+            raise SinkError(f"No UploadId in the answer of {self.url}")
+        self.upload_id = match.group(1)
+
+    async def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.written += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            await self._submit(part)
+
+    async def _submit(self, part: bytes) -> None:
+        if len(self._pending) >= self.max_pending:
+            done, _ = await asyncio.wait(self._pending, return_when=asyncio.FIRST_COMPLETED)
+            self._pending = [task for task in self._pending if task not in done]
+            for task in done:
+                task.result()
+        self._pending.append(asyncio.ensure_future(self._upload_part(self._next_part, part)))
+        self._next_part += 1
+
+    async def _upload_part(self, number: int, part: bytes) -> None:
+        response = await self._request("PUT", f"partNumber={number}&uploadId={quote(self.upload_id, safe='')}", part)
+        self._etags[number] = response.headers["ETag"]
+
+    async def close(self) -> None:
+        if self._buffer or self._next_part == 1:
+            await self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        await asyncio.gather(*self._pending)
+        self._pending = []
+        parts = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in sorted(self._etags.items())
+        )
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode()
+        await self._request("POST", f"uploadId={quote(self.upload_id, safe='')}", body)
+        await self._close_transport()
+
+    async def abort(self, error: BaseException) -> None:
+        for task in self._pending:
+            task.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        try:
+            if self.upload_id:
+                await self._request("DELETE", f"uploadId={quote(self.upload_id, safe='')}")
+        except Exception:
+            # The download error matters more than a failed cleanup
+            pass
+        finally:
+            await self._close_transport()
+
+    async def _close_transport(self) -> None:
+        if self._owns_transport:
+            await self.transport.close()
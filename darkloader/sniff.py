@@ -0,0 +1,131 @@
+"""Checks on the first bytes of a download before it is written
+
+Hosts serve error pages with a 200 in place of the file: HTML captcha or
+quota pages, JSON API errors, CDN "link expired" notices. Headers alone
+don't catch them (``text/html; charset=utf-8``, missing or generic content
+types), so the first ``SNIFF_SIZE`` bytes of every response are inspected:
+
+- HTML and JSON bodies are rejected
+- files with a known extension must start with its magic bytes
+- host plugins add regexes of their own error pages (``Host.error_patterns``)
+
+A rejected response is treated like an expired link: it is resolved again
+before any bandwidth is spent on it.
+"""
+import json
+import re
+from typing import AsyncIterator, List, Mapping, Optional, Sequence, Tuple
+
+from darkloader.transport import StreamResponse
+
+# Bytes read ahead from every response
+SNIFF_SIZE = 4096
+
+# Signatures of the file types we usually download, per extension
+MAGIC = {
+    "7z": (b"7z\xbc\xaf\x27\x1c",),
+    "rar": (b"Rar!\x1a\x07\x00", b"Rar!\x1a\x07\x01\x00"),
+    "zip": (b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08"),
+}
+# ISO base media files carry "ftyp" after the size of the first box
+_FTYP_TYPES = ("mp4", "m4v", "m4a", "mov")
+# First volume of split archives: name.7z.001, name.zip.001
+_FIRST_VOLUME_RE = re.compile(r"\.(7z|zip|rar)\.0*1$")
+_HTML_RE = re.compile(rb"^\s*<(!doctype\s+html|html|head|body|script|title)\b", re.I)
+_TEXT_TYPES = ("text/html", "application/json", "application/xhtml+xml")
+# Files that legitimately are web pages or JSON documents
+_TEXT_EXTENSIONS = ("htm", "html", "json", "xhtml")
+
+
+def expected_type(filename: str) -> Optional[str]:
+    """File type whose magic bytes `filename` must start with, if known"""
+    name = filename.lower()
+    if match := _FIRST_VOLUME_RE.search(name):
+        return match.group(1)
+    extension = name.rsplit(".", 1)[-1] if "." in name else ""
+    if extension in MAGIC or extension in _FTYP_TYPES:
+        return extension
+    return None
+
+
+def sniff(
+    head: bytes,
+    content_type: str,
+    filename: str,
+    offset: int = 0,
+    error_patterns: Sequence[str] = (),
+) -> Optional[str]:
+    """Why the response starting with `head` is not the file, None if it may be
+
+    Args:
+        head: First bytes of the body
+        content_type: Content-Type header of the response
+        filename: Name of the file, whose extension gives the expected type
+        offset: Position of `head` in the file; magic bytes are only
+            checked at the start
+        error_patterns: Regexes of the host's error pages
+    """
+    text = head.decode("utf-8", errors="replace")
+    for pattern in error_patterns:
+        if re.search(pattern, text):
+            return f"Host error page ({pattern})"
+    if filename.lower().rsplit(".", 1)[-1] in _TEXT_EXTENSIONS:
+        return None
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in _TEXT_TYPES:
+        return f"Content-Type is {media_type}"
+    if _HTML_RE.match(head.lstrip(b"\xef\xbb\xbf")):
+        return "Body is an HTML page"
+    if head.lstrip()[:1] in (b"{", b"["):
+        try:
+            json.loads(head)
+        except ValueError:
+            pass
+        else:
+            return "Body is a JSON document"
+    if offset == 0 and head:
+        kind = expected_type(filename)
+        if kind in MAGIC and not head.startswith(MAGIC[kind]):
+            return f"Body doesn't start like a {kind} file"
+        if kind in _FTYP_TYPES and head[4:8] != b"ftyp":
+            return f"Body doesn't start like a {kind} file"
+    return None
+
+
+async def read_head(chunks: AsyncIterator[bytes], size: int = SNIFF_SIZE) -> Tuple[bytes, AsyncIterator[bytes]]:
+    """Read at least `size` bytes of a chunk iterator ahead
+
+    Returns:
+        The first `size` bytes (fewer if the body is shorter) and an
+        iterator yielding the whole body, read-ahead chunks included
+    """
+    buffered: List[bytes] = []
+    received = 0
+    async for chunk in chunks:
+        buffered.append(chunk)
+        received += len(chunk)
+        if received >= size:
+            break
+
+    async def replay():
+        for chunk in buffered:
+            yield chunk
+        async for chunk in chunks:
+            yield chunk
+
+    return b"".join(buffered)[:size], replay()
+
+
+class SniffedResponse(StreamResponse):
+    """Response whose body is continued from `chunks` after a read-ahead"""
+
+    def __init__(self, response: StreamResponse, chunks: AsyncIterator[bytes]) -> None:
+        self.status = response.status
+        self.url = response.url
+        self.headers: Mapping[str, str] = response.headers
+        self.reason = getattr(response, "reason", "")
+        self._chunks = chunks
+
+    def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        # Chunks keep the size of the read-ahead iterator
+        return self._chunks
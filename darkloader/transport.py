@@ -0,0 +1,491 @@
+"""Pluggable HTTP transports shared by the resolvers and the downloader
+
+A ``Transport`` sends the small requests of the host plugins (pages, API
+calls, HEADs) and streams file transfers. One transport is shared by the
+whole ``DarkLoader``, so requests to the same origin reuse its connections
+instead of paying a new TCP/TLS handshake each.
+
+Backends:
+    aiohttp  Default. HTTP/1.1 keep-alive pool.
+    httpx    HTTP/2 when the origin supports it, multiplexing concurrent API
+             and range requests over one connection per origin. Needs
+             ``pip install 'httpx[http2]'``.
+
+Every transport counts the connections it opens in ``connections_opened``.
+
+Transfers are not bounded in total duration, since multi-GB files on slow
+hosts legitimately take hours. ``TransferTimeouts`` bounds each phase
+instead: connecting, waiting for the response headers and waiting for body
+bytes, and ``detect_stalls`` fails a transfer whose throughput stays under a
+minimum over a sliding window, which a trickling connection never trips.
+
+``RateLimiter`` caps the combined throughput of every transfer it is shared
+by; ``throttle`` applies it to a chunk iterator.
+"""
+import asyncio
+import http.cookiejar
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from http.cookies import Morsel
+from typing import AsyncIterator, Callable, Dict, List, Mapping, Optional, Union
+from urllib.parse import urlparse
+
+import aiohttp
+from yarl import URL
+
+from darkloader.cookies import cookie_expiry
+
+Body = Optional[Union[dict, str, bytes]]
+
+
+class HTTPStatusError(Exception):
+    """Error status (>= 400) of a streamed response"""
+
+    def __init__(self, status: int, url: str, message: str = "") -> None:
+        super().__init__(f"HTTP {status} for {url}: {message}" if message else f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+        self.message = message
+
+
+class TransferStalled(Exception):
+    """A transfer kept its connection but fell under the minimum throughput"""
+
+
+@dataclass
+class TransferTimeouts:
+    """Per-phase timeouts of a file transfer, in seconds
+
+    Args:
+        connect: Opening the connection, TLS handshake included
+        first_byte: From sending the request to the response headers
+        read: Without receiving any byte of the body
+        stall_window: Window the throughput is measured over
+        min_speed: Bytes/s under which a transfer is stalled once it has
+            run for `stall_window`, 0 to disable the stall detector
+    """
+    connect: float = 30
+    first_byte: float = 60
+    read: float = 60
+    stall_window: float = 60
+    min_speed: int = 1024
+
+
+async def detect_stalls(chunks: AsyncIterator[bytes], timeouts: TransferTimeouts) -> AsyncIterator[bytes]:
+    """Wrap a chunk iterator, raising TransferStalled on a crawling transfer
+
+    Silence is left to the read timeout; this catches connections that keep
+    delivering a few bytes, too few to ever finish.
+    """
+    window = timeouts.stall_window
+    started = time.monotonic()
+    samples: deque = deque()
+    received = 0
+    async for chunk in chunks:
+        now = time.monotonic()
+        samples.append((now, len(chunk)))
+        received += len(chunk)
+        while samples[0][0] < now - window:
+            received -= samples.popleft()[1]
+        if timeouts.min_speed and now - started >= window and received < timeouts.min_speed * window:
+            raise TransferStalled(f"{received / window:.0f} B/s over the last {window:g}s")
+        yield chunk
+
+
+class RateLimiter:
+    """Token bucket shared by transfers to cap their combined bytes/s
+
+    Args:
+        rate: Bytes per second
+        burst: Bytes that may go through at once after a pause, defaults
+            to one second worth
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("The rate limit must be positive")
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, nbytes: int) -> None:
+        """Wait until `nbytes` fit in the limit"""
+        # Waiters go in turn, so a transfer can't starve the others
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Chunks larger than the bucket go into debt and are paid back here
+            self._tokens -= nbytes
+            if self._tokens < 0:
+                await asyncio.sleep(-self._tokens / self.rate)
+
+
+async def throttle(chunks: AsyncIterator[bytes], limiter: RateLimiter) -> AsyncIterator[bytes]:
+    """Wrap a chunk iterator, holding every chunk until the limiter lets it through
+
+    Reading slower than the server sends fills the socket buffers and TCP
+    slows the sender down, so the limit applies to the network as well.
+    """
+    async for chunk in chunks:
+        await limiter.acquire(len(chunk))
+        yield chunk
+
+
+@dataclass
+class TransportResponse:
+    """Fully read response"""
+    status: int
+    url: str
+    headers: Mapping[str, str]
+    text: str
+    content: bytes
+
+
+class StreamResponse:
+    """Response whose body is read incrementally"""
+    status: int
+    url: str
+    headers: Mapping[str, str]
+
+    def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise HTTPStatusError(self.status, self.url, getattr(self, "reason", "") or "")
+
+
+class Transport:
+    """HTTP client interface used by hosts, LinkResolver and FileDownloader"""
+    name: str = ""
+
+    def __init__(self) -> None:
+        self.connections_opened = 0
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[dict] = None,
+        data: Body = None,
+        params: Optional[dict] = None,
+        allow_redirects: bool = True,
+        timeout: float = 30,
+        proxy: Optional[str] = None,
+    ) -> TransportResponse:
+        """Send a request and read the whole body (none for HEAD)"""
+        raise NotImplementedError
+
+    def stream(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[dict] = None,
+        data: Body = None,
+        proxy: Optional[str] = None,
+        timeouts: Optional[TransferTimeouts] = None,
+    ):
+        """Async context manager yielding a StreamResponse
+
+        Raises asyncio.TimeoutError when a phase of `timeouts` (defaults to
+        ``TransferTimeouts()``) runs out.
+        """
+        raise NotImplementedError
+
+    def cookie_header(self, url: str) -> dict:
+        """Cookie header with the cookies that apply to `url`"""
+        return {}
+
+    def export_cookies(self) -> Optional[List[dict]]:
+        """Cookies of the jar as dicts (see ``SessionStore``), None without a live jar"""
+        return None
+
+    def import_cookies(self, cookies: List[dict]) -> None:
+        """Add cookies exported by ``export_cookies`` to the jar"""
+
+    async def close(self) -> None:
+        pass
+
+
+class _AiohttpStream(StreamResponse):
+    def __init__(self, response: aiohttp.ClientResponse) -> None:
+        self._response = response
+        self.status = response.status
+        self.url = str(response.url)
+        self.headers = response.headers
+        self.reason = response.reason
+
+    def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        return self._response.content.iter_chunked(size)
+
+
+class AiohttpTransport(Transport):
+    """aiohttp session with a keep-alive pool, one per event loop
+
+    Args:
+        connector: Factory of the connector of new sessions (e.g. bound to
+            a source address), None for aiohttp's default
+    """
+    name = "aiohttp"
+
+    def __init__(self, connector: Optional[Callable[[], Optional[aiohttp.BaseConnector]]] = None) -> None:
+        super().__init__()
+        self._connector = connector
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._on_connection)
+            self._session = aiohttp.ClientSession(
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                connector=self._connector() if self._connector else None,
+                trace_configs=[trace],
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def _on_connection(self, session, context, params) -> None:
+        self.connections_opened += 1
+
+    async def request(
+        self, method, url, *, headers=None, data=None, params=None, allow_redirects=True, timeout=30, proxy=None
+    ):
+        async with self.session.request(
+            method,
+            url,
+            headers=headers,
+            data=data,
+            params=params,
+            allow_redirects=allow_redirects,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            proxy=proxy,
+        ) as response:
+            content = b"" if method.upper() == "HEAD" else await response.read()
+            text = await response.text(errors="replace") if content else ""
+            return TransportResponse(response.status, str(response.url), response.headers, text, content)
+
+    @asynccontextmanager
+    async def stream(self, method, url, *, headers=None, data=None, proxy=None, timeouts=None):
+        timeouts = timeouts or TransferTimeouts()
+        # No total: it would cut every transfer longer than it
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeouts.connect, sock_read=timeouts.read)
+        response = await asyncio.wait_for(
+            self.session.request(method, url, headers=headers, data=data, proxy=proxy, timeout=timeout),
+            timeouts.first_byte,
+        )
+        try:
+            yield _AiohttpStream(response)
+        finally:
+            response.release()
+
+    def cookie_header(self, url: str) -> dict:
+        cookies = self.session.cookie_jar.filter_cookies(url)
+        if not cookies:
+            return {}
+        return {"Cookie": "; ".join(f"{key}={morsel.value}" for key, morsel in cookies.items())}
+
+    def export_cookies(self) -> Optional[List[dict]]:
+        if self._session is None or self._session.closed:
+            return None
+        now = time.time()
+        return [
+            {
+                "name": morsel.key,
+                "value": morsel.value,
+                "domain": morsel["domain"],
+                "path": morsel["path"] or "/",
+                "secure": bool(morsel["secure"]),
+                "expires": cookie_expiry(morsel, now),
+            }
+            for morsel in self._session.cookie_jar
+        ]
+
+    def import_cookies(self, cookies: List[dict]) -> None:
+        jar = self.session.cookie_jar
+        now = time.time()
+        for cookie in cookies:
+            morsel: Morsel = Morsel()
+            morsel.set(cookie["name"], cookie["value"], cookie["value"])
+            morsel["domain"] = cookie["domain"]
+            morsel["path"] = cookie["path"]
+            morsel["secure"] = cookie["secure"]
+            if cookie["expires"] is not None:
+                morsel["max-age"] = str(max(int(cookie["expires"] - now), 1))
+            jar.update_cookies({cookie["name"]: morsel}, URL(f"http://{cookie['domain'].lstrip('.')}/"))
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class _HttpxStream(StreamResponse):
+    def __init__(self, response, timeout_error: type) -> None:
+        self._response = response
+        self._timeout_error = timeout_error
+        self.status = response.status_code
+        self.url = str(response.url)
+        self.headers = response.headers
+        self.reason = response.reason_phrase
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._response.aiter_bytes(size):
+                yield chunk
+        except self._timeout_error as e:
+            raise asyncio.TimeoutError(str(e)) from e
+
+
+class HttpxTransport(Transport):
+    """httpx client speaking HTTP/2 where the origin offers it
+
+    Args:
+        http2: Negotiate HTTP/2 over TLS (falls back to HTTP/1.1)
+        max_connections: Connection pool size
+    """
+    name = "httpx"
+
+    def __init__(self, http2: bool = True, max_connections: int = 100) -> None:
+        super().__init__()
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("The httpx transport requires httpx: pip install 'httpx[http2]'") from e
+        self._httpx = httpx
+        self.http2 = http2
+        self.max_connections = max_connections
+        self._client = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = self._httpx.AsyncClient(
+                http2=self.http2,
+                limits=self._httpx.Limits(max_connections=self.max_connections),
+                timeout=self._httpx.Timeout(30, read=None),
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def _trace(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def _body(self, data: Body) -> dict:
+        if isinstance(data, (str, bytes)):
+            return {"content": data}
+        return {"data": data} if data is not None else {}
+
+    async def request(
+        self, method, url, *, headers=None, data=None, params=None, allow_redirects=True, timeout=30, proxy=None
+    ):
+        if proxy is not None:
+            raise ValueError("HttpxTransport does not support per-request proxies")
+        response = await self.client.request(
+            method,
+            url,
+            headers=headers,
+            params=params,
+            follow_redirects=allow_redirects,
+            timeout=timeout,
+            extensions={"trace": self._trace},
+            **self._body(data),
+        )
+        content = b"" if method.upper() == "HEAD" else response.content
+        text = response.text if content else ""
+        return TransportResponse(response.status_code, str(response.url), response.headers, text, content)
+
+    @asynccontextmanager
+    async def stream(self, method, url, *, headers=None, data=None, proxy=None, timeouts=None):
+        if proxy is not None:
+            # httpx binds proxies to the client; routed downloads use aiohttp
+            raise ValueError("HttpxTransport does not support per-request proxies")
+        timeouts = timeouts or TransferTimeouts()
+        request = self.client.build_request(
+            method,
+            url,
+            headers=headers,
+            timeout=self._httpx.Timeout(None, connect=timeouts.connect, read=timeouts.read),
+            extensions={"trace": self._trace},
+            **self._body(data),
+        )
+        try:
+            response = await asyncio.wait_for(
+                self.client.send(request, stream=True, follow_redirects=True), timeouts.first_byte
+            )
+        except self._httpx.TimeoutException as e:
+            raise asyncio.TimeoutError(str(e)) from e
+        try:
+            # Timeouts surface as asyncio.TimeoutError, like with aiohttp
+            yield _HttpxStream(response, self._httpx.TimeoutException)
+        finally:
+            await response.aclose()
+
+    def cookie_header(self, url: str) -> dict:
+        domain = urlparse(url).hostname or ""
+        cookies = {}
+        for cookie in self.client.cookies.jar:
+            cookie_domain = cookie.domain.lstrip(".")
+            if domain == cookie_domain or domain.endswith("." + cookie_domain):
+                cookies[cookie.name] = cookie.value
+        if not cookies:
+            return {}
+        return {"Cookie": "; ".join(f"{key}={value}" for key, value in cookies.items())}
+
+    def export_cookies(self) -> Optional[List[dict]]:
+        if self._client is None or self._client.is_closed:
+            return None
+        return [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+                "expires": cookie.expires,
+            }
+            for cookie in self._client.cookies.jar
+        ]
+
+    def import_cookies(self, cookies: List[dict]) -> None:
+        jar = self.client.cookies.jar
+        for cookie in cookies:
+            domain = cookie["domain"]
+            jar.set_cookie(http.cookiejar.Cookie(
+                0, cookie["name"], cookie["value"], None, False,
+                domain, domain.startswith("."), domain.startswith("."),
+                cookie["path"], True, cookie["secure"],
+                int(cookie["expires"]) if cookie["expires"] is not None else None,
+                cookie["expires"] is None, None, None, {},
+            ))
+
+    async def close(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+TRANSPORTS: Dict[str, Callable[[], Transport]] = {
+    AiohttpTransport.name: AiohttpTransport,
+    HttpxTransport.name: HttpxTransport,
+}
+
+
+def make_transport(name: str = "aiohttp") -> Transport:
+    """Transport backend by name"""
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown transport: {name} (available: {', '.join(TRANSPORTS)})")
+    return TRANSPORTS[name]()
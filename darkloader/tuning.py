@@ -0,0 +1,245 @@
+"""Per-host concurrency learned from the downloads themselves
+
+How many parallel downloads a host tolerates varies a lot: pixeldrain takes
+many, 1fichier free links one. ``HostConcurrency`` starts each host at a
+small limit and adjusts it after every download:
+
+- the aggregate throughput reached at each concurrency level is tracked;
+  while the limit is actually in use and one more download made the host
+  faster, the limit grows additively (about +1 per `limit` completions)
+- when a level turns out slower than the one below it, the limit steps down
+- HTTP 429/503 halves the limit
+
+The connections a large file is split over (see ``SegmentedDownload``) are
+learned the same way from the speed of each segmented file: grown while one
+more connection made files faster, stepped down when it made them slower,
+halved with the download limit on 429/503.
+
+Learned limits are kept in a JSON file and used as the starting point of the
+next run. Processes sharing the file don't merge their state: the last one
+to save wins.
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from darkloader.logger import setup_logger
+
+# Answers meaning "slow down" rather than "this file is broken"
+BACKOFF_STATUSES = (429, 503)
+
+
+def _status_of(error: BaseException) -> Optional[int]:
+    """HTTP status behind an error, also when it was wrapped in another one"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(error, "status", None)
+        if isinstance(status, int):
+            return status
+        error = error.__cause__ or error.__context__
+    return None
+
+
+@dataclass
+class HostLimit:
+    """Learned limits and measurements of one host"""
+    limit: float
+    connections: float
+    in_flight: int = 0
+    # Smoothed aggregate bytes/s measured at each concurrency level
+    throughput: Dict[int, float] = field(default_factory=dict)
+    # Smoothed bytes/s of one segmented file at each connection count
+    file_throughput: Dict[int, float] = field(default_factory=dict)
+
+
+class Slot:
+    """One admitted download; set `nbytes` once it has transferred
+
+    `connections` is the learned connection count of the host; the caller
+    lowers it to what the transfer actually used and sets `segmented` when
+    the file was large enough to be split over them.
+    """
+
+    def __init__(self, level: int, connections: int = 1) -> None:
+        self.level = level
+        self.connections = connections
+        self.segmented = False
+        self.nbytes = 0
+        self.started = time.perf_counter()
+
+
+class HostConcurrency:
+    """Adaptive limit of simultaneous downloads and connections per host
+
+    Args:
+        path: JSON file the limits are loaded from and saved to, None to
+            keep them in memory only
+        initial: Starting limit of hosts without a saved one
+        minimum: Lowest limit
+        maximum: Highest limit
+        tolerance: Relative throughput change treated as noise
+        log_level: Logging level
+        initial_connections: Starting connections per file of hosts without
+            a saved count
+        max_connections: Highest connections per file
+    """
+
+    # Weight of the latest sample in the throughput averages
+    SMOOTHING = 0.5
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 16,
+        tolerance: float = 0.05,
+        log_level: str = "INFO",
+        initial_connections: int = 2,
+        max_connections: int = 16,
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.initial_connections = initial_connections
+        self.max_connections = max_connections
+        self.logger = setup_logger("HostConcurrency", log_level)
+        self.hosts: Dict[str, HostLimit] = {}
+        self._changed: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        if self.path and self.path.exists():
+            self.load()
+
+    def load(self) -> None:
+        """Read the saved limits"""
+        try:
+            saved = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            self.logger.warning("Ignoring unreadable limits file %s: %s", self.path, e)
+            return
+        for host, limits in saved.items():
+            # Files of older versions only have the download limit
+            if not isinstance(limits, dict):
+                limits = {"downloads": limits}
+            self.hosts[host] = HostLimit(
+                min(max(float(limits["downloads"]), self.minimum), self.maximum),
+                min(max(float(limits.get("connections", self.initial_connections)), 1), self.max_connections),
+            )
+
+    def save(self) -> None:
+        """Write the learned limits, replacing the file atomically"""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(self.path.name + ".tmp")
+        limits = {
+            host: {"downloads": round(state.limit, 2), "connections": round(state.connections, 2)}
+            for host, state in sorted(self.hosts.items())
+        }
+        temp.write_text(json.dumps(limits, indent=2))
+        os.replace(temp, self.path)
+
+    def limit(self, host: str) -> int:
+        """Current limit of `host`"""
+        return int(self._state(host).limit)
+
+    def connections(self, host: str) -> int:
+        """Current connections per file of `host`"""
+        return int(self._state(host).connections)
+
+    def _state(self, host: str) -> HostLimit:
+        if host not in self.hosts:
+            self.hosts[host] = HostLimit(float(self.initial), float(self.initial_connections))
+        return self.hosts[host]
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._changed, self._loop = asyncio.Condition(), loop
+        return self._changed
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        """Hold one of the download slots of `host` while the block runs
+
+        Yields a Slot whose `nbytes` the caller sets after a transfer;
+        completed transfers feed the throughput measurements, 429/503
+        errors shrink the limits.
+        """
+        state = self._state(host)
+        changed = self._condition()
+        async with changed:
+            while state.in_flight >= int(state.limit):
+                await changed.wait()
+            state.in_flight += 1
+            slot = Slot(state.in_flight, int(state.connections))
+        try:
+            yield slot
+        except Exception as e:
+            if _status_of(e) in BACKOFF_STATUSES:
+                self._back_off(host, state)
+            raise
+        else:
+            if slot.nbytes:
+                self._record(host, state, slot)
+        finally:
+            async with changed:
+                state.in_flight -= 1
+                changed.notify_all()
+
+    def _record(self, host: str, state: HostLimit, slot: Slot) -> None:
+        elapsed = time.perf_counter() - slot.started
+        if elapsed <= 0:
+            return
+        # Every download in flight went about as fast as this one
+        new_limit = self._step(
+            state.throughput, slot.level, slot.nbytes / elapsed * slot.level, state.limit, self.minimum, self.maximum
+        )
+        if new_limit < state.limit:
+            self.logger.info("%s slower at %d downloads, limit %d", host, slot.level, new_limit)
+        state.limit = new_limit
+        if slot.segmented:
+            connections = self._step(
+                state.file_throughput, slot.connections, slot.nbytes / elapsed, state.connections, 1,
+                self.max_connections
+            )
+            if connections < state.connections:
+                self.logger.info("%s slower over %d connections, using %d", host, slot.connections, connections)
+            state.connections = connections
+
+    def _step(
+        self, throughput: Dict[int, float], level: int, sample: float, limit: float, minimum: int, maximum: int
+    ) -> float:
+        """Add a throughput sample taken at `level`, returns the new limit"""
+        previous = throughput.get(level)
+        throughput[level] = sample if previous is None else (
+            self.SMOOTHING * sample + (1 - self.SMOOTHING) * previous
+        )
+        current = throughput[level]
+        below = throughput.get(level - 1)
+        if below and current < below * (1 - self.tolerance):
+            return min(limit, max(minimum, level - 1))
+        if level >= int(limit) and (below is None or current > below * (1 + self.tolerance)):
+            # Only a limit that is actually reached says anything about raising it
+            return min(maximum, limit + 1 / limit)
+        return limit
+
+    def _back_off(self, host: str, state: HostLimit) -> None:
+        state.limit = max(self.minimum, state.limit / 2)
+        state.connections = max(1, state.connections / 2)
+        # Measurements above the new limits predate the throttling
+        state.throughput = {level: value for level, value in state.throughput.items() if level <= state.limit}
+        state.file_throughput = {
+            level: value for level, value in state.file_throughput.items() if level <= state.connections
+        }
+        self.logger.warning(
+            "%s is throttling, limit %d, %d connections", host, int(state.limit), int(state.connections)
+        )
@@ -3,8 +3,11 @@ from setuptools import setup, find_packages
 setup(
     name="darkloader",
     version="0.1.0",
-    packages=find_packages(),
+    packages=find_packages(exclude=("tests", "benchmarks", "benchmarks.*")),
     install_requires=[],
+    entry_points={
+        "console_scripts": ["darkloader=darkloader.cli:main"],
+    },
     author="Gxldxm",
     author_email="ealmfr@gmail.com",
     description="Download files from various websites",
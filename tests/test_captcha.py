@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from darkloader.captcha import CaptchaError, CaptchaService, CaptchaSolver
+from darkloader.host import Host
+
+
+class VariantSolver(CaptchaSolver):
+    """Only the second preprocessing variant reads the right number of digits"""
+    name = "variant"
+    variants = ("bad", "good", "other")
+
+    def solve(self, payload, attempt):
+        return payload.decode() if self.variants[attempt] == "good" else "12"
+
+
+class PidSolver(CaptchaSolver):
+    name = "pid"
+    length = None
+
+    def solve(self, payload, attempt):
+        return str(os.getpid())
+
+
+class NeverSolver(CaptchaSolver):
+    name = "never"
+    cpu_bound = False
+
+    def solve(self, payload, attempt):
+        return ""
+
+
+@pytest.fixture
+def service():
+    service = CaptchaService(max_workers=2)
+    yield service
+    service.close()
+
+
+class TestCaptchaService:
+    @pytest.mark.asyncio
+    async def test_retries_wrong_length_with_next_variant(self, service):
+        assert await service.solve(VariantSolver(), b"1234") == "1234"
+        stats = service.stats()["variant"]
+        assert stats.attempts == 2
+        assert stats.wrong_length == 1
+        assert stats.success_rate == 1.0
+
+    @pytest.mark.asyncio
+    async def test_runs_in_worker_process_and_caches(self, service):
+        code = await service.solve(PidSolver(), b"img")
+        assert code != str(os.getpid())
+        assert await service.solve(PidSolver(), b"img") == code
+        assert service.stats()["pid"].cache_hits == 1
+
+    @pytest.mark.asyncio
+    async def test_failure_raises_and_is_counted(self, service):
+        with pytest.raises(CaptchaError):
+            await service.solve(NeverSolver(), "<html>")
+        stats = service.stats()["never"]
+        assert stats.failed == 1
+        assert stats.success_rate == 0.0
+
+
+class TestHostCaptcha:
+    @pytest.mark.asyncio
+    async def test_host_uses_its_service(self, service):
+        host = Host(captcha_service=service)
+        assert await host.solve_captcha(VariantSolver(), b"4321") == "4321"
+        assert service.stats()["variant"].solved == 1
+
+    @pytest.mark.asyncio
+    async def test_error_reaches_the_host(self, service):
+        host = Host(captcha_service=service)
+        with pytest.raises(CaptchaError):
+            await host.solve_captcha(NeverSolver(), "<html>")
@@ -0,0 +1,83 @@
+import io
+import json
+
+import pytest
+
+from benchmarks.mock_server import _BLOCK, MockHostConfig, MockHostServer
+from darkloader.cli import EXIT_FAILED, EXIT_OK, EXIT_USAGE, Dashboard, parse_args, parse_size, read_links, run
+from darkloader.main import FileDownloader
+
+SIZE = 64 * 1024
+# The level of the shared logger is set by whoever creates it first, and
+# other tests read its INFO records
+LOG = ["--log-level", "INFO"]
+
+
+def test_parse_size():
+    assert parse_size("800") == 800
+    assert parse_size("800K") == 800 * 1024
+    assert parse_size("1.5GiB") == 3 * 1024 ** 3 // 2
+    with pytest.raises(Exception):
+        parse_size("fast")
+
+
+def test_read_links_skips_comments_and_repeats(tmp_path):
+    links = tmp_path / "links.txt"
+    links.write_text("# batch\nhttps://a/1\n\n  https://a/2  \nhttps://a/1\n")
+    stdin = io.StringIO("https://b/1\n")
+    assert read_links([str(links), "-"], stdin) == ["https://a/1", "https://a/2", "https://b/1"]
+
+
+def test_usage_errors_exit_with_2():
+    with pytest.raises(SystemExit) as exit:
+        parse_args(["links.txt", "--concurrency", "0"])
+    assert exit.value.code == EXIT_USAGE
+
+
+@pytest.mark.asyncio
+async def test_dashboard_tracks_files():
+    dashboard = Dashboard(io.StringIO(), total_files=3, rows=1)
+    await dashboard.update("a.bin", 50, 100)
+    await dashboard.update("b.bin", 10, 100)
+    await dashboard.update("a.bin", 100, 100)
+    assert dashboard.completed == 1 and dashboard.bytes == 110
+    lines = dashboard.render()
+    assert lines[0].startswith("[1/3 files] 1 active")
+    assert "b.bin" in lines[1]
+
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(FileDownloader, "RETRY_DELAY", 0)
+
+
+@pytest.mark.asyncio
+async def test_batch_writes_summary(tmp_path, no_retry_delay):
+    summary_path = tmp_path / "summary.json"
+    async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+        links = tmp_path / "links.txt"
+        links.write_text(f"{server.url}/files/f1/f1.bin\n{server.url}/files/f2/f2.bin\n")
+        args = parse_args([
+            str(links), "-o", str(tmp_path / "out"), "--summary", str(summary_path), "--limit-rate", "10M", *LOG
+        ])
+        assert await run(args, stderr=io.StringIO()) == EXIT_OK
+    summary = json.loads(summary_path.read_text())
+    assert summary["succeeded"] == 2 and summary["failed"] == 0
+    assert summary["bytes"] == 2 * SIZE
+    assert (tmp_path / "out" / "f1.bin").read_bytes() == _BLOCK[:SIZE]
+
+
+@pytest.mark.asyncio
+async def test_failures_exit_with_1_and_can_be_retried(tmp_path, no_retry_delay):
+    summary_path = tmp_path / "summary.json"
+    async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+        stdin = io.StringIO(f"{server.url}/files/f1/f1.bin\n{server.url}/missing/f2.bin\n")
+        args = parse_args(["-", "-o", str(tmp_path), "--summary", str(summary_path), "--retries", "1", *LOG])
+        stderr = io.StringIO()
+        assert await run(args, stdin=stdin, stderr=stderr) == EXIT_FAILED
+        assert f"FAILED {server.url}/missing/f2.bin" in stderr.getvalue()
+
+        args = parse_args(["--retry-failed", str(summary_path), "-o", str(tmp_path), "--retries", "1", *LOG])
+        assert await run(args, stderr=io.StringIO()) == EXIT_FAILED
+    summary = json.loads(summary_path.read_text())
+    assert [entry["ok"] for entry in summary["files"]] == [True, False]
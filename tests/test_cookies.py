@@ -0,0 +1,85 @@
+import json
+import time
+
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+from darkloader.cookies import SESSION_COOKIE_TTL, SessionStore
+from darkloader.host import HostHTTPError
+from darkloader.hosts import GoFile, OneFichier
+from darkloader.main import DarkLoader
+
+
+class TestSessionStore:
+    def test_values_expire(self):
+        store = SessionStore()
+        store.set("gofile", "token", "abc", ttl=60)
+        store.set("gofile", "old", "xyz", ttl=60)
+        store.state["gofile"]["old"]["expires"] = time.time() - 1
+        assert store.get("gofile", "token") == "abc"
+        assert store.get("gofile", "old") is None
+        assert store.get("pixeldrain", "token") is None
+
+    def test_save_and_load_drop_expired_entries(self, tmp_path):
+        path = tmp_path / "sessions.json"
+        store = SessionStore(path)
+        store.set("gofile", "token", "abc")
+        store.set("gofile", "stale", "xyz", ttl=60)
+        store.state["gofile"]["stale"]["expires"] = time.time() - 1
+        now = time.time()
+        store.cookies = [
+            {"name": "a", "value": "1", "domain": "x.com", "path": "/", "secure": False, "expires": now + 60},
+            {"name": "b", "value": "2", "domain": "x.com", "path": "/", "secure": False, "expires": now - 60},
+            {"name": "c", "value": "3", "domain": "x.com", "path": "/", "secure": False, "expires": None,
+             "saved": now - SESSION_COOKIE_TTL - 1},
+        ]
+        store.save()
+        assert "stale" not in json.loads(path.read_text())["state"]["gofile"]
+
+        loaded = SessionStore(path)
+        assert loaded.get("gofile", "token") == "abc"
+        assert [cookie["name"] for cookie in loaded.cookies] == ["a"]
+
+    def test_unreadable_file_is_ignored(self, tmp_path):
+        path = tmp_path / "sessions.json"
+        path.write_text("{not json")
+        assert SessionStore(path).cookies == []
+
+
+@pytest.mark.asyncio
+async def test_cookies_survive_between_runs(tmp_path):
+    path = tmp_path / "sessions.json"
+    async with MockHostServer(MockHostConfig()) as server:
+        for _ in range(2):
+            async with DarkLoader(download_dir=str(tmp_path), session_file=path) as loader:
+                host = next(host for host in loader.link_resolver.hosts if isinstance(host, OneFichier))
+                await host.get_direct_link(f"{server.url}/1f/o1")
+    # The second run skipped getting a new session
+    assert server.onefichier_sessions == [None, "session-1"]
+
+
+@pytest.mark.asyncio
+async def test_gofile_token_is_reused_between_runs(tmp_path, monkeypatch):
+    path = tmp_path / "sessions.json"
+    monkeypatch.delenv("GF_TOKEN", raising=False)
+    async with MockHostServer(MockHostConfig()) as server:
+        monkeypatch.setattr(GoFile, "API_URL", server.url)
+        for file_id in ("g1", "g2"):
+            async with DarkLoader(download_dir=str(tmp_path), session_file=path) as loader:
+                host = next(host for host in loader.link_resolver.hosts if isinstance(host, GoFile))
+                result = await host.get_direct_link(f"https://gofile.io/d/{file_id}")
+                assert result["headers"]["Cookie"] == "accountToken=benchmark"
+    assert server.gofile_account_requests == 1
+
+
+@pytest.mark.asyncio
+async def test_gofile_refreshes_a_refused_token_once(tmp_path, monkeypatch):
+    monkeypatch.delenv("GF_TOKEN", raising=False)
+    async with MockHostServer(MockHostConfig()) as server:
+        monkeypatch.setattr(GoFile, "API_URL", server.url)
+        async with DarkLoader(download_dir=str(tmp_path)) as loader:
+            host = next(host for host in loader.link_resolver.hosts if isinstance(host, GoFile))
+            with pytest.raises(HostHTTPError) as error:
+                await host.get_direct_link("https://gofile.io/d/private1")
+    assert error.value.status == 401
+    assert server.gofile_account_requests == 2
@@ -2,9 +2,12 @@ import pytest
 import asyncio
 from pathlib import Path
 import os
+import socket
 import tempfile
 from unittest.mock import patch, MagicMock, AsyncMock
+from urllib.parse import urlparse
 
+from benchmarks.mock_server import MockHostConfig, MockHostServer
 from darkloader.main import (
     DarkLoader,
     FileDownloader,
@@ -16,6 +19,7 @@ from darkloader.main import (
     FileDownloaderError,
     UnsupportedServiceError
 )
+from darkloader.tuning import HostConcurrency
 
 
 @pytest.fixture
@@ -108,54 +112,63 @@ class TestBaseDownloader:
         result = file_downloader.is_downloaded(test_file, wrong_size)
         assert result == ""
 
-    @patch("darkloader.darkloader.requests.head")
-    def test_get_file_url_size(self, mock_head, file_downloader):
-        mock_response = MagicMock()
-        mock_response.headers = {"Content-Length": "1024"}
-        mock_head.return_value = mock_response
-        
-        size = file_downloader.get_file_url_size("http://example.com/file.zip", {})
-        assert size == 1024
-
 
 class TestFileDownloader:
     @pytest.mark.asyncio
-    @patch("aiohttp.ClientSession")
-    async def test_download_from_url_get(self, mock_session, file_downloader, temp_download_dir):
-        mock_client = AsyncMock()
-        mock_response = AsyncMock()
-        mock_session.return_value.__aenter__.return_value = mock_client
-        mock_client.get.return_value.__aenter__.return_value = mock_response
-        
-        mock_response.headers = {"Content-Length": "100", "Content-Type": "application/zip"}
-        mock_response.content.iter_chunked.return_value.__aiter__.return_value = [b"test data"]
-        
-        save_path = Path(temp_download_dir) / "test_download.zip"
-        
-        result = await file_downloader.download_from_url(
-            "http://example.com/file.zip",
-            save_path
-        )
-        
+    async def test_get_file_url_size(self, file_downloader):
+        async with MockHostServer(MockHostConfig(file_size=1024)) as server:
+            try:
+                assert await file_downloader.get_file_url_size(f"{server.url}/files/f1/f1.bin", {}) == 1024
+                assert await file_downloader.get_file_url_size(f"{server.url}/missing/f2.bin", {}) == 0
+            finally:
+                await file_downloader.close()
+            assert server.file_head_requests == 1
+
+    @pytest.mark.asyncio
+    async def test_download_from_url_get(self, file_downloader, temp_download_dir):
+        save_path = Path(temp_download_dir) / "test_download.bin"
+        async with MockHostServer(MockHostConfig(file_size=100)) as server:
+            try:
+                result = await file_downloader.download_from_url(f"{server.url}/files/get/file.bin", save_path)
+            finally:
+                await file_downloader.close()
+
         assert result == str(save_path)
-        assert Path(result).exists()
-        assert Path(result).read_bytes() == b"test data"
+        assert Path(result).stat().st_size == 100
+
+    @pytest.mark.asyncio
+    async def test_download_from_url_gives_up_after_max_retries(
+        self, file_downloader, temp_download_dir, monkeypatch
+    ):
+        monkeypatch.setattr(FileDownloader, "RETRY_DELAY", 0)
+        monkeypatch.setattr(FileDownloader, "MAX_RETRIES", 2)
+        # A port nothing listens on
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        save_path = Path(temp_download_dir) / "refused.zip"
+        try:
+            with pytest.raises(FileDownloaderError, match="after 2 retries"):
+                await file_downloader.download_from_url(f"http://127.0.0.1:{port}/file.zip", save_path)
+        finally:
+            await file_downloader.close()
 
 
 class TestLinkResolver:
     @pytest.mark.asyncio
-    @patch("darkloader.darkloader.requests.head")
-    async def test_get_direct_link_direct_url(self, mock_head, link_resolver):
-        mock_response = MagicMock()
-        mock_response.headers = {"Content-Disposition": 'attachment; filename="test.zip"'}
-        mock_head.return_value = mock_response
+    async def test_get_direct_link_direct_url(self, link_resolver):
+        async with MockHostServer(MockHostConfig(file_size=1024)) as server:
+            url = f"{server.url}/files/direct/test.zip"
+            try:
+                result = await link_resolver.get_direct_link(url)
+            finally:
+                await link_resolver.close()
         
-        result = await link_resolver.get_direct_link("http://example.com/direct.zip")
-        
-        assert result[0] == "http://example.com/direct.zip"  # direct_link
-        assert result[1] == "test.zip"  # filename
-        assert result[2] == link_resolver.DEFAULT_HEADERS  # headers
-        assert result[3] is None  # data
+        assert result["url"] == url  # direct_link
+        assert result["filename"] == "test.zip"  # filename
+        assert result["headers"] == link_resolver.DEFAULT_HEADERS  # headers
+        assert result["payload"] is None  # data
+        assert result["size"] == 1024
 
 
 class TestDarkLoader:
@@ -165,7 +178,7 @@ class TestDarkLoader:
     @patch.object(FileDownloader, "download_from_url")
     async def test_download_url(self, mock_download, mock_get_size, mock_get_link, dark_loader, temp_download_dir):
         # Setup mocks
-        mock_get_link.return_value = ("http://direct.link/file.zip", "file.zip", {}, None)
+        mock_get_link.return_value = {"url": "http://direct.link/file.zip", "filename": "file.zip", "headers": {}, "payload": None}
         mock_get_size.return_value = 1024
         mock_download.return_value = os.path.join(temp_download_dir, "file.zip")
         
@@ -184,7 +197,7 @@ class TestDarkLoader:
     @patch.object(FileDownloader, "is_downloaded")
     async def test_download_url_file_exists(self, mock_is_downloaded, mock_get_size, mock_get_link, dark_loader, temp_download_dir):
         # Setup mocks
-        mock_get_link.return_value = ("http://direct.link/file.zip", "file.zip", {}, None)
+        mock_get_link.return_value = {"url": "http://direct.link/file.zip", "filename": "file.zip", "headers": {}, "payload": None}
         mock_get_size.return_value = 1024
         existing_file = os.path.join(temp_download_dir, "file.zip")
         mock_is_downloaded.return_value = existing_file
@@ -196,3 +209,31 @@ class TestDarkLoader:
         assert result == existing_file
         mock_get_link.assert_called_once_with("http://example.com/file.zip")
         mock_get_size.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_small_files_skip_the_probe(self, temp_download_dir, monkeypatch):
+        monkeypatch.setattr(DarkLoader, "SMALL_FILE_SIZE", 4096)
+        async with MockHostServer(MockHostConfig(file_size=1024)) as server:
+            urls = [f"{server.url}/files/s{i}/s{i}.bin" for i in range(8)]
+            urls.append(f"{server.url}/files/big/big.bin?size=8192")
+            async with DarkLoader(download_dir=temp_download_dir, small_files=True) as loader:
+                results = await loader.download_batch(urls, concurrency=4)
+                # Already downloaded files are recognised from the GET headers
+                assert await loader.download_url(urls[0]) == results[0]
+            # Only the file over the threshold went through the regular path
+            assert server.file_head_requests == 1
+        assert [Path(result).stat().st_size for result in results] == [1024] * 8 + [8192]
+        assert not list(Path(temp_download_dir).glob("*.part"))
+
+    @pytest.mark.asyncio
+    async def test_small_file_already_there_is_not_a_throughput_sample(self, temp_download_dir):
+        limits = HostConcurrency()
+        async with MockHostServer(MockHostConfig(file_size=1024)) as server:
+            url = f"{server.url}/files/s1/s1.bin"
+            host = urlparse(url).netloc
+            async with DarkLoader(download_dir=temp_download_dir, small_files=True, host_limits=limits) as loader:
+                await loader.download_url(url)
+                assert limits.hosts[host].throughput
+                limits.hosts[host].throughput.clear()
+                await loader.download_url(url)
+        assert not limits.hosts[host].throughput
@@ -0,0 +1,86 @@
+import asyncio
+from collections import namedtuple
+
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+from darkloader.disk import DiskBudget, DiskSpaceError, part_path, preallocate
+from darkloader.main import DarkLoader
+
+Usage = namedtuple("Usage", "total used free")
+
+
+@pytest.fixture
+def budget(tmp_path, monkeypatch):
+    monkeypatch.setattr("darkloader.disk.shutil.disk_usage", lambda path: Usage(2000, 1000, 1000))
+    return DiskBudget(tmp_path)
+
+
+class TestDiskBudget:
+    @pytest.mark.asyncio
+    async def test_reservations_count_against_free_space(self, budget):
+        async with budget.admit(600) as reservation:
+            assert budget.available() == 400
+            reservation.allocated()
+            assert budget.reserved == 0
+        assert budget.available() == 1000
+
+    @pytest.mark.asyncio
+    async def test_never_fits(self, budget):
+        with pytest.raises(DiskSpaceError):
+            async with budget.admit(1500):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_min_free(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("darkloader.disk.shutil.disk_usage", lambda path: Usage(2000, 1000, 1000))
+        with pytest.raises(DiskSpaceError):
+            async with DiskBudget(tmp_path, min_free=500).admit(600):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_waits_for_in_flight_downloads(self, budget):
+        order = []
+
+        async def first():
+            async with budget.admit(600):
+                await asyncio.sleep(0.05)
+                order.append("first done")
+
+        async def second():
+            await asyncio.sleep(0.01)
+            async with budget.admit(600):
+                order.append("second admitted")
+
+        await asyncio.gather(first(), second())
+        assert order == ["first done", "second admitted"]
+
+    @pytest.mark.asyncio
+    async def test_unknown_size_is_admitted(self, budget):
+        async with budget.admit(None) as reservation:
+            assert reservation is None
+
+
+def test_preallocate(tmp_path):
+    path = tmp_path / "file.bin"
+    with path.open("wb") as file:
+        allocated = preallocate(file, 1 << 20)
+    assert path.stat().st_size == (1 << 20 if allocated else 0)
+
+
+class TestDownloadAdmission:
+    @pytest.mark.asyncio
+    async def test_download_replaces_part_file(self, tmp_path):
+        async with MockHostServer(MockHostConfig(file_size=4096)) as server:
+            async with DarkLoader(download_dir=str(tmp_path)) as loader:
+                await loader.download_url(f"{server.url}/files/a/a.bin")
+        assert (tmp_path / "a.bin").stat().st_size == 4096
+        assert not part_path(tmp_path / "a.bin").exists()
+
+    @pytest.mark.asyncio
+    async def test_rejected_before_transfer(self, tmp_path):
+        async with MockHostServer(MockHostConfig(file_size=4096)) as server:
+            async with DarkLoader(download_dir=str(tmp_path), min_free_space=1 << 62) as loader:
+                with pytest.raises(DiskSpaceError):
+                    await loader.download_url(f"{server.url}/files/a/a.bin")
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+from darkloader.distributed import DONE, FAILED, LEASED, QUEUED, SQLiteJobQueue, SQLiteRateLimiter, Worker
+from darkloader.main import DarkLoader
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(tmp_path / "queue.db", lease_seconds=60, max_attempts=2)
+
+
+class TestSQLiteJobQueue:
+    def test_lease_complete(self, queue):
+        queue.add(["http://a/1", "http://a/2"])
+        job = queue.lease("w1")
+        assert job.url == "http://a/1"
+        assert queue.lease("w2").url == "http://a/2"
+        assert queue.lease("w3") is None
+        assert queue.complete(job.id, "w1", "/tmp/1")
+        assert queue.stats() == {QUEUED: 0, LEASED: 1, DONE: 1, FAILED: 0}
+
+    def test_fail_requeues_until_max_attempts(self, queue):
+        queue.add(["http://a/1"])
+        job = queue.lease("w1")
+        queue.fail(job.id, "w1", "boom")
+        job = queue.lease("w2")
+        assert job.attempts == 1
+        queue.fail(job.id, "w2", "boom")
+        assert queue.lease("w3") is None
+        assert queue.stats()[FAILED] == 1
+
+    def test_complete_many(self, queue):
+        queue.add(["http://a/1", "http://a/2", "http://a/3"])
+        first, second, third = (queue.lease("w1") for _ in range(3))
+        with queue.transaction() as db:
+            db.execute("UPDATE jobs SET worker = 'w2' WHERE id = ?", (third.id,))
+        results = [(first.id, "w1", "/tmp/1"), (second.id, "w1", "/tmp/2"), (third.id, "w1", "/tmp/3")]
+        assert queue.complete_many(results) == 2
+        assert queue.complete_many([]) == 0
+        assert queue.stats() == {QUEUED: 0, LEASED: 1, DONE: 2, FAILED: 0}
+
+    def test_expired_lease_is_requeued(self, tmp_path):
+        queue = SQLiteJobQueue(tmp_path / "queue.db", lease_seconds=0.05)
+        queue.add(["http://a/1"])
+        job = queue.lease("crashed")
+        time.sleep(0.1)
+        assert queue.lease("w2").id == job.id
+        # The crashed worker can no longer renew or complete it
+        assert not queue.heartbeat(job.id, "crashed")
+        assert not queue.complete(job.id, "crashed", "x")
+        assert queue.heartbeat(job.id, "w2")
+
+
+class TestSQLiteRateLimiter:
+    def test_shared_bucket(self, tmp_path):
+        limits = {"host.example": (10, 2)}
+        first = SQLiteRateLimiter(tmp_path / "queue.db", limits)
+        second = SQLiteRateLimiter(tmp_path / "queue.db", limits)
+        assert first.try_acquire("host.example") == 0
+        assert second.try_acquire("host.example") == 0
+        assert 0 < first.try_acquire("host.example") <= 0.1
+        assert second.try_acquire("other.example") == 0
+
+    @pytest.mark.asyncio
+    async def test_acquire_waits(self, tmp_path):
+        limiter = SQLiteRateLimiter(tmp_path / "queue.db", {"h": (20, 1)})
+        started = time.perf_counter()
+        for _ in range(3):
+            await limiter.acquire("h")
+        assert time.perf_counter() - started >= 0.09
+
+
+class TestWorker:
+    @pytest.mark.asyncio
+    async def test_workers_drain_shared_queue(self, tmp_path):
+        queue = SQLiteJobQueue(tmp_path / "queue.db")
+        async with MockHostServer(MockHostConfig(file_size=2048)) as server:
+            queue.add([f"{server.url}/files/f{i}/f{i}.bin" for i in range(6)])
+            queue.add([f"{server.url}/missing"])
+            async with DarkLoader(download_dir=str(tmp_path / "a")) as a, DarkLoader(download_dir=str(tmp_path / "b")) as b:
+                await asyncio.gather(
+                    Worker(a, queue, worker_id="a", concurrency=2, poll_interval=0.01).run(),
+                    Worker(b, queue, worker_id="b", concurrency=2, poll_interval=0.01).run(),
+                )
+        stats = queue.stats()
+        assert stats[DONE] == 6
+        assert stats[FAILED] == 1
+        downloaded = list((tmp_path / "a").glob("*.bin")) + list((tmp_path / "b").glob("*.bin"))
+        assert len(downloaded) == 6
+
+    @pytest.mark.asyncio
+    async def test_completions_are_batched(self, tmp_path, monkeypatch):
+        class InstantLoader:
+            async def download_url(self, url, dl_path=None):
+                return url
+
+        queue = SQLiteJobQueue(tmp_path / "queue.db")
+        queue.add([f"http://a/{i}" for i in range(10)])
+        batches = []
+        complete_many = queue.complete_many
+        monkeypatch.setattr(queue, "complete_many", lambda results: batches.append(len(results)) or complete_many(results))
+        await Worker(InstantLoader(), queue, worker_id="w", concurrency=1, complete_batch=4).run()
+        assert batches == [4, 4, 2]
+        assert queue.stats()[DONE] == 10
+
+    @pytest.mark.asyncio
+    async def test_lost_lease_cancels_download(self, tmp_path):
+        class SlowLoader:
+            cancelled = False
+
+            async def download_url(self, url, dl_path=None):
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    self.cancelled = True
+                    raise
+
+        queue = SQLiteJobQueue(tmp_path / "queue.db", lease_seconds=0.15)
+        queue.add(["http://a/1"])
+        job = queue.lease("w1")
+        with queue.transaction() as db:
+            db.execute("UPDATE jobs SET worker = 'w2'")
+        loader = SlowLoader()
+        await asyncio.wait_for(Worker(loader, queue, worker_id="w1").run_job(job), 2)
+        assert loader.cancelled
+        assert queue.stats()[LEASED] == 1
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from benchmarks.mock_server import _BLOCK, MockHostConfig, MockHostServer
+from darkloader.host import is_expired
+from darkloader.hosts import GoFile
+from darkloader.main import DarkLoader, FileDownloader, LinkExpiredError
+
+SIZE = 64 * 1024
+
+
+def test_is_expired():
+    assert not is_expired({"expires_at": None})
+    assert is_expired({"expires_at": time.time() - 1})
+    assert not is_expired({"expires_at": time.time() + 60})
+    assert is_expired({"expires_at": time.time() + 60}, margin=120)
+
+
+@pytest.fixture
+def gofile_api(monkeypatch):
+    monkeypatch.setattr(FileDownloader, "RETRY_DELAY", 0)
+
+    def point_at(server):
+        monkeypatch.setattr(GoFile, "API_URL", server.url)
+
+    return point_at
+
+
+def count_resolutions(loader):
+    calls = []
+    resolve = loader.link_resolver.get_direct_link
+
+    async def counted(url):
+        calls.append(url)
+        return await resolve(url)
+
+    loader.link_resolver.get_direct_link = counted
+    return calls
+
+
+class TestLinkExpiry:
+    @pytest.mark.asyncio
+    async def test_expired_mid_transfer_resolves_and_resumes(self, tmp_path, gofile_api, caplog):
+        # The connection drops at 48KiB, after the link has expired
+        config = MockHostConfig(file_size=SIZE, rate=SIZE // 2, link_ttl=0.3, drop_at=48 * 1024)
+        async with MockHostServer(config) as server:
+            gofile_api(server)
+            async with DarkLoader(download_dir=str(tmp_path)) as loader:
+                calls = count_resolutions(loader)
+                path = await loader.download_url("https://gofile.io/d/g1")
+        assert len(calls) == 2
+        assert "Resuming from byte 32768" in caplog.text
+        assert open(path, "rb").read() == _BLOCK[:SIZE]
+
+    @pytest.mark.asyncio
+    async def test_link_expiring_before_transfer_is_resolved_again(self, tmp_path, gofile_api, monkeypatch):
+        monkeypatch.setattr(GoFile, "link_ttl", 1)
+        async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+            gofile_api(server)
+            async with DarkLoader(download_dir=str(tmp_path)) as loader:
+                calls = count_resolutions(loader)
+                await loader.download_url("https://gofile.io/d/g1")
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, tmp_path, gofile_api):
+        async with MockHostServer(MockHostConfig(file_size=SIZE, link_ttl=-1)) as server:
+            gofile_api(server)
+            async with DarkLoader(download_dir=str(tmp_path)) as loader:
+                calls = count_resolutions(loader)
+                with pytest.raises(LinkExpiredError):
+                    await loader.download_url("https://gofile.io/d/g1")
+        assert len(calls) == DarkLoader.MAX_RESOLVE_ATTEMPTS
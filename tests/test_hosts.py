@@ -0,0 +1,226 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.mock_server import MOCK_1F_PASSWORD, MockHostConfig, MockHostServer
+from darkloader.host import Host, filename_from_content_disposition
+from darkloader.hosts import GoFile, OneFichier, Pixeldrain, Ranoz
+from darkloader.hosts.onefichier import DirectLinkError
+from darkloader.main import LinkResolver, UnsupportedServiceError
+from darkloader.probe import ProbeResult, ProbeTable
+
+
+class SlowHost(Host):
+    name = "slow"
+    domains = ("slow.example",)
+    max_concurrency = 2
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = 0
+        self.peak = 0
+
+    async def get_direct_link(self, url):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await self.countdown(0.01)
+        self.running -= 1
+        if url.endswith("bad"):
+            raise ValueError(url)
+        return self.result(url, url.rsplit("/", 1)[-1])
+
+
+def mock_server():
+    return MockHostServer(MockHostConfig(file_size=4096))
+
+
+class TestHost:
+    def test_matches_domain_and_subdomains(self):
+        host = GoFile()
+        assert host.matches("https://gofile.io/d/abc")
+        assert host.matches("https://store1.gofile.io/d/abc")
+        assert not host.matches("https://notgofile.io/d/abc")
+
+    def test_content_disposition(self):
+        assert filename_from_content_disposition('attachment; filename="a b.zip"') == "a b.zip"
+        assert filename_from_content_disposition("attachment; filename*=UTF-8''a%20b.zip") == "a b.zip"
+        assert filename_from_content_disposition("inline") is None
+
+    def test_result_expiry_from_ttl(self):
+        host = SlowHost()
+        host.link_ttl = 60
+        result = host.result("http://x/f", "f", size=10)
+        assert result["size"] == 10
+        assert 55 < result["expires_at"] - time.time() <= 60
+        assert SlowHost().result("http://x/f", "f")["expires_at"] is None
+
+    @pytest.mark.asyncio
+    async def test_resolve_many_keeps_order_and_limit(self):
+        host = SlowHost()
+        urls = [f"http://slow.example/{i}" for i in range(6)] + ["http://slow.example/bad"]
+        results = await host.resolve_many(urls)
+        assert [r["filename"] for r in results[:6]] == [str(i) for i in range(6)]
+        assert isinstance(results[6], ValueError)
+        assert host.peak == 2
+
+    @pytest.mark.asyncio
+    async def test_countdowns_do_not_block(self):
+        host = SlowHost()
+        started = time.perf_counter()
+        await asyncio.gather(*(host.countdown(0.2) for _ in range(300)))
+        assert time.perf_counter() - started < 5
+
+
+class TestHostsAgainstMockServer:
+    @pytest.mark.asyncio
+    async def test_gofile(self, monkeypatch):
+        async with mock_server() as server:
+            monkeypatch.setattr(GoFile, "API_URL", server.url)
+            monkeypatch.delenv("GF_TOKEN", raising=False)
+            host = GoFile()
+            try:
+                result = await host.get_direct_link("https://gofile.io/d/g1")
+            finally:
+                await host.close()
+            assert result["filename"] == "g1.bin"
+            assert result["url"] == f"{server.url}/files/g1/g1.bin"
+            assert result["headers"]["Cookie"] == "accountToken=benchmark"
+
+    @pytest.mark.asyncio
+    async def test_pixeldrain_reports_size(self, monkeypatch):
+        async with mock_server() as server:
+            monkeypatch.setattr(Pixeldrain, "API_URL", f"{server.url}/api")
+            host = Pixeldrain()
+            try:
+                result = await host.get_direct_link("https://pixeldrain.com/u/p1")
+            finally:
+                await host.close()
+            assert result["filename"] == "p1.bin"
+            assert result["size"] == 4096
+
+    @pytest.mark.asyncio
+    async def test_onefichier(self):
+        async with mock_server() as server:
+            host = OneFichier()
+            try:
+                result = await host.get_direct_link(f"{server.url}/1f/o1")
+            finally:
+                await host.close()
+            assert result["url"] == f"{server.url}/files/o1/o1.bin"
+            assert result["filename"] == "o1.bin"
+            assert result["payload"] is None
+
+    @pytest.mark.asyncio
+    async def test_onefichier_password(self):
+        async with mock_server() as server:
+            url = f"{server.url}/1f/protected1"
+            host = OneFichier()
+            try:
+                with pytest.raises(DirectLinkError, match="Password required"):
+                    await host.get_direct_link(url)
+                with pytest.raises(DirectLinkError, match="Invalid password"):
+                    await host.get_direct_link(url, password="wrong")
+                result = await host.get_direct_link(url, password=MOCK_1F_PASSWORD)
+                assert await host.get_filename(url) == "protected1.bin"
+            finally:
+                await host.close()
+            assert result["url"] == f"{server.url}/files/protected1/protected1.bin"
+
+
+class TestLinkResolverHosts:
+    @pytest.mark.asyncio
+    async def test_disabled_host(self):
+        resolver = LinkResolver()
+        try:
+            with pytest.raises(UnsupportedServiceError):
+                await resolver.get_direct_link("https://ranoz.gg/d/abc")
+            assert isinstance(resolver.host_for("https://pixeldrain.com/u/x"), Pixeldrain)
+            assert resolver.host_for("https://example.com/file.zip") is None
+        finally:
+            await resolver.close()
+
+    @pytest.mark.asyncio
+    async def test_resolve_many_mixes_hosts(self, monkeypatch):
+        async with mock_server() as server:
+            monkeypatch.setattr(Pixeldrain, "API_URL", f"{server.url}/api")
+            resolver = LinkResolver()
+            try:
+                results = await resolver.resolve_many([
+                    "https://pixeldrain.com/u/p1",
+                    f"{server.url}/files/d1/d1.bin",
+                    "https://ranoz.gg/d/abc",
+                    "https://pixeldrain.com/u/p2",
+                ])
+            finally:
+                await resolver.close()
+            assert results[0]["filename"] == "p1.bin"
+            assert results[1]["filename"] == "d1.bin"
+            assert results[1]["size"] == 4096
+            assert isinstance(results[2], UnsupportedServiceError)
+            assert results[3]["filename"] == "p2.bin"
+            assert Ranoz.disabled_reason in str(results[2])
+
+
+
+class TestProbe:
+    @pytest.mark.asyncio
+    async def test_pixeldrain_uses_batch_endpoint(self, monkeypatch):
+        async with mock_server() as server:
+            monkeypatch.setattr(Pixeldrain, "API_URL", f"{server.url}/api")
+            monkeypatch.setattr(Pixeldrain, "INFO_BATCH", 50)
+            urls = [f"https://pixeldrain.com/u/p{i}" for i in range(120)] + ["https://pixeldrain.com/u/missing1"]
+            resolver = LinkResolver()
+            try:
+                table = await resolver.probe(urls)
+            finally:
+                await resolver.close()
+            assert server.pixeldrain_info_requests == 3
+        assert len(table) == 121
+        assert table[5].filename == "p5.bin" and table[5].size == 4096
+        assert table[-1].available is False
+        assert len(table.filter(available=True)) == 120
+
+    @pytest.mark.asyncio
+    async def test_mixed_hosts(self, monkeypatch):
+        async with mock_server() as server:
+            monkeypatch.setattr(GoFile, "API_URL", server.url)
+            monkeypatch.setenv("GF_TOKEN", "x")
+            resolver = LinkResolver()
+            try:
+                table = await resolver.probe([
+                    "https://gofile.io/d/g1",
+                    f"{server.url}/files/d1/d1.bin",
+                    f"{server.url}/nothing-here",
+                    "https://ranoz.gg/d/abc",
+                ])
+            finally:
+                await resolver.close()
+        assert [row.filename for row in table][:2] == ["g1.bin", "d1.bin"]
+        assert table[1].size == 4096
+        assert table[2].available is False
+        assert table[3].available is None and "Cloudflare" in table[3].error
+
+
+class TestProbeTable:
+    def table(self):
+        return ProbeTable([
+            ProbeResult("u1", "a", "x.bin", 30, True),
+            ProbeResult("u2", "b", "y.bin", None, None, "timeout"),
+            ProbeResult("u3", "a", "x.bin", 30, True),
+            ProbeResult("u4", "b", "z.bin", 10, True),
+            ProbeResult("u5", "a", None, None, False, "not found"),
+        ])
+
+    def test_sort_puts_unknown_last(self):
+        assert self.table().sort("size").urls() == ["u4", "u1", "u3", "u2", "u5"]
+        assert self.table().sort("size", reverse=True).urls()[:3] == ["u1", "u3", "u4"]
+
+    def test_filter_and_unique(self):
+        table = self.table()
+        assert table.filter(available=True, host="a").urls() == ["u1", "u3"]
+        assert table.filter(min_size=20).urls() == ["u1", "u3"]
+        assert table.filter(lambda row: row.error is not None).urls() == ["u2", "u5"]
+        assert table.unique().urls() == ["u1", "u2", "u4", "u5"]
+        assert table.unique().total_size == 40
+        assert "timeout" in table.format()
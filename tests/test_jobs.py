@@ -0,0 +1,48 @@
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+from darkloader.jobs import DONE, FAILED, QUEUED, RUNNING, JobTable
+from darkloader.main import DarkLoader, FileDownloader
+
+
+def test_table_round_trips_urls():
+    urls = ["https://a.example/f/1?x=ü", "https://A.example:8080/f/2", "https://a.example/f/1?x=ü", "relative/path"]
+    table = JobTable(urls)
+    assert len(table) == 3
+    assert list(table) == [urls[0], urls[1], urls[3]]
+    assert table.host(1) == "a.example:8080"
+    assert not table.add(urls[1])
+    # One host string for all the jobs of a host
+    assert table.add("https://a.example/f/3")
+    assert table.host(3) is table.host(0)
+
+
+def test_repeats_are_dropped_past_growth():
+    table = JobTable(f"https://h.example/{i % 3000}" for i in range(6000))
+    assert len(table) == 3000
+    assert table.url(2999) == "https://h.example/2999"
+
+
+def test_states_and_results():
+    table = JobTable(["https://a/1", "https://a/2", "https://a/3"])
+    taken = table.take()
+    first, second = next(taken), next(taken)
+    assert table.counts() == {QUEUED: 1, RUNNING: 2, DONE: 0, FAILED: 0}
+    table.finish(first, "/tmp/1")
+    table.finish(second, ValueError("boom"))
+    assert table.state(first) == DONE and table.path(first) == "/tmp/1"
+    assert table.state(second) == FAILED and table.error(second) == "ValueError: boom"
+    assert list(taken) == [2]
+
+
+@pytest.mark.asyncio
+async def test_download_jobs_fills_the_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(FileDownloader, "RETRY_DELAY", 0)
+    monkeypatch.setattr(DarkLoader, "PENDING_JOBS", 2)
+    async with MockHostServer(MockHostConfig(file_size=1024)) as server:
+        table = JobTable([f"{server.url}/files/j{i}/j{i}.bin" for i in range(6)] + [f"{server.url}/missing"])
+        async with DarkLoader(download_dir=str(tmp_path)) as loader:
+            await loader.download_jobs(table, concurrency=3)
+    assert table.counts() == {QUEUED: 0, RUNNING: 0, DONE: 6, FAILED: 1}
+    assert table.path(0) == str(tmp_path / "j0.bin")
+    assert table.error(6)
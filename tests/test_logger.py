@@ -0,0 +1,38 @@
+import json
+import logging
+
+from darkloader.logger import ContextFilter, JsonFormatter, TextFormatter, log_context
+
+
+def make_record(msg, *args):
+    record = logging.LogRecord("DarkLoader", logging.INFO, __file__, 1, msg, args, None)
+    ContextFilter().filter(record)
+    return record
+
+
+class TestLogContext:
+    def test_context_nests_and_resets(self):
+        with log_context(url="http://example.com/a"):
+            with log_context(filename="a.zip"):
+                record = make_record("inner")
+            outer = make_record("outer")
+        after = make_record("after")
+
+        assert record.context == {"url": "http://example.com/a", "filename": "a.zip"}
+        assert outer.context == {"url": "http://example.com/a"}
+        assert after.context == {}
+
+    def test_json_formatter_merges_context(self):
+        with log_context(host="gofile.io"):
+            record = make_record("Downloaded %s/%s bytes", 10, 20)
+
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry["message"] == "Downloaded 10/20 bytes"
+        assert entry["host"] == "gofile.io"
+        assert entry["level"] == "INFO"
+
+    def test_text_formatter_appends_context(self):
+        with log_context(host="gofile.io"):
+            record = make_record("hello")
+
+        assert TextFormatter().format(record).endswith("hello [host=gofile.io]")
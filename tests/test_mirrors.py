@@ -0,0 +1,109 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from benchmarks.mock_server import _BLOCK, MockHostConfig, MockHostServer
+from darkloader.main import DarkLoader, FileDownloader, FileDownloaderError, LinkResolver
+from darkloader.mirrors import Mirror, MirrorMismatchError, verify_mirrors
+from darkloader.segments import SegmentedDownload
+from darkloader.transport import AiohttpTransport, TransferTimeouts
+
+SIZE = 512 * 1024
+MIN_SPLIT = 16 * 1024
+
+
+def mirror(url, size, hash=None):
+    return Mirror(url, {"url": url, "filename": "f.bin", "headers": {}, "payload": None, "hash": hash}, size)
+
+
+class TestVerifyMirrors:
+    def test_agreeing_mirrors(self):
+        mirrors = [mirror("https://a.io/f", 100, "sha256:AB"), mirror("https://b.io/f", None, "sha256:ab"), mirror("https://c.io/f", 100)]
+        assert verify_mirrors(mirrors) == 100
+
+    def test_size_mismatch(self):
+        with pytest.raises(MirrorMismatchError, match="size"):
+            verify_mirrors([mirror("https://a.io/f", 100), mirror("https://b.io/f", 101)])
+
+    def test_hash_mismatch(self):
+        with pytest.raises(MirrorMismatchError, match="sha256"):
+            verify_mirrors([mirror("https://a.io/f", 100, "sha256:ab"), mirror("https://b.io/f", 100, "sha256:cd")])
+
+    def test_other_algorithms_are_not_compared(self):
+        assert verify_mirrors([mirror("https://a.io/f", 100, "md5:ab"), mirror("https://b.io/f", 100, "sha1:cd")]) == 100
+
+    def test_unknown_size(self):
+        with pytest.raises(MirrorMismatchError):
+            verify_mirrors([mirror("https://a.io/f", None)])
+
+
+@pytest.mark.asyncio
+async def test_dead_mirror_leaves_its_ranges_to_the_others(tmp_path):
+    transport = AiohttpTransport()
+    path = tmp_path / "f.bin"
+    path.write_bytes(b"")
+
+    def source(url):
+        return lambda start, end: transport.stream("GET", url, headers={"Range": f"bytes={start}-{end - 1}"})
+
+    async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+        good, dead = source(f"{server.url}/files/a/a.bin"), source(f"{server.url}/missing")
+        download = SegmentedDownload([dead, good, dead, good], path, 0, SIZE, TransferTimeouts(), MIN_SPLIT)
+        try:
+            await download.run()
+        finally:
+            await transport.close()
+    assert download.source_bytes[0] == download.source_bytes[2] == 0
+    assert path.read_bytes() == _BLOCK[:SIZE]
+
+
+@pytest.mark.asyncio
+async def test_download_mirrors_favours_the_fastest(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(FileDownloader, "MIN_SEGMENT_SIZE", MIN_SPLIT)
+    async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+        fast = f"{server.url}/files/fast/f.bin"
+        slow = f"{server.url}/files/slow/f.bin?rate={SIZE // 4}"
+        async with DarkLoader(download_dir=str(tmp_path), connections=2) as loader:
+            path = await loader.download_mirrors([fast, slow, f"{server.url}/files/gone/f.bin?fail=1"])
+    assert Path(path).read_bytes() == _BLOCK[:SIZE]
+    fetched = dict((url, int(nbytes)) for nbytes, url in re.findall(r"Fetched (\d+) bytes from (\S+)", caplog.text))
+    assert fetched[fast] > fetched[slow]
+    assert sum(fetched.values()) >= SIZE
+
+
+def unsized_links(monkeypatch, links):
+    async def resolve_many(self, urls):
+        return [{**links[url], "url": url, "filename": "f.bin", "size": None, "hash": None} for url in urls]
+
+    monkeypatch.setattr(LinkResolver, "resolve_many", resolve_many)
+
+
+@pytest.mark.asyncio
+async def test_mirrors_failing_or_unknown_size_are_left_out(tmp_path, monkeypatch, caplog):
+    async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+        good = f"{server.url}/files/a/f.bin"
+        # Connection refused on the HEAD
+        dead = "http://127.0.0.1:1/f.bin"
+        # POST downloads can't be probed
+        post_only = f"{server.url}/files/b/f.bin"
+        unsized_links(monkeypatch, {
+            good: {"headers": {}, "payload": None},
+            dead: {"headers": {}, "payload": None},
+            post_only: {"headers": {}, "payload": {"id": "b"}},
+        })
+        async with DarkLoader(download_dir=str(tmp_path)) as loader:
+            path = await loader.download_mirrors([dead, post_only, good])
+    assert Path(path).read_bytes() == _BLOCK[:SIZE]
+    assert f"Leaving out mirror {dead}: size probe failed" in caplog.text
+    assert f"Leaving out mirror {post_only}: size unknown" in caplog.text
+    fetched = dict((url, int(nbytes)) for nbytes, url in re.findall(r"Fetched (\d+) bytes from (\S+)", caplog.text))
+    assert fetched == {good: SIZE}
+
+
+@pytest.mark.asyncio
+async def test_no_mirror_with_a_known_size(tmp_path, monkeypatch):
+    unsized_links(monkeypatch, {"http://127.0.0.1:1/f.bin": {"headers": {}, "payload": None}})
+    async with DarkLoader(download_dir=str(tmp_path)) as loader:
+        with pytest.raises(FileDownloaderError, match="size"):
+            await loader.download_mirrors(["http://127.0.0.1:1/f.bin"])
@@ -0,0 +1,42 @@
+import aiohttp
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer, _parse_range
+from benchmarks.run import percentile
+
+
+class TestParseRange:
+    def test_ranges(self):
+        assert _parse_range(None, 100) is None
+        assert _parse_range("bytes=10-19", 100) == (10, 19)
+        assert _parse_range("bytes=90-", 100) == (90, 99)
+        assert _parse_range("bytes=-5", 100) == (95, 99)
+        assert _parse_range("bytes=50-500", 100) == (50, 99)
+
+
+class TestMockHostServer:
+    @pytest.mark.asyncio
+    async def test_range_request(self):
+        async with MockHostServer(MockHostConfig(file_size=4096)) as server:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{server.url}/files/a/a.bin", headers={"Range": "bytes=100-199"}) as response:
+                    body = await response.read()
+                    assert response.status == 206
+                    assert response.headers["Content-Range"] == "bytes 100-199/4096"
+        assert body == bytes(range(100, 200))
+
+    @pytest.mark.asyncio
+    async def test_gofile_contents(self):
+        async with MockHostServer() as server:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{server.url}/contents/abc") as response:
+                    data = await response.json()
+        assert data["data"]["name"] == "abc.bin"
+        assert data["data"]["link"] == f"{server.url}/files/abc/abc.bin"
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
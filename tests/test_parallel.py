@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+from darkloader.parallel import DONE, FAILED, RUNNING, ProcessCoordinator, WorkerError
+
+
+class TestProcessCoordinator:
+    @pytest.mark.asyncio
+    async def test_jobs_sharded_across_processes(self, tmp_path):
+        progress = []
+
+        async def progress_cb(name, done, total):
+            progress.append((name, done, total))
+
+        async with MockHostServer(MockHostConfig(file_size=4096)) as server:
+            urls = [f"{server.url}/files/f{i}/f{i}.bin" for i in range(6)] + [f"{server.url}/missing"]
+            async with ProcessCoordinator(processes=2, concurrency=2, download_dir=str(tmp_path), log_level="WARNING") as pool:
+                results = await pool.download_batch(urls, progress_cb=progress_cb)
+                totals = pool.totals()
+
+        assert results[:6] == [str(tmp_path / f"f{i}.bin") for i in range(6)]
+        assert isinstance(results[6], WorkerError)
+        assert totals[DONE] == 6 and totals[FAILED] == 1
+        assert totals["bytes_done"] == totals["bytes_total"] == 6 * 4096
+        assert ("f0.bin", 4096, 4096) in progress
+        assert {job.worker for job in pool.jobs.values()} <= {0, 1}
+
+    @pytest.mark.asyncio
+    async def test_worker_killed_mid_batch(self, tmp_path):
+        async with MockHostServer(MockHostConfig(file_size=8192, rate=8192)) as server:
+            urls = [f"{server.url}/files/k{i}/k{i}.bin" for i in range(5)]
+            async with ProcessCoordinator(processes=2, concurrency=1, download_dir=str(tmp_path), log_level="ERROR") as pool:
+                batch = asyncio.ensure_future(pool.download_batch(urls))
+                while not any(job.state == RUNNING and job.worker == 0 for job in pool.jobs.values()):
+                    await asyncio.sleep(0.05)
+                killed = next(job.id for job in pool.jobs.values() if job.state == RUNNING and job.worker == 0)
+                pool._workers[0].kill()
+                results = await asyncio.wait_for(batch, 30)
+
+        # The job it was running fails, the one it had taken is done by the other worker
+        assert isinstance(results[killed], WorkerError)
+        assert [result for i, result in enumerate(results) if i != killed] == [
+            str(tmp_path / f"k{i}.bin") for i in range(5) if i != killed
+        ]
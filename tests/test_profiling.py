@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+from darkloader.main import FileDownloader
+from darkloader.profiling import Profiler, current_profile, stage
+
+
+class TestProfiler:
+    def test_stage_is_noop_without_profile(self):
+        with stage("resolve"):
+            assert current_profile() is None
+
+    def test_track_records_stages_and_status(self, tmp_path):
+        profiler = Profiler(report_dir=tmp_path)
+        with profiler.track("http://example.com/a", "example.com"):
+            with stage("resolve"):
+                pass
+            with stage("resolve"):
+                pass
+        with pytest.raises(ValueError):
+            with profiler.track("http://example.com/b", "example.com"):
+                raise ValueError()
+
+        first, second = profiler.records
+        assert first.status == "ok"
+        assert first.stages["resolve"].calls == 2
+        assert second.status == "error"
+        assert profiler.summary()["example.com"]["resolve"].calls == 2
+
+        report = json.loads(profiler.write_report().read_text())
+        assert len(report["downloads"]) == 2
+
+    def test_unknown_sampler(self):
+        with pytest.raises(ValueError):
+            Profiler("perf")
+
+    @pytest.mark.asyncio
+    async def test_transfer_stages(self, tmp_path):
+        profiler = Profiler(report_dir=tmp_path)
+        downloader = FileDownloader(str(tmp_path), "WARNING")
+        async with MockHostServer(MockHostConfig(file_size=3 * 1024 * 1024)) as server:
+            with profiler.track(server.url, "mock") as profile:
+                await downloader.download_from_url(f"{server.url}/files/a/a.bin", tmp_path / "a.bin")
+            await downloader.close()
+
+        assert {"first_byte", "write", "finalize"} <= set(profile.stages)
+        assert profile.stages["first_byte"].calls == 1
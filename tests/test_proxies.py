@@ -0,0 +1,66 @@
+import aiohttp
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+from darkloader.host import HostHTTPError
+from darkloader.main import DarkLoader
+from darkloader.proxies import HOST, Exit, ProxyPool, current_exit, is_exit_failure
+
+
+class TestProxyPool:
+    @pytest.mark.asyncio
+    async def test_downloads_of_a_host_spread_over_exits(self):
+        pool = ProxyPool([Exit("http://a:1"), Exit("http://b:1")])
+        async with pool.lease("host") as first, pool.lease("host") as second:
+            assert first is not second
+            assert current_exit() is second
+        assert current_exit() is None
+
+    @pytest.mark.asyncio
+    async def test_host_rotation_is_sticky(self):
+        pool = ProxyPool([Exit("http://a:1"), Exit("http://b:1")], rotation=HOST)
+        async with pool.lease("one") as first, pool.lease("one") as again, pool.lease("two") as other:
+            assert first is again
+            assert other is not first
+
+    def test_prefers_faster_exits(self):
+        slow, fast = Exit("http://slow:1"), Exit("http://fast:1")
+        slow.record_success(1000, 1.0)
+        fast.record_success(1000, 0.1)
+        assert ProxyPool([slow, fast]).choose("host") is fast
+
+    @pytest.mark.asyncio
+    async def test_failed_exit_rests(self):
+        bad, good = Exit("http://bad:1"), Exit("http://good:1")
+        pool = ProxyPool([bad, good], cooldown=60)
+        with pytest.raises(aiohttp.ClientConnectionError):
+            async with pool.lease("host"):
+                raise aiohttp.ClientConnectionError()
+        assert not bad.healthy and bad.failures == 1
+        assert pool.choose("host") is good
+
+    def test_exit_failures(self):
+        assert is_exit_failure(HostHTTPError(429, "u"))
+        assert not is_exit_failure(HostHTTPError(404, "u"))
+        assert is_exit_failure(TimeoutError())
+        assert not is_exit_failure(ValueError())
+
+
+class TestRoutedDownloads:
+    @pytest.mark.asyncio
+    async def test_download_through_proxy(self, tmp_path):
+        async with MockHostServer(MockHostConfig(file_size=2048)) as server:
+            pool = ProxyPool([Exit(proxy=server.url)])
+            async with DarkLoader(download_dir=str(tmp_path), proxies=pool) as loader:
+                # Only reachable through the proxy
+                await loader.download_url("http://files.invalid/files/a/a.bin")
+        assert (tmp_path / "a.bin").stat().st_size == 2048
+        assert pool.exits[0].successes == 1 and pool.exits[0].speed
+
+    @pytest.mark.asyncio
+    async def test_download_from_source_address(self, tmp_path):
+        async with MockHostServer(MockHostConfig(file_size=2048)) as server:
+            pool = ProxyPool.from_lists(local_addrs=["127.0.0.1"])
+            async with DarkLoader(download_dir=str(tmp_path), proxies=pool) as loader:
+                await loader.download_url(f"{server.url}/files/a/a.bin")
+        assert (tmp_path / "a.bin").stat().st_size == 2048
@@ -0,0 +1,40 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from darkloader.runtime import LoopOptions, loop_factory, loop_name, run
+
+
+def test_loop_factory(monkeypatch):
+    assert loop_factory("asyncio") is asyncio.new_event_loop
+    with pytest.raises(ValueError):
+        loop_factory("trio")
+    # Not installed
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    assert loop_factory("auto") is asyncio.new_event_loop
+    with pytest.raises(ImportError):
+        loop_factory("uvloop")
+
+
+def test_missing_loop_fails_before_running(monkeypatch):
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+
+    async def main():
+        raise AssertionError("ran")
+
+    with pytest.raises(ImportError):
+        run(main(), LoopOptions("uvloop"))
+
+
+def test_run_tunes_the_loop():
+    async def main():
+        loop = asyncio.get_running_loop()
+        thread = await asyncio.to_thread(lambda: threading.current_thread().name)
+        return loop_name(loop), loop.get_debug(), loop.slow_callback_duration, thread
+
+    name, debug, slow_callback, thread = run(main(), LoopOptions("asyncio", executor_workers=2, slow_callback=0.25))
+    assert name == "asyncio"
+    assert debug and slow_callback == 0.25
+    assert thread.startswith("darkloader")
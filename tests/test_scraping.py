@@ -0,0 +1,61 @@
+from pathlib import Path
+
+from darkloader.hosts.desiupload import decode_captcha
+from darkloader.scraping import extract_form, find_element, find_link, find_text, parse_attrs
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def fixture(name):
+    return (FIXTURES / name).read_text()
+
+
+class TestParseAttrs:
+    def test_quoting_styles(self):
+        attrs = parse_attrs(' type=hidden name="op" value=\'a &amp; b\' disabled')
+        assert attrs == {"type": "hidden", "name": "op", "value": "a & b", "disabled": ""}
+
+
+class TestExtractForm:
+    def test_named_form_all_inputs(self):
+        form = extract_form(fixture("uploadscloud.html"), "F1")
+        assert form.action == ""
+        assert form.inputs["op"] == "download2"
+        assert form.inputs["id"] == "k2x9q7rbz1"
+        assert len(form.inputs) == 6
+
+    def test_stops_at_requested_fields(self):
+        form = extract_form(fixture("desiupload.html"), "F1", fields=("op", "referer"))
+        assert form.inputs == {"op": "download2", "referer": "https://desiupload.co/"}
+
+    def test_hidden_inputs_only(self):
+        form = extract_form(fixture("downloadgg.html"), input_type="hidden")
+        assert form.action == "https://download.gg/server/download.php"
+        assert form.inputs == {"download": "d1f7a0c", "token": "8b0e4b1a9c"}
+
+    def test_missing_form(self):
+        assert extract_form("<html></html>", "F1") is None
+
+
+class TestFindHelpers:
+    def test_find_text_by_class(self):
+        assert find_text(fixture("uploadscloud.html"), "span", "class", "dfilename") == "Holiday.Pictures.part1.rar"
+
+    def test_find_text_any_tag_after_position(self):
+        html = fixture("downloadgg.html")
+        assert find_text(html, None, "class", "name", html.find("uploadProgress")) == "Soundtrack & Extras.zip"
+
+    def test_find_link_by_class(self):
+        assert find_link(fixture("anonfile_result.html"), "class", "stretched-link") == \
+            "https://cdn3.anonfile.de/d/zz91xk/Archive.7z"
+
+    def test_find_link_inside_element(self):
+        inner = find_element(fixture("desiupload_result.html"), "span", "id", "direct_link")
+        assert find_link(inner) == "https://s3.desiupload.co:183/d/xyzabc/Video Clip.mp4"
+
+    def test_class_must_match_whole_word(self):
+        assert find_text('<span class="dfilename-x">a</span>', "span", "class", "dfilename") is None
+
+
+def test_desiupload_captcha_orders_digits_by_position():
+    assert decode_captcha(fixture("desiupload.html")) == "2970"
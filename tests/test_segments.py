@@ -0,0 +1,81 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from benchmarks.mock_server import _BLOCK, MockHostConfig, MockHostServer
+from darkloader.main import FileDownloader
+from darkloader.segments import Segment, SegmentedDownload
+from darkloader.transport import AiohttpTransport, TransferTimeouts
+
+SIZE = 512 * 1024
+MIN_SPLIT = 16 * 1024
+
+
+def expected(size: int) -> bytes:
+    return (_BLOCK * (size // len(_BLOCK) + 1))[:size]
+
+
+async def segmented(server, path: Path, connections: int):
+    transport = AiohttpTransport()
+    url = f"{server.url}/files/f1/f1.bin"
+
+    def open_range(start, end):
+        return transport.stream("GET", url, headers={"Range": f"bytes={start}-{end - 1}"})
+
+    path.write_bytes(b"")
+    download = SegmentedDownload([open_range] * connections, path, 0, SIZE, TransferTimeouts(read=5), MIN_SPLIT)
+    try:
+        async with transport.stream("GET", url) as first:
+            await download.run(first)
+    finally:
+        await transport.close()
+    return download
+
+
+def test_stalled_segment_eta():
+    segment = Segment(0, 1000)
+    segment.record(100)
+    segment._last = time.monotonic() - 10
+    assert segment.eta() > 60
+
+
+class TestSegmentedDownload:
+    @pytest.mark.asyncio
+    async def test_connections_steal_ranges(self, tmp_path):
+        async with MockHostServer(MockHostConfig(file_size=SIZE, rate=SIZE)) as server:
+            download = await segmented(server, tmp_path / "f1.bin", 4)
+        assert download.steals >= 3
+        assert download.done == download.contiguous == SIZE
+        assert (tmp_path / "f1.bin").read_bytes() == expected(SIZE)
+
+    @pytest.mark.asyncio
+    async def test_stalled_connection_is_outrun(self, tmp_path):
+        # The first connection stops sending at 64KiB and never resumes
+        config = MockHostConfig(file_size=SIZE, rate=SIZE, stall_at=64 * 1024)
+        async with MockHostServer(config) as server:
+            started = time.monotonic()
+            download = await segmented(server, tmp_path / "f1.bin", 4)
+        assert download.races >= 1
+        # Well before the read timeout of the stalled connection
+        assert time.monotonic() - started < 4
+        assert (tmp_path / "f1.bin").read_bytes() == expected(SIZE)
+
+
+@pytest.mark.asyncio
+async def test_file_downloader_splits_large_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(FileDownloader, "MIN_SEGMENT_SIZE", MIN_SPLIT)
+    updates = []
+
+    async def progress(name, done, total):
+        updates.append((done, total))
+
+    downloader = FileDownloader(str(tmp_path), connections=4)
+    async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+        try:
+            path = await downloader.download_from_url(f"{server.url}/files/f1/f1.bin", tmp_path / "f1.bin", progress_cb=progress)
+        finally:
+            await downloader.close()
+    assert Path(path).read_bytes() == expected(SIZE)
+    assert updates[-1] == (SIZE, SIZE)
+    assert not (tmp_path / "f1.bin.part").exists()
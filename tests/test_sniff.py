@@ -0,0 +1,118 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks.mock_server import _BLOCK, MockHostConfig, MockHostServer
+from darkloader.hosts.gofile import GoFile
+from darkloader.main import DarkLoader, FileDownloader, InvalidContentError
+from darkloader.sniff import expected_type, read_head, sniff
+
+SIZE = 64 * 1024
+
+ZIP_HEAD = b"PK\x03\x04\x14\x00\x00\x00\x08\x00" + bytes(100)
+MP4_HEAD = b"\x00\x00\x00\x20ftypisom" + bytes(100)
+
+
+class TestSniff:
+    def test_html_content_type_with_parameters(self):
+        assert sniff(b"whatever", "text/html; charset=utf-8", "file.bin")
+
+    def test_html_body_without_content_type(self):
+        head = b"\xef\xbb\xbf\n  <!DOCTYPE html><html><body>Quota exceeded</body></html>"
+        assert sniff(head, "application/octet-stream", "file.bin")
+
+    def test_json_error_body(self):
+        assert sniff(b'{"status": "error-notFound", "data": {}}', "", "file.bin")
+
+    def test_archive_magic(self):
+        assert sniff(ZIP_HEAD, "application/octet-stream", "file.zip") is None
+        assert sniff(ZIP_HEAD, "application/octet-stream", "file.7z")
+        assert sniff(b"7z\xbc\xaf\x27\x1c" + bytes(100), "", "part.7z.001") is None
+
+    def test_mp4_magic(self):
+        assert sniff(MP4_HEAD, "video/mp4", "video.mp4") is None
+        assert sniff(bytes(100), "video/mp4", "video.mp4")
+
+    def test_magic_only_checked_at_the_start(self):
+        assert sniff(bytes(100), "application/octet-stream", "file.7z", offset=1024) is None
+
+    def test_unknown_binary_passes(self):
+        assert sniff(_BLOCK[:4096], "application/octet-stream", "file.bin") is None
+
+    def test_host_error_patterns(self):
+        head = b"<p>You must wait 12 minutes to download your next file</p>"
+        assert sniff(head, "application/octet-stream", "file.bin", error_patterns=[r"You must wait \d+ minutes"])
+        assert sniff(b'{"status":"error-notFound"}', "", "data.json", error_patterns=GoFile.error_patterns)
+
+    def test_web_pages_can_be_downloaded(self):
+        assert sniff(b"<!doctype html><html></html>", "text/html", "index.html") is None
+        assert sniff(b'{"a": 1}', "application/json", "data.json") is None
+
+    def test_expected_type(self):
+        assert expected_type("Movie.MP4") == "mp4"
+        assert expected_type("backup.7z.001") == "7z"
+        assert expected_type("backup.7z.002") is None
+        assert expected_type("notes.txt") is None
+
+
+@pytest.mark.asyncio
+async def test_read_head_replays_the_whole_body():
+    async def chunks():
+        for index in range(10):
+            yield bytes([index]) * 1000
+
+    head, body = await read_head(chunks(), 2500)
+    assert head == b"\x00" * 1000 + b"\x01" * 1000 + b"\x02" * 500
+    assert b"".join([chunk async for chunk in body]) == b"".join(bytes([index]) * 1000 for index in range(10))
+
+
+class TestDownloads:
+    @pytest.mark.asyncio
+    async def test_html_page_is_rejected_before_writing(self, tmp_path):
+        downloader = FileDownloader(download_dir=str(tmp_path))
+        save_path = tmp_path / "file.bin"
+        async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+            try:
+                with pytest.raises(InvalidContentError):
+                    await downloader.download_from_url(f"{server.url}/1f/abc", save_path)
+            finally:
+                await downloader.close()
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_wrong_file_type_is_rejected(self, tmp_path):
+        downloader = FileDownloader(download_dir=str(tmp_path))
+        async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+            try:
+                with pytest.raises(InvalidContentError):
+                    await downloader.download_from_url(f"{server.url}/files/f1/f1.7z", tmp_path / "f1.7z")
+            finally:
+                await downloader.close()
+
+    @pytest.mark.asyncio
+    async def test_resumed_transfer_skips_the_magic_check(self, tmp_path):
+        downloader = FileDownloader(download_dir=str(tmp_path))
+        save_path = tmp_path / "f1.7z"
+        Path(f"{save_path}.part").write_bytes(_BLOCK[:1024])
+        async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+            try:
+                await downloader.download_from_url(f"{server.url}/files/f1/f1.7z", save_path, offset=1024)
+            finally:
+                await downloader.close()
+        assert save_path.read_bytes() == _BLOCK[:SIZE]
+
+    @pytest.mark.asyncio
+    async def test_invalid_content_resolves_the_link_again(self, tmp_path):
+        async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+            async with DarkLoader(download_dir=str(tmp_path)) as loader:
+                resolve = loader.link_resolver.get_direct_link
+                resolved = []
+
+                async def get_direct_link(url):
+                    resolved.append(url)
+                    return await resolve(url)
+
+                loader.link_resolver.get_direct_link = get_direct_link
+                with pytest.raises(InvalidContentError):
+                    await loader.download_url(f"{server.url}/files/f1/f1.7z")
+        assert len(resolved) == DarkLoader.MAX_RESOLVE_ATTEMPTS
@@ -0,0 +1,64 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from benchmarks.mock_server import _BLOCK, MockHostConfig, MockHostServer
+from darkloader.main import FileDownloader
+from darkloader.transport import AiohttpTransport, TransferStalled, TransferTimeouts, detect_stalls
+
+SIZE = 64 * 1024
+
+
+async def paced(chunk: bytes, count: int, interval: float):
+    for _ in range(count):
+        await asyncio.sleep(interval)
+        yield chunk
+
+
+class TestDetectStalls:
+    @pytest.mark.asyncio
+    async def test_crawling_transfer_stalls(self):
+        timeouts = TransferTimeouts(stall_window=0.2, min_speed=1000)
+        with pytest.raises(TransferStalled):
+            async for _ in detect_stalls(paced(b"x" * 10, 20, 0.05), timeouts):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_fast_transfer_passes(self):
+        timeouts = TransferTimeouts(stall_window=0.2, min_speed=1000)
+        chunks = [chunk async for chunk in detect_stalls(paced(b"x" * 1000, 10, 0.05), timeouts)]
+        assert len(chunks) == 10
+
+
+@pytest.mark.asyncio
+async def test_first_byte_timeout():
+    transport = AiohttpTransport()
+    async with MockHostServer(MockHostConfig(latency=1)) as server:
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                async with transport.stream("GET", f"{server.url}/api/file/p1/info", timeouts=TransferTimeouts(first_byte=0.2)):
+                    pass
+        finally:
+            await transport.close()
+
+
+class TestStalledTransfers:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("stall_rate, timeouts", [
+        # Silent connection: the read timeout fires
+        (0, TransferTimeouts(read=0.3)),
+        # Trickling connection: only the stall detector notices
+        (100, TransferTimeouts(read=5, stall_window=0.3, min_speed=10000)),
+    ])
+    async def test_stalled_transfer_resumes(self, tmp_path, monkeypatch, caplog, stall_rate, timeouts):
+        monkeypatch.setattr(FileDownloader, "RETRY_DELAY", 0)
+        config = MockHostConfig(file_size=SIZE, stall_at=16 * 1024, stall_rate=stall_rate)
+        downloader = FileDownloader(str(tmp_path), timeouts=timeouts)
+        async with MockHostServer(config) as server:
+            try:
+                path = await downloader.download_from_url(f"{server.url}/files/f1/f1.bin", tmp_path / "f1.bin")
+            finally:
+                await downloader.close()
+        assert "Resuming from byte" in caplog.text
+        assert Path(path).read_bytes() == _BLOCK[:SIZE]
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from benchmarks.mock_server import _BLOCK, MockHostConfig, MockHostServer
+from darkloader.main import DarkLoader
+from darkloader.transport import (
+    AiohttpTransport,
+    HTTPStatusError,
+    HttpxTransport,
+    RateLimiter,
+    make_transport,
+    throttle,
+)
+
+SIZE = 64 * 1024
+
+
+class TestAiohttpTransport:
+    @pytest.mark.asyncio
+    async def test_request_and_stream_reuse_one_connection(self):
+        transport = AiohttpTransport()
+        async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+            try:
+                info = await transport.request("GET", f"{server.url}/api/file/p1/info")
+                head = await transport.request("HEAD", f"{server.url}/files/f1/f1.bin")
+                async with transport.stream("GET", f"{server.url}/files/f1/f1.bin", headers={"Range": "bytes=0-1023"}) as response:
+                    response.raise_for_status()
+                    body = b"".join([chunk async for chunk in response.iter_chunked(512)])
+            finally:
+                await transport.close()
+        assert info.status == 200 and '"id": "p1"' in info.text
+        assert head.status == 200 and head.content == b""
+        assert int(head.headers["Content-Length"]) == SIZE
+        assert response.status == 206
+        assert body == _BLOCK[:1024]
+        assert transport.connections_opened == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_error_status(self):
+        transport = AiohttpTransport()
+        async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+            try:
+                async with transport.stream("GET", f"{server.url}/api/file/missing1/info") as response:
+                    with pytest.raises(HTTPStatusError) as error:
+                        response.raise_for_status()
+            finally:
+                await transport.close()
+        assert error.value.status == 404
+
+
+@pytest.mark.asyncio
+async def test_darkloader_shares_its_transport(tmp_path):
+    async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+        async with DarkLoader(download_dir=str(tmp_path)) as loader:
+            for i in range(3):
+                path = await loader.download_url(f"{server.url}/files/f{i}/f{i}.bin")
+                assert Path(path).read_bytes() == _BLOCK[:SIZE]
+            assert loader.link_resolver.transport is loader.transport
+            assert loader.transport.connections_opened == 1
+
+
+def test_make_transport():
+    assert isinstance(make_transport("aiohttp"), AiohttpTransport)
+    with pytest.raises(ValueError):
+        make_transport("nope")
+
+
+@pytest.mark.asyncio
+async def test_httpx_transport():
+    pytest.importorskip("httpx")
+    transport = HttpxTransport(http2=False)
+    async with MockHostServer(MockHostConfig(file_size=SIZE)) as server:
+        try:
+            info = await transport.request("GET", f"{server.url}/api/file/p1/info")
+            async with transport.stream("GET", f"{server.url}/files/f1/f1.bin") as response:
+                body = b"".join([chunk async for chunk in response.iter_chunked(4096)])
+        finally:
+            await transport.close()
+    assert info.status == 200
+    assert body == _BLOCK[:SIZE]
+    assert transport.connections_opened == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_caps_combined_throughput():
+    limiter = RateLimiter(100_000, burst=10_000)
+
+    async def transfer():
+        async def chunks():
+            for _ in range(5):
+                yield b"x" * 10_000
+        return [chunk async for chunk in throttle(chunks(), limiter)]
+
+    started = time.monotonic()
+    await asyncio.gather(transfer(), transfer())
+    # 100 kB with 10 kB of burst at 100 kB/s
+    assert time.monotonic() - started >= 0.85
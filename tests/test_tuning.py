@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.mock_server import MockHostConfig, MockHostServer
+from darkloader.host import HostHTTPError
+from darkloader.main import DarkLoader, FileDownloader
+from darkloader.tuning import HostConcurrency, Slot
+
+
+def finished_slot(level, nbytes, seconds, connections=1, segmented=False):
+    slot = Slot(level, connections)
+    slot.segmented = segmented
+    slot.nbytes = nbytes
+    slot.started -= seconds
+    return slot
+
+
+class TestHostConcurrency:
+    @pytest.mark.asyncio
+    async def test_limit_is_enforced(self):
+        limits = HostConcurrency(initial=1)
+        running, peak = 0, 0
+
+        async def download():
+            nonlocal running, peak
+            async with limits.slot("host"):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(download() for _ in range(3)))
+        assert peak == 1
+
+    def test_grows_while_throughput_improves(self):
+        limits = HostConcurrency(initial=2)
+        state = limits._state("host")
+        limits._record("host", state, finished_slot(1, 1000, 1.0))
+        limits._record("host", state, finished_slot(2, 1000, 1.0))
+        assert state.limit == 2.5
+
+    def test_steps_down_when_slower(self):
+        limits = HostConcurrency(initial=3)
+        state = limits._state("host")
+        limits._record("host", state, finished_slot(2, 1000, 1.0))
+        limits._record("host", state, finished_slot(3, 100, 1.0))
+        assert limits.limit("host") == 2
+
+    def test_connections_learned_from_segmented_files(self):
+        limits = HostConcurrency(initial=1, initial_connections=2)
+        state = limits._state("host")
+        # Small files say nothing about connections
+        limits._record("host", state, finished_slot(1, 1000, 1.0, connections=2))
+        assert not state.file_throughput
+        limits._record("host", state, finished_slot(1, 1000, 1.0, connections=1, segmented=True))
+        limits._record("host", state, finished_slot(1, 2000, 1.0, connections=2, segmented=True))
+        assert state.connections == 2.5
+        limits._record("host", state, finished_slot(1, 1000, 1.0, connections=3, segmented=True))
+        assert state.connections == 2
+
+    @pytest.mark.asyncio
+    async def test_backs_off_on_throttling(self):
+        limits = HostConcurrency(initial=8)
+        with pytest.raises(HostHTTPError):
+            async with limits.slot("host"):
+                raise HostHTTPError(429, "http://host/file")
+        assert limits.limit("host") == 4
+        assert limits.connections("host") == 1
+        with pytest.raises(RuntimeError):
+            async with limits.slot("host"):
+                raise RuntimeError("wrapped") from HostHTTPError(503, "http://host/file")
+        assert limits.limit("host") == 2
+
+    def test_persisted(self, tmp_path):
+        path = tmp_path / "limits.json"
+        limits = HostConcurrency(path)
+        limits._state("pixeldrain.com").limit = 6.5
+        limits._state("pixeldrain.com").connections = 8
+        limits.save()
+        assert json.loads(path.read_text()) == {"pixeldrain.com": {"downloads": 6.5, "connections": 8}}
+        assert HostConcurrency(path).limit("pixeldrain.com") == 6
+        assert HostConcurrency(path).connections("pixeldrain.com") == 8
+
+    def test_loads_download_limits_only(self, tmp_path):
+        path = tmp_path / "limits.json"
+        path.write_text(json.dumps({"pixeldrain.com": 6.5}))
+        limits = HostConcurrency(path, initial_connections=3)
+        assert limits.limit("pixeldrain.com") == 6
+        assert limits.connections("pixeldrain.com") == 3
+
+
+class TestAdaptiveDownloads:
+    @pytest.mark.asyncio
+    async def test_batch_learns_and_saves(self, tmp_path):
+        path = tmp_path / "limits.json"
+        async with MockHostServer(MockHostConfig(file_size=4096)) as server:
+            limits = HostConcurrency(path, initial=1)
+            async with DarkLoader(download_dir=str(tmp_path / "dl"), host_limits=limits) as loader:
+                urls = [f"{server.url}/files/f{i}/f{i}.bin" for i in range(4)]
+                results = await loader.download_batch(urls, concurrency=4)
+        assert all(isinstance(result, str) for result in results)
+        host = server.url.split("://")[1]
+        assert json.loads(path.read_text())[host]["downloads"] >= 1
+        assert limits.hosts[host].throughput
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("learned, allowed, used", [(3, 4, 3), (3, 2, 2)])
+    async def test_large_files_use_the_learned_connections(self, tmp_path, monkeypatch, learned, allowed, used):
+        monkeypatch.setattr(FileDownloader, "MIN_SEGMENT_SIZE", 16 * 1024)
+        requested = []
+        download_from_url = FileDownloader.download_from_url
+
+        async def spy(self, url, save_path, *args, **kwargs):
+            requested.append(kwargs.get("connections"))
+            return await download_from_url(self, url, save_path, *args, **kwargs)
+
+        monkeypatch.setattr(FileDownloader, "download_from_url", spy)
+        async with MockHostServer(MockHostConfig(file_size=256 * 1024)) as server:
+            limits = HostConcurrency(initial_connections=learned)
+            async with DarkLoader(download_dir=str(tmp_path), host_limits=limits, connections=allowed) as loader:
+                await loader.download_url(f"{server.url}/files/f1/f1.bin")
+        host = server.url.split("://")[1]
+        assert requested == [used]
+        assert list(limits.hosts[host].file_throughput) == [used]